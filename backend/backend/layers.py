@@ -0,0 +1,474 @@
+import asyncio
+import atexit
+import os
+import pickle
+import random
+import stat
+import string
+import tempfile
+import time
+from collections import deque
+from contextlib import suppress
+from copy import deepcopy
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+
+class ChannelQueue:
+    """
+    A channel's queued entries, oldest first. Unlike asyncio.Queue, an
+    entry can be taken out of the middle when a newer one supersedes it.
+    `ready` is set while there is anything to receive.
+    """
+    __slots__ = ("entries", "maxsize", "ready")
+
+    def __init__(self, maxsize=0):
+        self.entries = deque()
+        self.maxsize = maxsize  # 0 or less: unbounded
+        self.ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def full(self):
+        return 0 < self.maxsize <= len(self.entries)
+
+    def put(self, entry):
+        self.entries.append(entry)
+        self.ready.set()
+
+    def popleft(self):
+        entry = self.entries.popleft()
+        if not self.entries:
+            self.ready.clear()
+        return entry
+
+    async def get(self):
+        # Every waiter wakes on set(); whoever comes second finds it empty
+        while not self.entries:
+            await self.ready.wait()
+        return self.popleft()
+
+    def remove(self, entry):
+        # By identity: another entry may hold an equal message
+        for i, queued in enumerate(self.entries):
+            if queued is entry:
+                del self.entries[i]
+                if not self.entries:
+                    self.ready.clear()
+                return True
+        return False
+
+
+class CoalescingInMemoryChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory channel layer with latest-wins queues for snapshot messages.
+
+    Message types listed in `coalesce` (e.g. "send_update") only ever have
+    one pending copy per channel: a newer one replaces the queued older one
+    and moves to the back of the queue, so a slow client catches up with
+    the latest state instead of a backlog of stale frames.
+    Every other message type is delivered in order; when a channel is full
+    a pending coalescible message is evicted to make room for it.
+
+    Group sends are delivered inline with one copy of the message shared by
+    all members, and the expiry sweep runs at most once per second.
+    """
+
+    def __init__(self, coalesce=None, **kwargs):
+        super().__init__(**kwargs)
+        self.coalesce = set(coalesce or [])
+        self.pending = {}  # channel -> {message type: queued entry}
+        self.replaced_count = 0
+        self.evicted_count = 0
+        self.next_clean = 0
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+        self._put(channel, deepcopy(message))
+
+    def _queue(self, channel):
+        # Unlike setdefault(), only builds a queue when the channel has none
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = ChannelQueue(self.get_capacity(channel))
+        return queue
+
+    def _put(self, channel, message):
+        queue = self._queue(channel)
+        msg_type = message.get("type")
+        # Entries are lists so a superseded one can be found and removed
+        entry = [time.time() + self.expiry, message]
+
+        if msg_type in self.coalesce:
+            pending = self.pending.setdefault(channel, {})
+            if self._discard(queue, pending.pop(msg_type, None)):
+                self.replaced_count += 1
+            if queue.full():
+                raise ChannelFull(channel)
+            queue.put(entry)
+            pending[msg_type] = entry
+            return
+
+        # Control messages are never dropped while a snapshot can make room
+        if queue.full() and not self._evict_one(channel, queue):
+            raise ChannelFull(channel)
+        queue.put(entry)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        self._clean_expired()
+
+        queue = self._queue(channel)
+        try:
+            entry = await queue.get()
+        finally:
+            if not queue:
+                self.channels.pop(channel, None)
+                self.pending.pop(channel, None)
+
+        pending = self.pending.get(channel)
+        if pending:
+            msg_type = entry[1].get("type")
+            if pending.get(msg_type) is entry:
+                del pending[msg_type]
+        return entry[1]
+
+    def _discard(self, queue, entry):
+        # False if it was already received or expired
+        return entry is not None and queue.remove(entry)
+
+    def _evict_one(self, channel, queue):
+        pending = self.pending.get(channel)
+        while pending:
+            _, entry = pending.popitem()
+            if self._discard(queue, entry):
+                self.evicted_count += 1
+                return True
+        return False
+
+    def _clean_expired(self):
+        # The base layer's sweep, on ChannelQueues. It walks every channel
+        # and group; running it on every send and receive makes fan-out
+        # quadratic, once a second is plenty
+        now = time.time()
+        if now < self.next_clean:
+            return
+        self.next_clean = now + 1
+        for channel, queue in list(self.channels.items()):
+            while queue and queue.entries[0][0] < now:
+                queue.popleft()
+                # Any removal prompts group discard
+                self._remove_from_groups(channel)
+                if not queue:
+                    self.channels.pop(channel, None)
+        timeout = int(now) - self.group_expiry
+        for channels in self.groups.values():
+            for name, timestamp in list(channels.items()):
+                if timestamp and timestamp < timeout:
+                    channels.pop(name, None)
+        for channel in list(self.pending):
+            if channel not in self.channels:
+                del self.pending[channel]
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Invalid group name"
+        self._clean_expired()
+
+        # Queue puts never block, so deliver inline instead of one task per
+        # member; members share one copy of the message and only read it
+        message = deepcopy(message)
+        for channel in list(self.groups.get(group, {})):
+            try:
+                self._put(channel, message)
+            except ChannelFull:
+                pass
+
+    async def flush(self):
+        await super().flush()
+        self.pending = {}
+
+    def get_stats(self):
+        depths = [len(queue) for queue in self.channels.values()]
+        return {
+            "channels": len(depths),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "replaced_messages": self.replaced_count,
+            "evicted_messages": self.evicted_count,
+        }
+
+
+class UnixSocketChannelLayer(CoalescingInMemoryChannelLayer):
+    """
+    Channel layer shared by the worker processes of one host, without a broker.
+
+    Every process keeps its own in-memory queues and listens on a Unix socket
+    `<path>/<node>.sock`, where `node` is also embedded in the names of the
+    channels it creates. A send to another process's channel is forwarded over
+    that process's socket. Processes tell each other which groups they have
+    members in, so a group send is pickled once and only written to the
+    peers that need it; a group that only has local members never leaves
+    the process.
+
+    Capacity and expiry are enforced by the process that owns the channel.
+    A message that a peer drops because the channel is full, or that cannot
+    be forwarded because the peer died, is counted rather than raised.
+
+    Frames are pickled, so anyone who can connect to a socket can run code
+    in the workers. The socket directory must therefore be private: the
+    layer creates it 0700 and refuses to start on a directory that is a
+    symlink, belongs to another user or is open to anyone else, such as a
+    default path in /tmp that someone else created first.
+    """
+
+    def __init__(self, path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path or os.path.join(tempfile.gettempdir(), "pong-channels")
+        self.node = "n%d" % os.getpid()
+        self.loop = None
+        self.starting = None
+        self.server = None
+        self.peers = {}          # node -> task resolving to a StreamWriter or None
+        self.incoming = {}       # writer -> task serving a connection a peer opened
+        self.remote_groups = {}  # group -> nodes that have members in it
+        self.announced = set()   # groups our peers know we have members in
+        self.forwarded_count = 0
+        self.received_count = 0
+        self.dropped_count = 0
+
+    # Startup and peers
+
+    def _address(self, node):
+        return os.path.join(self.path, node + ".sock")
+
+    async def _ready(self):
+        """
+        Start listening on first use. Returns False when called from an event
+        loop other than the one the layer started on.
+        """
+        if self.starting is None:
+            self.loop = asyncio.get_running_loop()
+            self.starting = asyncio.ensure_future(self._start())
+        elif asyncio.get_running_loop() is not self.loop:
+            return False
+        await self.starting
+        return True
+
+    async def _on_own_loop(self, coro):
+        # asyncio streams and queues belong to the loop that created them
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def _start(self):
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        self._check_private(self.path)
+        address = self._address(self.node)
+        with suppress(FileNotFoundError):
+            os.unlink(address)
+        self.server = await asyncio.start_unix_server(self._serve_peer, address)
+        atexit.register(self._unlink)
+        for name in os.listdir(self.path):
+            node = name[:-len(".sock")]
+            if name.endswith(".sock") and node != self.node:
+                await self._peer(node)
+
+    @staticmethod
+    def _check_private(path):
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode):
+            raise RuntimeError(f"Channel socket path {path} is not a directory")
+        if info.st_uid != os.getuid():
+            raise RuntimeError(f"Channel socket directory {path} belongs to another user")
+        if info.st_mode & 0o077:
+            raise RuntimeError(
+                f"Channel socket directory {path} is accessible to other users (mode {info.st_mode & 0o777:o})"
+            )
+
+    def _unlink(self):
+        with suppress(OSError):
+            os.unlink(self._address(self.node))
+
+    async def _peer(self, node):
+        task = self.peers.get(node)
+        if task is None:
+            task = self.peers[node] = asyncio.ensure_future(self._connect(node))
+        writer = await task
+        if writer is None and self.peers.get(node) is task:
+            del self.peers[node]
+        return writer
+
+    async def _connect(self, node):
+        address = self._address(node)
+        try:
+            _, writer = await asyncio.open_unix_connection(address)
+        except ConnectionRefusedError:
+            # Left behind by a worker that exited without cleaning up
+            with suppress(OSError):
+                os.unlink(address)
+            return None
+        except OSError:
+            return None
+        writer.write(self._frame(("hello", self.node, list(self.announced))))
+        return writer
+
+    def _forget(self, node):
+        task = self.peers.pop(node, None)
+        if task is not None and task.done() and task.result() is not None:
+            task.result().close()
+        for nodes in self.remote_groups.values():
+            nodes.discard(node)
+
+    def _frame(self, payload):
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        return len(data).to_bytes(4, "big") + data
+
+    async def _write(self, node, frame):
+        writer = await self._peer(node)
+        if writer is None:
+            self._forget(node)
+            self.dropped_count += 1
+            return
+        try:
+            writer.write(frame)
+            await writer.drain()
+            self.forwarded_count += 1
+        except ConnectionError:
+            self._forget(node)
+            self.dropped_count += 1
+
+    def _broadcast(self, payload):
+        frame = self._frame(payload)
+        for node, task in list(self.peers.items()):
+            if task.done() and task.result() is not None:
+                try:
+                    task.result().write(frame)
+                except ConnectionError:
+                    self._forget(node)
+
+    async def _serve_peer(self, reader, writer):
+        node = None
+        self.incoming[writer] = asyncio.current_task()
+        try:
+            while True:
+                size = int.from_bytes(await reader.readexactly(4), "big")
+                kind, *args = pickle.loads(await reader.readexactly(size))
+                self.received_count += 1
+                if kind == "send":
+                    self._deliver(*args)
+                elif kind == "group":
+                    group, message = args
+                    for channel in list(self.groups.get(group, {})):
+                        self._deliver(channel, message)
+                elif kind == "join":
+                    self.remote_groups.setdefault(args[0], set()).add(node)
+                elif kind == "leave":
+                    self.remote_groups.get(args[0], set()).discard(node)
+                elif kind == "hello":
+                    node, groups = args
+                    for group in groups:
+                        self.remote_groups.setdefault(group, set()).add(node)
+                    # Make sure we can talk back to a peer that just started
+                    await self._peer(node)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.incoming.pop(writer, None)
+            writer.close()
+            if node is not None:
+                self._forget(node)
+
+    def _deliver(self, channel, message):
+        try:
+            self._put(channel, message)
+        except ChannelFull:
+            self.dropped_count += 1
+
+    def _owner(self, channel):
+        # Process-specific names look like "specific..<node>!<random>"
+        if "!" not in channel:
+            return None
+        return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific."):
+        return "%s.%s!%s" % (
+            prefix,
+            self.node,
+            "".join(random.choice(string.ascii_letters) for i in range(12)),
+        )
+
+    async def send(self, channel, message):
+        if not await self._ready():
+            return await self._on_own_loop(self.send(channel, message))
+        node = self._owner(channel)
+        if node is None or node == self.node:
+            return await super().send(channel, message)
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._write(node, self._frame(("send", channel, message)))
+
+    async def group_send(self, group, message):
+        if not await self._ready():
+            return await self._on_own_loop(self.group_send(group, message))
+        await super().group_send(group, message)
+        nodes = self.remote_groups.get(group)
+        if nodes:
+            frame = self._frame(("group", group, message))
+            for node in list(nodes):
+                await self._write(node, frame)
+
+    async def group_add(self, group, channel):
+        if not await self._ready():
+            return await self._on_own_loop(self.group_add(group, channel))
+        await super().group_add(group, channel)
+        if group not in self.announced:
+            self.announced.add(group)
+            self._broadcast(("join", group))
+
+    async def group_discard(self, group, channel):
+        if not await self._ready():
+            return await self._on_own_loop(self.group_discard(group, channel))
+        await super().group_discard(group, channel)
+        self._announce_leaves()
+
+    def _announce_leaves(self):
+        for group in [g for g in self.announced if not self.groups.get(g)]:
+            self.announced.discard(group)
+            self._broadcast(("leave", group))
+
+    def _clean_expired(self):
+        cleaned = time.time() >= self.next_clean
+        super()._clean_expired()
+        if cleaned and self.starting is not None:
+            # Expired memberships can empty a group without a group_discard
+            self._announce_leaves()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        tasks = list(self.incoming.values())
+        for writer in list(self.incoming):
+            writer.close()
+        if tasks:
+            # Let the readers see EOF; cancelled handlers get logged as errors
+            await asyncio.wait(tasks, timeout=1)
+        for node in list(self.peers):
+            self._forget(node)
+        self._unlink()
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update({
+            "node": self.node,
+            "peers": sorted(node for node, task in self.peers.items()
+                            if task.done() and task.result() is not None),
+            "remote_groups": sum(1 for nodes in self.remote_groups.values() if nodes),
+            "forwarded_frames": self.forwarded_count,
+            "received_frames": self.received_count,
+            "dropped_messages": self.dropped_count,
+        })
+        return stats
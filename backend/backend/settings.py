@@ -69,12 +69,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 ]
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
-
 MIDDLEWARE = [
 	'corsheaders.middleware.CorsMiddleware',
 	'django.middleware.common.CommonMiddleware',
@@ -107,12 +101,32 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Lobby lifecycle: games idle (no joins, input or state changes) for longer
+# than the TTL of their state, in seconds, are evicted by a sweeper that
+# runs every PONG_LOBBY_SWEEP_INTERVAL seconds
+PONG_LOBBY_TTL = {'waiting': 600, 'countdown': 60, 'playing': 900, 'ended': 30}
+PONG_LOBBY_SWEEP_INTERVAL = 30
+
+# Sharded mode (manage.py runshards): this worker's index out of
+# PONG_SHARD_COUNT processes; games are owned by crc32(game_id) % count
+PONG_SHARD_COUNT = int(os.getenv('PONG_SHARD_COUNT', '1'))
+PONG_SHARD_INDEX = int(os.getenv('PONG_SHARD_INDEX', '0'))
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'BACKEND': 'backend.layers.CoalescingInMemoryChannelLayer',
+        'CONFIG': {
+            # Only the latest queued game snapshot per socket is kept
+            'coalesce': ['send_update'],
+        },
     },
 }
 
+# Shards reach each other's consumers over Unix sockets in this directory
+if PONG_SHARD_COUNT > 1:
+    CHANNEL_LAYERS['default']['BACKEND'] = 'backend.layers.UnixSocketChannelLayer'
+    CHANNEL_LAYERS['default']['CONFIG']['path'] = os.getenv('PONG_CHANNEL_SOCKET_DIR')
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -171,6 +185,49 @@ CORS_ALLOW_CREDENTIALS = True
 # AUTH_USER_MODEL = "users.PongUser"
 OTP_EXPIRATION_TIME = 300
 
+# Pong game loop: run catch-up physics steps when a tick is late,
+# but never more than PONG_MAX_CATCHUP_STEPS per tick
+PONG_FIXED_TIMESTEP = True
+PONG_MAX_CATCHUP_STEPS = 5
+# "scalar" steps each game in Python, "batch" steps all games at once with numpy
+PONG_PHYSICS_ENGINE = os.getenv('PONG_PHYSICS_ENGINE', 'scalar')
+# Ticks (physics steps and snapshots) per second. Below 60 each step moves
+# the ball further, so switch PONG_COLLISION to "swept", which tests the
+# ball's whole path instead of where it ends up
+PONG_TICK_RATE = int(os.getenv('PONG_TICK_RATE', '60'))
+PONG_COLLISION = os.getenv('PONG_COLLISION', 'discrete')
+
+# Snapshots per second sent to spectators (players get TICK_RATE), and the
+# time per tick the game loop may spend on them after serving the players
+PONG_SPECTATOR_RATE = 10
+PONG_SPECTATOR_BUDGET_MS = 4
+
+# Seconds between a game's gameOver and the redirect back to the lobby
+PONG_REDIRECT_DELAY = 3
+
+# Countdowns and redirects run on one timer wheel per worker, with ticks of
+# PONG_TIMER_RESOLUTION seconds; countdown numbers are PONG_COUNTDOWN_STEP apart
+PONG_TIMER_RESOLUTION = 0.01
+PONG_COUNTDOWN_STEP = 1
+
+# Match results are queued and written in one bulk insert every
+# PONG_MATCH_FLUSH_INTERVAL seconds, or once PONG_MATCH_FLUSH_BATCH rows wait
+PONG_MATCH_FLUSH_INTERVAL = 1.0
+PONG_MATCH_FLUSH_BATCH = 500
+# Flushes a batch survives on transient database errors before it is dropped
+PONG_MATCH_FLUSH_RETRIES = 5
+
+# Seconds players can sign up after a tournament is created
+PONG_TOURNAMENT_SIGNUP_SECONDS = 30
+
+# Lobby feed events (ws/lobbies/) kept for clients resuming after a reconnect
+PONG_LOBBY_FEED_BACKLOG = 1024
+
+# Matchmaking: 0 pairs players first come, first served; N > 0 splits them
+# into N win-rate buckets, widened to neighbours after WIDEN_AFTER seconds
+PONG_MATCHMAKING_BUCKETS = 0
+PONG_MATCHMAKING_WIDEN_AFTER = 10
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'users.authentication.CookieJWTAuthentication',
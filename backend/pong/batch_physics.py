@@ -0,0 +1,271 @@
+import numpy as np
+from .physics import MAX_SWEEP_EVENTS
+
+NO_SCORE = 0
+SCORED_A = 1
+SCORED_B = 2
+
+
+class BatchEngine:
+    """
+    Vectorized physics engine for many concurrent games.
+
+    Every attached game owns a slot in a set of contiguous NumPy arrays
+    (structure-of-arrays: one array per paddle, ball coordinate, velocity
+    and score). A tick gathers the slots of the games that need to move,
+    steps all of them at once with boolean masks for bounces, paddle hits
+    and scoring, and writes the result back to the Game dicts that the
+    snapshots are built from.
+
+    The arithmetic mirrors Game.step() and Game.sweep() operation for
+    operation, so both engines produce the same positions, velocities and
+    scores.
+    """
+
+    name = "batch"
+
+    def __init__(self, swept=False, scale=1, capacity=64):
+        self.swept = swept
+        self.scale = scale
+        self.capacity = 0
+        self.free_slots = []
+        self.attached = {}  # Game -> slot
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        def resized(old, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        self.pa = resized(getattr(self, "pa", None), np.float64)
+        self.pb = resized(getattr(self, "pb", None), np.float64)
+        self.da = resized(getattr(self, "da", None), np.float64)
+        self.db = resized(getattr(self, "db", None), np.float64)
+        self.x = resized(getattr(self, "x", None), np.float64)
+        self.y = resized(getattr(self, "y", None), np.float64)
+        self.dx = resized(getattr(self, "dx", None), np.float64)
+        self.dy = resized(getattr(self, "dy", None), np.float64)
+        self.sa = resized(getattr(self, "sa", None), np.int64)
+        self.sb = resized(getattr(self, "sb", None), np.int64)
+        # Hand out low slots first so active games stay packed together
+        self.free_slots.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def attach(self, g):
+        if not self.free_slots:
+            self._grow(self.capacity * 2)
+        slot = self.free_slots.pop()
+        self.attached[g] = slot
+        g.engine = self
+        g.engine_slot = slot
+        self.pa[slot] = g.paddles["a"]
+        self.pb[slot] = g.paddles["b"]
+        self.da[slot] = g.paddle_directions["a"]
+        self.db[slot] = g.paddle_directions["b"]
+        self._load_ball(g, slot)
+        self.sa[slot] = g.score["a"]
+        self.sb[slot] = g.score["b"]
+
+    def detach(self, g):
+        slot = self.attached.pop(g, None)
+        if slot is None:
+            return
+        g.engine = None
+        g.engine_slot = None
+        self.free_slots.append(slot)
+
+    def prune(self, active_games):
+        """
+        Release the slots of games that are no longer being simulated.
+        """
+        if len(self.attached) == len(active_games):
+            return
+        active = set(active_games)
+        for g in [g for g in self.attached if g not in active]:
+            self.detach(g)
+
+    def _load_ball(self, g, slot):
+        self.x[slot] = g.ball["x"]
+        self.y[slot] = g.ball["y"]
+        self.dx[slot] = g.ball["dx"]
+        self.dy[slot] = g.ball["dy"]
+
+    def set_paddle_direction(self, g, paddle, direction):
+        slot = self.attached.get(g)
+        if slot is None:
+            return
+        if paddle == "a":
+            self.da[slot] = direction
+        else:
+            self.db[slot] = direction
+
+    def reset_ball(self, g):
+        g.reset_ball()
+        slot = self.attached.get(g)
+        if slot is not None:
+            self._load_ball(g, slot)
+
+    def advance(self, plan):
+        """
+        Same contract as ScalarEngine.advance(): run up to `steps` steps for
+        every (game, steps) in `plan`, returning [(game, scoring_paddle)].
+        """
+        if not plan:
+            return []
+        for g, _ in plan:
+            if g not in self.attached:
+                self.attach(g)
+
+        n = len(plan)
+        idx = np.fromiter((self.attached[g] for g, _ in plan), dtype=np.intp, count=n)
+        steps = np.fromiter((s for _, s in plan), dtype=np.int64, count=n)
+
+        pa, pb = self.pa[idx], self.pb[idx]
+        da, db = self.da[idx], self.db[idx]
+        x, y, dx, dy = self.x[idx], self.y[idx], self.dx[idx], self.dy[idx]
+        sa, sb = self.sa[idx], self.sb[idx]
+        scorer = np.zeros(n, dtype=np.int8)
+        speed = 5 * self.scale
+
+        for k in range(int(steps.max())):
+            m = (steps > k) & (scorer == NO_SCORE)
+            if not m.any():
+                break
+            step_all = bool(m.all())
+
+            # Move paddles
+            new_pa = np.clip(pa + da * speed, 0, 500)
+            new_pb = np.clip(pb + db * speed, 0, 500)
+            if step_all:
+                pa, pb = new_pa, new_pb
+            else:
+                pa = np.where(m, new_pa, pa)
+                pb = np.where(m, new_pb, pb)
+
+            if self.swept:
+                x, y, dx, dy, scored = self._sweep(m, pa, pb, x, y, dx, dy, speed)
+                sa = sa + (scored == SCORED_A)
+                sb = sb + (scored == SCORED_B)
+                scorer = np.where(scored != NO_SCORE, scored, scorer)
+                continue
+
+            # Move ball
+            new_x = x + dx * speed
+            new_y = y + dy * speed
+            if step_all:
+                x, y = new_x, new_y
+            else:
+                x = np.where(m, new_x, x)
+                y = np.where(m, new_y, y)
+
+            # Bounce top/bottom
+            bounce = m & ((y <= 0) | (y >= 570))
+            dy = np.where(bounce, dy * -1, dy)
+
+            # Paddle collisions
+            hit_a = m & (x <= 10) & (pa <= y) & (y <= pa + 100)
+            hit_b = m & ~hit_a & (x >= 970) & (pb <= y) & (y <= pb + 100)
+            hit = hit_a | hit_b
+            dx = np.where(hit, (dx * -1) * 1.05, dx)
+            dy = np.where(hit, dy * 1.05, dy)
+
+            # Out of left / right boundary
+            left = m & (x < 0)
+            right = m & ~left & (x > 1000)
+            sb = sb + left
+            sa = sa + right
+            scorer[left] = SCORED_B
+            scorer[right] = SCORED_A
+
+        self.pa[idx], self.pb[idx] = pa, pb
+        self.x[idx], self.y[idx], self.dx[idx], self.dy[idx] = x, y, dx, dy
+        self.sa[idx], self.sb[idx] = sa, sb
+
+        # Write the results back to the dicts the snapshots are built from
+        columns = zip(
+            pa.tolist(), pb.tolist(), x.tolist(), y.tolist(),
+            dx.tolist(), dy.tolist(), sa.tolist(), sb.tolist(),
+        )
+        for (g, _), (a, b, bx, by, bdx, bdy, score_a, score_b) in zip(plan, columns):
+            g.paddles["a"] = a
+            g.paddles["b"] = b
+            ball = g.ball
+            ball["x"] = bx
+            ball["y"] = by
+            ball["dx"] = bdx
+            ball["dy"] = bdy
+            g.score["a"] = score_a
+            g.score["b"] = score_b
+
+        return [
+            (plan[i][0], "a" if scorer[i] == SCORED_A else "b")
+            for i in np.flatnonzero(scorer).tolist()
+        ]
+
+    def _sweep(self, m, pa, pb, x, y, dx, dy, speed):
+        """
+        Game.sweep() for every game in mask `m`. Each round handles the next
+        event (wall, paddle line or goal) of all games whose ball is still
+        moving, until every ball has used up its step.
+        Returns the new x, y, dx, dy and a scorer code per game.
+        """
+        n = len(x)
+        moving = m.copy()
+        missed = np.zeros(n, dtype=bool)
+        remaining = np.ones(n)
+        scored = np.zeros(n, dtype=np.int8)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(MAX_SWEEP_EVENTS):
+                vx = dx * speed
+                vy = dy * speed
+                left = vx < 0
+                right = vx > 0
+                t_wall = np.where(vy < 0, (0 - y) / vy, np.where(vy > 0, (570 - y) / vy, np.inf))
+                t_pad = np.where(
+                    left & (x >= 10) & ~missed, (10 - x) / vx,
+                    np.where(right & (x <= 970) & ~missed, (970 - x) / vx, np.inf),
+                )
+                t_goal = np.where(left, (0 - x) / vx, np.where(right, (1000 - x) / vx, np.inf))
+                t = np.minimum(np.minimum(t_wall, t_pad), t_goal)
+
+                event = moving & (t < remaining)
+                done = moving & ~event
+                x = np.where(done, x + vx * remaining, x)
+                y = np.where(done, y + vy * remaining, y)
+                moving = event
+                if not moving.any():
+                    break
+                x = np.where(event, x + vx * t, x)
+                y = np.where(event, y + vy * t, y)
+                remaining = np.where(event, remaining - t, remaining)
+
+                wall = event & (t_wall <= t_pad) & (t_wall <= t_goal)
+                pad = event & ~wall & (t_pad <= t_goal)
+                goal = event & ~wall & ~pad
+
+                y = np.where(wall, np.where(vy < 0, 0.0, 570.0), y)
+                dy = np.where(wall, dy * -1, dy)
+
+                paddle = np.where(left, pa, pb)
+                hit = pad & (paddle <= y) & (y <= paddle + 100)
+                x = np.where(hit, np.where(left, 10.0, 970.0), x)
+                dx = np.where(hit, (dx * -1) * 1.05, dx)
+                dy = np.where(hit, dy * 1.05, dy)
+                missed |= pad & ~hit
+
+                scored[goal & left] = SCORED_B
+                scored[goal & right] = SCORED_A
+                moving &= ~goal
+
+        return x, y, dx, dy, scored
+
+    def get_stats(self):
+        return {
+            "engine": self.name,
+            "collision": "swept" if self.swept else "discrete",
+            "attached_games": len(self.attached),
+            "capacity": self.capacity,
+        }
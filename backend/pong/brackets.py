@@ -0,0 +1,203 @@
+import math
+from abc import ABC, abstractmethod
+from .round_robin import circle_rounds
+
+
+class Bracket(ABC):
+    """
+    A tournament format: who plays whom each round, and who won.
+
+    TournamentManager calls pair_round() when a round starts and record()
+    for every result, and asks `finished` once a round is complete. The
+    standings are updated as results come in, so nothing recounts the
+    matches played so far. Players are seeded in sign-up order.
+    """
+
+    def __init__(self, players, rounds=None):
+        self.players = list(players)
+        self.seed = {p: i for i, p in enumerate(self.players)}
+        self.wins = dict.fromkeys(self.players, 0)
+        self.losses = dict.fromkeys(self.players, 0)
+        self.round = -1
+        self.rounds = rounds
+
+    @abstractmethod
+    def pair_round(self):
+        """
+        Start the next round: returns (pairs, byes).
+        """
+
+    def record(self, players, winner):
+        loser = players[1] if players[0] == winner else players[0]
+        self.wins[winner] += 1
+        self.losses[loser] += 1
+
+    @property
+    @abstractmethod
+    def finished(self):
+        """
+        Whether the bracket has its final result.
+        """
+
+    def final_result(self):
+        if not self.players:
+            return None
+        max_wins = max(self.wins.values())
+        winners = [p for p in self.players if self.wins[p] == max_wins]
+        return {"type": "winner" if len(winners) == 1 else "draw", "usernames": winners}
+
+    def rank_key(self, player):
+        return (-self.wins[player], self.losses[player], self.seed[player])
+
+    def standings(self):
+        ranked = sorted(self.players, key=self.rank_key)
+        return [
+            {"username": p, "wins": self.wins[p], "losses": self.losses[p]}
+            for p in ranked
+        ]
+
+    def _pair_group(self, group, pairs, byes):
+        # Top seed against bottom seed; the odd one out (top seed) sits out
+        group = sorted(group, key=self.seed.get)
+        if len(group) % 2:
+            byes.append(group.pop(0))
+        for i in range(len(group) // 2):
+            pairs.append((group[i], group[-1 - i]))
+
+
+class RoundRobin(Bracket):
+    """
+    Everyone plays everyone, n-1 rounds (n if odd). Most wins takes it.
+    """
+
+    def __init__(self, players, rounds=None):
+        super().__init__(players)
+        self.schedule = circle_rounds(self.players)
+        self.rounds = len(self.schedule)
+
+    def pair_round(self):
+        self.round += 1
+        pairs = self.schedule[self.round]
+        playing = {p for pair in pairs for p in pair}
+        return pairs, [p for p in self.players if p not in playing]
+
+    @property
+    def finished(self):
+        return self.round + 1 >= self.rounds
+
+
+class SingleElimination(Bracket):
+    """
+    Losers are out; the top seed takes a bye when the field is odd, so
+    the bracket ends after ceil(log2 n) rounds.
+    """
+
+    def __init__(self, players, rounds=None):
+        super().__init__(players)
+        self.alive = list(self.players)
+        self.rounds = math.ceil(math.log2(len(self.players))) if len(self.players) > 1 else 0
+
+    def pair_round(self):
+        self.round += 1
+        pairs, byes = [], []
+        self._pair_group(self.alive, pairs, byes)
+        return pairs, byes
+
+    def record(self, players, winner):
+        super().record(players, winner)
+        self.alive.remove(players[1] if players[0] == winner else players[0])
+
+    @property
+    def finished(self):
+        return len(self.alive) <= 1
+
+    def rank_key(self, player):
+        # Whoever is still in ranks above everyone knocked out
+        return (player not in self.alive,) + super().rank_key(player)
+
+    def final_result(self):
+        return {"type": "winner", "usernames": self.alive[:1]}
+
+
+class DoubleElimination(Bracket):
+    """
+    A player is out after two losses. Unbeaten players meet each other in
+    the winners bracket and once-beaten ones in the losers bracket, until
+    one of each is left for the grand final; if the unbeaten player loses
+    it, the two play again. About 2 * log2 n rounds.
+    """
+
+    def __init__(self, players, rounds=None):
+        super().__init__(players)
+        self.rounds = None  # Depends on the results
+
+    def pair_round(self):
+        self.round += 1
+        unbeaten = [p for p in self.players if self.losses[p] == 0]
+        once_beaten = [p for p in self.players if self.losses[p] == 1]
+        if len(unbeaten) + len(once_beaten) == 2:
+            # Grand final, or its rematch
+            return [tuple(sorted(unbeaten + once_beaten, key=self.seed.get))], []
+        pairs, byes = [], []
+        self._pair_group(unbeaten, pairs, byes)
+        self._pair_group(once_beaten, pairs, byes)
+        return pairs, byes
+
+    @property
+    def finished(self):
+        return sum(1 for p in self.players if self.losses[p] < 2) <= 1
+
+    def rank_key(self, player):
+        return (self.losses[player] >= 2,) + super().rank_key(player)
+
+    def final_result(self):
+        survivors = [p for p in self.players if self.losses[p] < 2]
+        return {"type": "winner", "usernames": survivors[:1]}
+
+
+class Swiss(Bracket):
+    """
+    A fixed number of rounds (ceil(log2 n) unless configured). Each round
+    pairs players with the same score, avoiding rematches where possible;
+    the lowest-ranked player without one gets a bye, worth a win.
+    """
+
+    def __init__(self, players, rounds=None):
+        super().__init__(players)
+        default = max(1, math.ceil(math.log2(len(self.players)))) if len(self.players) > 1 else 0
+        self.rounds = min(rounds or default, max(len(self.players) - 1, 1))
+        self.opponents = {p: set() for p in self.players}
+        self.had_bye = set()
+
+    def pair_round(self):
+        self.round += 1
+        ranked = [s["username"] for s in self.standings()]
+        byes = []
+        if len(ranked) % 2:
+            bye = next((p for p in reversed(ranked) if p not in self.had_bye), ranked[-1])
+            ranked.remove(bye)
+            self.had_bye.add(bye)
+            self.wins[bye] += 1
+            byes.append(bye)
+        pairs = []
+        while ranked:
+            player = ranked.pop(0)
+            # Closest in the standings they have not met yet
+            opponent = next((p for p in ranked if p not in self.opponents[player]), ranked[0])
+            ranked.remove(opponent)
+            self.opponents[player].add(opponent)
+            self.opponents[opponent].add(player)
+            pairs.append((player, opponent))
+        return pairs, byes
+
+    @property
+    def finished(self):
+        return self.round + 1 >= self.rounds
+
+
+FORMATS = {
+    "round_robin": RoundRobin,
+    "single_elimination": SingleElimination,
+    "double_elimination": DoubleElimination,
+    "swiss": Swiss,
+}
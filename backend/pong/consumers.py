@@ -1,26 +1,71 @@
 import json
+import time
+from collections import deque
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from asyncio import create_task, sleep
+from channels.consumer import get_handler_name
 from urllib.parse import parse_qs
-from django.utils.timezone import now
 from asgiref.sync import sync_to_async
-from users.models import PongUser, MatchHistory
-from channels.db import database_sync_to_async
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from .tournament_manager import TournamentManager
+from .tournament_manager import TournamentManager, TOURNAMENT_LIST_GROUP, tournament_group
+from .game_loop import GameLoop
+from .physics import INF, MAX_SWEEP_EVENTS
+from .protocol import SnapshotEncoder
+from .matchmaking import MatchmakingQueue, ShardedMatchmaking
+from .sharding import owns, shard_count
+from .shard_link import ShardLink
+from .game_finalizer import GameFinalizer, send_gameover_event
+from .lobby_lifecycle import LobbyLifecycle
+from .lobby_index import LobbyIndex, FEED_GROUP
+from .game_phases import (
+    GamePhases, WAITING, COUNTDOWN, PLAYING, SERVING, GAME_OVER, ENDED,
+)
+
+# Phases reported to the lobby lifecycle as another state
+LIFECYCLE_STATES = {SERVING: PLAYING, GAME_OVER: ENDED}
+
+# Payloads that never change are encoded once at import time
+COUNTDOWN_START_TEXT = json.dumps({"type": "countdownStart"})
+COUNTDOWN_END_TEXT = json.dumps({"type": "countdownEnd"})
+REDIRECT_TOURNAMENT_TEXT = json.dumps({"type": "redirectToTournament"})
+REDIRECT_PLAY_TEXT = json.dumps({"type": "redirectToPlay"})
+
+# Messages whose handlers never touch the database. Channels otherwise runs
+# close_old_connections in a worker thread before *every* message, which
+# costs more than the handler itself at 60 snapshots per second per socket.
+DB_FREE_MESSAGES = {
+    "send_update",
+    "countdown_tick",
+    "countdown_start",
+    "countdown_end",
+    "players_connected",
+    "player_ready_state",
+    "game_over",
+    "websocket.receive",
+}
+
 
 class TournamentConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/tournament/ follows the registry (tournaments opening, starting and
+    closing); ws/tournament/<id>/ follows one tournament's full state.
+    """
     async def connect(self):
-        await self.channel_layer.group_add("tournament_updates", self.channel_name)
+        tournament_id = self.scope["url_route"]["kwargs"].get("tournament_id")
+        if tournament_id:
+            self.group_name = tournament_group(tournament_id)
+        else:
+            self.group_name = TOURNAMENT_LIST_GROUP
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("tournament_updates", self.channel_name)
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def tournament_update(self, event):
-        await self.send_json(event["message"])
+        # Already encoded once by the sender for the whole group
+        await self.send(text_data=event["text"])
 
 
 class Game:
@@ -32,11 +77,217 @@ class Game:
         self.MAX_SCORE = 3
         self.players = {}       # 'a' -> browser_key, 'b' -> browser_key
         self.players_info = {}  # 'a' -> {"username": "...", "display_name": "..."}
-        self.game_started = False
-        self.countdown_in_progress = False
         self.paddle_directions = {"a": 0, "b": 0}
         self.ready_players = {"a": False, "b": False}
-        self.game_ended = False  # Prevent double match/tournament logic
+        # Changed only through GamePhases.transition()
+        self.phase = WAITING
+        self.phase_timers = []
+        # Fixed-timestep bookkeeping, owned by the GameLoop
+        self.accumulator = 0.0
+        self.last_advance = None
+        self.overruns = 0
+        self.catchup_steps = 0
+        self.last_lateness_ms = 0.0
+        self.max_lateness_ms = 0.0
+        # Binary snapshot encoding, only done while a binary client is connected
+        self.encoder = SnapshotEncoder()
+        self.binary_clients = 0
+        # Set while a batch physics engine holds this game's state
+        self.engine = None
+        self.engine_slot = None
+        self.mm_bucket = 0  # Matchmaking rating bucket of the lobby creator
+        self.is_tournament = False  # Set when a player of a tournament match joins
+        self.matchmade = False  # Created by get_or_create_game for random pairing
+        # Spectator consumers, least recently served first, see GameLoop
+        self.spectators = deque()
+        self.spectator_count = 0
+        self.last_activity = time.monotonic()
+
+    @property
+    def group_name(self):
+        return f"game_{self.game_id}"
+
+    @property
+    def game_started(self):
+        return self.phase in (PLAYING, SERVING)
+
+    @property
+    def countdown_in_progress(self):
+        return self.phase in (COUNTDOWN, SERVING)
+
+    @property
+    def game_over_pending(self):
+        # Final point scored, game_over in flight
+        return self.phase == GAME_OVER
+
+    @property
+    def game_ended(self):
+        # Prevent double match/tournament logic
+        return self.phase == ENDED
+
+    @property
+    def state(self):
+        # Lifecycle state, see LobbyLifecycle: serves count as playing
+        return LIFECYCLE_STATES.get(self.phase, self.phase)
+
+    def touch(self):
+        """Record activity; idle games expire, see LobbyLifecycle."""
+        self.last_activity = time.monotonic()
+
+    def move_paddles(self, scale):
+        paddle_speed = 5 * scale
+        min_paddle, max_paddle = 0, 500
+        self.paddles["a"] += self.paddle_directions["a"] * paddle_speed
+        self.paddles["b"] += self.paddle_directions["b"] * paddle_speed
+        self.paddles["a"] = max(min_paddle, min(max_paddle, self.paddles["a"]))
+        self.paddles["b"] = max(min_paddle, min(max_paddle, self.paddles["b"]))
+
+    def step(self, scale=1):
+        """
+        Advance paddles and ball by `scale` frames of 1/60 s, checking
+        collisions only where the ball ends up.
+        Returns the paddle that scored ('a' or 'b'), or None.
+        """
+        self.move_paddles(scale)
+
+        # Move ball
+        ball = self.ball
+        ball["x"] += ball["dx"] * (5 * scale)
+        ball["y"] += ball["dy"] * (5 * scale)
+
+        # Bounce top/bottom
+        if ball["y"] <= 0 or ball["y"] >= 570:
+            ball["dy"] *= -1
+
+        # Paddle collisions
+        if ball["x"] <= 10 and self.paddles["a"] <= ball["y"] <= self.paddles["a"] + 100:
+            ball["dx"] *= -1
+            ball["dx"] *= 1.05
+            ball["dy"] *= 1.05
+        elif ball["x"] >= 970 and self.paddles["b"] <= ball["y"] <= self.paddles["b"] + 100:
+            ball["dx"] *= -1
+            ball["dx"] *= 1.05
+            ball["dy"] *= 1.05
+
+        # Out of left / right boundary
+        if ball["x"] < 0:
+            self.score["b"] += 1
+            return "b"
+        if ball["x"] > 1000:
+            self.score["a"] += 1
+            return "a"
+        return None
+
+    def sweep(self, scale=1):
+        """
+        Swept version of step(): follows the ball's path through the step
+        and bounces it off walls and paddles at the point where it actually
+        crosses them, so no step size lets it tunnel through a paddle.
+        Returns the paddle that scored ('a' or 'b'), or None.
+        """
+        self.move_paddles(scale)
+        ball = self.ball
+        x, y, dx, dy = ball["x"], ball["y"], ball["dx"], ball["dy"]
+
+        # Most steps end well inside the field with nothing in reach; the
+        # 1 unit margins keep this exactly equal to the full sweep below
+        end_x = x + dx * (5 * scale)
+        end_y = y + dy * (5 * scale)
+        if 11 <= end_x <= 969 and 1 <= end_y <= 569:
+            ball["x"], ball["y"] = end_x, end_y
+            return None
+
+        scorer = None
+        missed = False  # Passed a paddle line this step, only the goal is left
+        remaining = 1.0
+
+        for _ in range(MAX_SWEEP_EVENTS):
+            vx = dx * (5 * scale)
+            vy = dy * (5 * scale)
+            # Fraction of the step until the ball reaches a wall, a paddle
+            # line (x = 10 / 970) or a goal line (x = 0 / 1000)
+            t_wall = (0 - y) / vy if vy < 0 else (570 - y) / vy if vy > 0 else INF
+            if vx < 0 and x >= 10 and not missed:
+                t_pad = (10 - x) / vx
+            elif vx > 0 and x <= 970 and not missed:
+                t_pad = (970 - x) / vx
+            else:
+                t_pad = INF
+            t_goal = (0 - x) / vx if vx < 0 else (1000 - x) / vx if vx > 0 else INF
+            t = min(t_wall, t_pad, t_goal)
+
+            if not t < remaining:
+                x += vx * remaining
+                y += vy * remaining
+                break
+            x += vx * t
+            y += vy * t
+            remaining -= t
+
+            if t_wall <= t_pad and t_wall <= t_goal:
+                y = 0.0 if vy < 0 else 570.0
+                dy *= -1
+            elif t_pad <= t_goal:
+                paddle = self.paddles["a"] if vx < 0 else self.paddles["b"]
+                if paddle <= y <= paddle + 100:
+                    x = 10.0 if vx < 0 else 970.0
+                    dx = (dx * -1) * 1.05
+                    dy *= 1.05
+                else:
+                    missed = True
+            else:
+                scorer = "b" if vx < 0 else "a"
+                self.score[scorer] += 1
+                break
+
+        ball["x"], ball["y"], ball["dx"], ball["dy"] = x, y, dx, dy
+        return scorer
+
+    def set_paddle_direction(self, paddle, direction):
+        self.paddle_directions[paddle] = direction
+        if self.engine:
+            self.engine.set_paddle_direction(self, paddle, direction)
+
+    def snapshot(self):
+        return {
+            "type": "update",
+            "paddles": self.paddles,
+            "ball": self.ball,
+            "score": self.score,
+        }
+
+    def update_event(self):
+        """
+        The group message carrying one snapshot to every socket of the game.
+        The snapshot is serialized here, once, not by every receiving consumer.
+        """
+        event = {
+            "type": "send_update",
+            "text": json.dumps(self.snapshot()),
+            "sent_at": time.monotonic(),
+        }
+        if self.binary_clients:
+            seq, keyframe, delta = self.encoder.encode(self.paddles, self.ball, self.score)
+            event["seq"] = seq
+            event["keyframe"] = keyframe
+            event["delta"] = delta
+        return event
+
+    def display_names(self):
+        return {
+            pad: (self.players_info[pad]["display_name"] or self.players_info[pad]["username"])
+            for pad in self.players_info
+        }
+
+    def players_connected_event(self):
+        return {
+            "type": "players_connected",
+            "text": json.dumps({
+                "type": "playersConnected",
+                "count": len(self.players),
+                "players": self.display_names(),
+            }),
+        }
 
     def reset_ball(self):
         # Flip direction so next serve is from the opposite side
@@ -52,11 +303,14 @@ class Game:
         self.paddles = {"a": 250, "b": 250}
         self.score = {"a": 0, "b": 0}
         self.reset_ball()
-        self.game_started = False
-        self.countdown_in_progress = False
         self.paddle_directions = {"a": 0, "b": 0}
         self.ready_players = {"a": False, "b": False}
-        self.game_ended = False
+        for timer in self.phase_timers:
+            timer.cancel()
+        self.phase = WAITING
+        self.phase_timers = []
+        self.accumulator = 0.0
+        self.last_advance = None
 
 
 class GameManager:
@@ -67,6 +321,14 @@ class GameManager:
         self.game_counter = 0
         self.browser_key_to_channel = {}
         self.browser_key_to_game = {}
+        self.game_loop = GameLoop(self)
+        self.matchmaking = MatchmakingQueue()
+        self.lifecycle = LobbyLifecycle(self)
+        self.finalizer = GameFinalizer(self)
+        self.phases = GamePhases(self)
+        self.lobbies = LobbyIndex()
+        # Players without a lobby are paired across all shards, see connect()
+        self.shards = ShardedMatchmaking(self.lobbies) if shard_count() > 1 else None
 
     @classmethod
     def get_instance(cls):
@@ -74,40 +336,109 @@ class GameManager:
             cls.instance = GameManager()
         return cls.instance
 
-    def get_or_create_game(self):
-        # Return an existing game if it has a free slot and not ended
-        for g_id, gm in self.games.items():
-            if len(gm.players) < 2 and not gm.game_ended:
-                return gm
-        self.game_counter += 1
-        new_id = f"game_{self.game_counter}"
+    def get_or_create_game(self, bucket=0):
+        # Oldest open lobby of this rating bucket, or a new one
+        game = self.matchmaking.take(bucket)
+        if game:
+            return game
+        while True:
+            self.game_counter += 1
+            new_id = f"game_{self.game_counter}"
+            if new_id not in self.games:
+                break
         new_game = Game(new_id)
+        new_game.mm_bucket = bucket
+        new_game.matchmade = True
         self.games[new_id] = new_game
+        self.matchmaking.enqueue(new_game)
         return new_game
 
     def delete_game(self, game_id):
         if game_id in self.games:
+            self.matchmaking.remove(self.games[game_id])
+            self.lobbies.remove(game_id)
             del self.games[game_id]
 
 
+class LobbyFeedConsumer(AsyncWebsocketConsumer):
+    """
+    ws/lobbies/?epoch=<epoch>&since=<seq>: a snapshot of the lobby list,
+    then lobby_added / lobby_updated / lobby_removed events as they happen.
+    Reconnecting with the epoch of the last snapshot and the last seq seen
+    replays only the missed events when the server still has them.
+    Events with a seq at or below the snapshot's are already in it.
+    """
+    async def dispatch(self, message):
+        if message["type"] == "lobby_events":
+            await self.lobby_events(message)
+            return
+        await super().dispatch(message)
+
+    async def connect(self):
+        query_params = parse_qs(self.scope["query_string"].decode())
+        epoch = query_params.get("epoch", [None])[0]
+        try:
+            since = int(query_params.get("since", [-1])[0])
+        except ValueError:
+            since = -1
+
+        # Subscribe before reading the index, so no change falls in between
+        await self.channel_layer.group_add(FEED_GROUP, self.channel_name)
+        await self.accept()
+        # The other shards send their lobbies to this one once it listens
+        ShardLink.get_instance().ensure_running()
+        index = GameManager.get_instance().lobbies
+        missed = index.events_since(epoch, since)
+        if missed is None:
+            await self.send(index.snapshot())
+        else:
+            for text in missed:
+                await self.send(text)
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(FEED_GROUP, self.channel_name)
+
+    async def lobby_events(self, event):
+        # Encoded once by the index; every subscriber forwards the same strings
+        for text in event["texts"]:
+            await self.send(text)
+
+
 class PongConsumer(AsyncWebsocketConsumer):
     """
     A WebSocket consumer that manages a Pong game.
     - Both "normal" game end and forced game over on disconnect.
     - The first consumer to end the game writes both winner and loser stats.
     """
+    async def dispatch(self, message):
+        if message["type"] in DB_FREE_MESSAGES:
+            await getattr(self, get_handler_name(message))(message)
+            return
+        await super().dispatch(message)
+
     async def connect(self):
         query_params = parse_qs(self.scope["query_string"].decode())
         browser_key = query_params.get("key", [None])[0]
         lobby_id = query_params.get("lobby", [None])[0]
+        # Opt-in compact binary snapshots, see pong/protocol.py
+        self.binary_protocol = query_params.get("proto", [None])[0] == "bin"
+        self.last_seq = None
 
         if not browser_key:
             await self.close()
             return
 
         game_manager = GameManager.get_instance()
+        ShardLink.get_instance().ensure_running()
 
         # Join or create the game with a specific lobby
+        if lobby_id and not owns(lobby_id):
+            # The shard router sends lobbies to their owner; never split a game
+            await self.close()
+            return
+        if query_params.get("spectate", [None])[0] == "1":
+            await self.connect_spectator(game_manager, lobby_id)
+            return
         if lobby_id:
             if lobby_id in game_manager.games:
                 game = game_manager.games[lobby_id]
@@ -117,17 +448,20 @@ class PongConsumer(AsyncWebsocketConsumer):
             else:
                 game = Game(lobby_id)
                 game_manager.games[lobby_id] = game
+        elif game_manager.shards:
+            # The lobby may live on another shard: the client reconnects
+            # with ?lobby=<id> and the router sends it to the owner
+            bucket = await game_manager.matchmaking.bucket_for(browser_key)
+            await self.accept()
+            await self.send(json.dumps({
+                "type": "joinLobby",
+                "lobby": game_manager.shards.take_or_create(bucket),
+            }))
+            await self.close()
+            return
         else:
-            game = game_manager.get_or_create_game()
-
-        self.game = game
-        self.game_id = game.game_id
-        self.game_group_name = f"game_{self.game_id}"
-        self.browser_key = browser_key
-
-        # Track user in GameManager
-        game_manager.browser_key_to_channel[browser_key] = self.channel_name
-        game_manager.browser_key_to_game[browser_key] = game
+            bucket = await game_manager.matchmaking.bucket_for(browser_key)
+            game = game_manager.get_or_create_game(bucket)
 
         # Decide which paddle (a or b) to assign
         if browser_key not in game.players.values():
@@ -140,24 +474,31 @@ class PongConsumer(AsyncWebsocketConsumer):
         else:
             # Already assigned
             paddle = next(k for k, v in game.players.items() if v == browser_key)
+
+        # Only sockets that got a paddle are tracked; a rejected one has
+        # nothing to clean up in disconnect()
+        self.game = game
+        self.game_id = game.game_id
+        self.game_group_name = f"game_{self.game_id}"
+        self.browser_key = browser_key
         self.paddle = paddle
+        game_manager.browser_key_to_channel[browser_key] = self.channel_name
+        game_manager.browser_key_to_game[browser_key] = game
+        game.touch()
+        game_manager.lifecycle.ensure_running()
+        if self.binary_protocol:
+            game.binary_clients += 1
+        game_manager.matchmaking.update(game)
 
         # Tournament logic
         manager = TournamentManager.get_instance()
-        tournament = manager.get_tournament()
+        # Marks the match 'in_progress' and tells the tournament's subscribers
+        tournament = await manager.join_match_async(self.game_id)
         display_name_for_this_user = None
         if tournament:
-            match_for_this_game = next(
-                (m for m in tournament.get("matches", []) if m.get("game_id") == self.game_id),
-                None
-            )
-            if match_for_this_game:
-                # Mark match as 'in_progress'
-                match_for_this_game["in_progress"] = True
-                match_for_this_game["connected_count"] = match_for_this_game.get("connected_count", 0) + 1
-                await manager.broadcast_update_async()
-                # If the tournament has a custom display_name for this user
-                display_name_for_this_user = tournament.get("display_names", {}).get(browser_key)
+            game.is_tournament = True
+            # If the tournament has a custom display_name for this user
+            display_name_for_this_user = tournament.get("display_names", {}).get(browser_key)
 
         # Fallback to the browser_key if no display name
         user_label = display_name_for_this_user if display_name_for_this_user else browser_key
@@ -168,6 +509,7 @@ class PongConsumer(AsyncWebsocketConsumer):
                 "username": browser_key,
                 "display_name": user_label,
             }
+        game_manager.lobbies.update(game)
 
         await self.accept()
 
@@ -176,10 +518,9 @@ class PongConsumer(AsyncWebsocketConsumer):
             "type": "assignPaddle",
             "paddle": paddle,
             "game_id": self.game_id,
-            "players": {
-                pad: (game.players_info[pad]["display_name"] or game.players_info[pad]["username"])
-                for pad in game.players_info
-            }
+            "protocol": "bin" if self.binary_protocol else "json",
+            "tickRate": game_manager.game_loop.tick_rate,
+            "players": game.display_names(),
         }))
 
         # Join the channel group for this game
@@ -188,16 +529,34 @@ class PongConsumer(AsyncWebsocketConsumer):
         # Notify the group about current players
         await self.channel_layer.group_send(
             self.game_group_name,
-            {
-                "type": "players_connected",
-                "count": len(game.players),
-                "players": {
-                    pad: (game.players_info[pad]["display_name"] or game.players_info[pad]["username"])
-                    for pad in game.players_info
-                },
-            }
+            game.players_connected_event()
         )
 
+    async def connect_spectator(self, game_manager, lobby_id):
+        """
+        Watch a game without taking a paddle. Spectators are not in the game
+        group: the game loop writes snapshots to them directly at
+        PONG_SPECTATOR_RATE, after the players, see GameLoop.feed_spectators().
+        """
+        game = game_manager.games.get(lobby_id)
+        if not game or game.game_ended:
+            await self.close()
+            return
+        self.game = game
+        self.spectating = True
+        self.last_frame = 0.0
+
+        await self.accept()
+        await self.send(json.dumps({
+            "type": "spectate",
+            "game_id": game.game_id,
+            "tickRate": game_manager.game_loop.tick_rate,
+            "players": game.display_names(),
+        }))
+        await self.send(json.dumps(game.snapshot()))
+        game.spectators.append(self)
+        game.spectator_count += 1
+
     async def disconnect(self, close_code):
         game_manager = GameManager.get_instance()
         game = getattr(self, "game", None)
@@ -205,6 +564,15 @@ class PongConsumer(AsyncWebsocketConsumer):
         if not game:
             return
 
+        if getattr(self, "spectating", False):
+            # The game loop drops it from game.spectators on its next pass
+            self.spectating = False
+            game.spectator_count -= 1
+            return
+
+        if getattr(self, "binary_protocol", False) and hasattr(self, "paddle"):
+            game.binary_clients -= 1
+
         # If the game is already ended, do nothing special
         if game.game_ended:
             # Still remove references from manager
@@ -216,6 +584,7 @@ class PongConsumer(AsyncWebsocketConsumer):
             return
 
         # Not ended => try forced game over if appropriate
+        game.touch()
         if self.browser_key in game_manager.browser_key_to_channel:
             del game_manager.browser_key_to_channel[self.browser_key]
         if self.browser_key in game_manager.browser_key_to_game:
@@ -242,28 +611,26 @@ class PongConsumer(AsyncWebsocketConsumer):
                 )
             elif remaining_players == 0:
                 # 0 remain => no winner
-                game.game_ended = True
+                game_manager.phases.transition(game, ENDED)
                 game_manager.delete_game(self.game_id)
         else:
             # No forced winner if game wasn't started
             if remaining_players == 0:
-                game.game_ended = True
+                game_manager.phases.transition(game, ENDED)
                 game_manager.delete_game(self.game_id)
 
+        if not game.game_ended:
+            # A lobby that lost a player before starting is open again
+            game_manager.matchmaking.update(game)
+            game_manager.lobbies.update(game)
+
         await self.channel_layer.group_discard(self.game_group_name, self.channel_name)
 
         # Optionally update the group with who’s left
         if not game.game_ended:
             await self.channel_layer.group_send(
                 self.game_group_name,
-                {
-                    "type": "players_connected",
-                    "count": len(game.players),
-                    "players": {
-                        pad: (game.players_info[pad]["display_name"] or game.players_info[pad]["username"])
-                        for pad in game.players_info
-                    },
-                }
+                game.players_connected_event()
             )
 
     async def receive(self, text_data):
@@ -272,18 +639,19 @@ class PongConsumer(AsyncWebsocketConsumer):
         if self.game.game_ended:
             return  # No further actions if the game ended
 
+        self.game.touch()
         data = json.loads(text_data)
         msg_type = data.get("type")
 
         if msg_type == "paddleMove":
             direction_key = data.get("key")
             if direction_key == "up":
-                self.game.paddle_directions[self.paddle] = -1
+                self.game.set_paddle_direction(self.paddle, -1)
             elif direction_key == "down":
-                self.game.paddle_directions[self.paddle] = 1
+                self.game.set_paddle_direction(self.paddle, 1)
 
         elif msg_type == "paddleStop":
-            self.game.paddle_directions[self.paddle] = 0
+            self.game.set_paddle_direction(self.paddle, 0)
 
         elif msg_type == "playerReady":
             self.game.ready_players[self.paddle] = True
@@ -291,244 +659,56 @@ class PongConsumer(AsyncWebsocketConsumer):
                 self.game_group_name,
                 {
                     "type": "player_ready_state",
-                    "readyPlayers": self.game.ready_players
+                    "text": json.dumps({
+                        "type": "playerReadyState",
+                        "readyPlayers": self.game.ready_players
+                    }),
                 }
             )
-            # Start countdown if both ready
+            # Start countdown if both ready; refused unless still waiting
             if (len(self.game.players) == 2
                     and self.game.ready_players["a"]
-                    and self.game.ready_players["b"]
-                    and not self.game.game_started
-                    and not self.game.countdown_in_progress):
-                create_task(self.start_countdown_and_start_game())
+                    and self.game.ready_players["b"]):
+                await GameManager.get_instance().phases.start_countdown(self.game)
+
+    # Group message handlers: the payload arrives already encoded in
+    # event["text"], so every consumer forwards the same string.
 
     async def players_connected(self, event):
-        await self.send(json.dumps({
-            "type": "playersConnected",
-            "count": event["count"],
-            "players": event.get("players", {})
-        }))
+        await self.send(event["text"])
 
     async def player_ready_state(self, event):
-        await self.send(json.dumps({
-            "type": "playerReadyState",
-            "readyPlayers": event["readyPlayers"]
-        }))
+        await self.send(event["text"])
 
     async def send_update(self, event):
-        await self.send(json.dumps(event["message"]))
-
-    async def countdown(self):
-        for val in [3, 2, 1, "GO!"]:
-            if self.game.game_ended or len(self.game.players) < 2:
-                self.game.countdown_in_progress = False
-                return
-            await self.channel_layer.group_send(
-                self.game_group_name,
-                {"type": "countdown_tick", "value": val}
-            )
-            await sleep(1)
-
-    async def start_countdown_and_start_game(self):
-        g = self.game
-        if g.game_ended or len(g.players) < 2:
-            return
-
-        g.countdown_in_progress = True
-        await self.channel_layer.group_send(
-            self.game_group_name,
-            {"type": "countdown_start"}
-        )
-        await self.countdown()
-
-        if g.game_ended or len(g.players) < 2:
-            g.countdown_in_progress = False
-            return
-
-        await self.channel_layer.group_send(
-            self.game_group_name,
-            {"type": "countdown_end"}
-        )
-        g.countdown_in_progress = False
-        g.game_started = True
-
-        self.update_ball_task = create_task(self.update_ball())
-        self.broadcast_game_state_task = create_task(self.broadcast_game_state())
-
-    async def update_ball(self):
-        g = self.game
-        paddle_speed = 5
-        min_paddle, max_paddle = 0, 500
-
-        while g.game_started and not g.game_ended and len(g.players) == 2:
-            # Move paddles
-            g.paddles["a"] += g.paddle_directions["a"] * paddle_speed
-            g.paddles["b"] += g.paddle_directions["b"] * paddle_speed
-            g.paddles["a"] = max(min_paddle, min(max_paddle, g.paddles["a"]))
-            g.paddles["b"] = max(min_paddle, min(max_paddle, g.paddles["b"]))
-
-            # Move ball
-            g.ball["x"] += g.ball["dx"] * 5
-            g.ball["y"] += g.ball["dy"] * 5
-
-            # Bounce top/bottom
-            if g.ball["y"] <= 0 or g.ball["y"] >= 570:
-                g.ball["dy"] *= -1
-
-            # Paddle collisions
-            if g.ball["x"] <= 10 and g.paddles["a"] <= g.ball["y"] <= g.paddles["a"] + 100:
-                g.ball["dx"] *= -1
-                g.ball["dx"] *= 1.05
-                g.ball["dy"] *= 1.05
-            elif (g.ball["x"] >= 970
-                  and g.paddles["b"] <= g.ball["y"] <= g.paddles["b"] + 100):
-                g.ball["dx"] *= -1
-                g.ball["dx"] *= 1.05
-                g.ball["dy"] *= 1.05
-
-            # Out of left boundary
-            if g.ball["x"] < 0:
-                g.score["b"] += 1
-                await self.channel_layer.group_send(
-                    self.game_group_name,
-                    {
-                        "type": "send_update",
-                        "message": {
-                            "type": "update",
-                            "paddles": g.paddles,
-                            "ball": g.ball,
-                            "score": g.score,
-                        }
-                    }
-                )
-                g.reset_ball()
-                # Another serve countdown
-                if g.score["b"] < g.MAX_SCORE and g.score["a"] < g.MAX_SCORE:
-                    await self.start_countdown_after_score()
-
-            # Out of right boundary
-            elif g.ball["x"] > 1000:
-                g.score["a"] += 1
-                await self.channel_layer.group_send(
-                    self.game_group_name,
-                    {
-                        "type": "send_update",
-                        "message": {
-                            "type": "update",
-                            "paddles": g.paddles,
-                            "ball": g.ball,
-                            "score": g.score,
-                        }
-                    }
-                )
-                g.reset_ball()
-                if g.score["a"] < g.MAX_SCORE and g.score["b"] < g.MAX_SCORE:
-                    await self.start_countdown_after_score()
-
-            # Check game over
-            if g.score["a"] >= g.MAX_SCORE or g.score["b"] >= g.MAX_SCORE:
-                winner_pad = "a" if g.score["a"] >= g.MAX_SCORE else "b"
-                loser_pad = "b" if winner_pad == "a" else "a"
-                winner_user = g.players.get(winner_pad, "Unknown")
-                loser_user = g.players.get(loser_pad, "Unknown")
-
-                await self.channel_layer.group_send(
-                    self.game_group_name,
-                    {
-                        "type": "game_over",
-                        "winner": winner_user,
-                        "loser": loser_user
-                    }
-                )
-                break
-
-            await sleep(1/60)
-
-    async def start_countdown_after_score(self):
-        g = self.game
-        if g.game_ended or len(g.players) < 2:
-            return
-        g.countdown_in_progress = True
-        await self.channel_layer.group_send(
-            self.game_group_name,
-            {"type": "countdown_start"}
-        )
-        await self.countdown()
-        if g.game_ended or len(g.players) < 2:
-            g.countdown_in_progress = False
+        GameManager.get_instance().game_loop.record_delivery(time.monotonic() - event["sent_at"])
+        if self.binary_protocol and "delta" in event:
+            seq = event["seq"]
+            # A delta is only valid on top of the previous frame we sent
+            if self.last_seq is not None and seq == (self.last_seq + 1) & 0xFFFFFFFF:
+                await self.send(bytes_data=event["delta"])
+            else:
+                await self.send(bytes_data=event["keyframe"])
+            self.last_seq = seq
             return
-        await self.channel_layer.group_send(
-            self.game_group_name,
-            {"type": "countdown_end"}
-        )
-        g.countdown_in_progress = False
-
-    async def broadcast_game_state(self):
-        g = self.game
-        while g.game_started and not g.game_ended and len(g.players) == 2:
-            await self.channel_layer.group_send(
-                self.game_group_name,
-                {
-                    "type": "send_update",
-                    "message": {
-                        "type": "update",
-                        "paddles": g.paddles,
-                        "ball": g.ball,
-                        "score": g.score,
-                    }
-                }
-            )
-            await sleep(1/60)
+        await self.send(event["text"])
 
     async def countdown_start(self, event):
-        await self.send(json.dumps({"type": "countdownStart"}))
+        await self.send(COUNTDOWN_START_TEXT)
 
     async def countdown_end(self, event):
-        await self.send(json.dumps({"type": "countdownEnd"}))
+        await self.send(COUNTDOWN_END_TEXT)
 
     async def countdown_tick(self, event):
-        await self.send(json.dumps({
-            "type": "countdown_tick",
-            "value": event["value"]
-        }))
-
-    @database_sync_to_async
-    def _record_match_history(self, userA, userB, resultA):
-        """
-        Record a single row: userA got 'resultA' (True=WIN, False=LOSS) vs userB.
-        If the user is not in DB, skip silently.
-        """
-        try:
-            if resultA:
-                # userA = winner, userB = loser
-                winner_obj = PongUser.objects.get(username=userA)
-                loser_obj = PongUser.objects.get(username=userB)
-                MatchHistory.objects.create(
-                    game_id=self.game_id,
-                    player=winner_obj,
-                    opponent=loser_obj,
-                    result=MatchHistory.WIN,
-                    date_played=now()
-                )
-            else:
-                # userA = loser, userB = winner
-                loser_obj = PongUser.objects.get(username=userA)
-                winner_obj = PongUser.objects.get(username=userB)
-                MatchHistory.objects.create(
-                    game_id=self.game_id,
-                    player=loser_obj,
-                    opponent=winner_obj,
-                    result=MatchHistory.LOSS,
-                    date_played=now()
-                )
-        except PongUser.DoesNotExist:
-            pass
+        await self.send(event["text"])
 
     async def game_over(self, event):
         """
         Called by group_send when the game ends (naturally or forced).
         Both consumers call this, but only the first time do we do DB/tournament logic.
         """
+        started = time.perf_counter()
+        game_manager = GameManager.get_instance()
         winner_username = event["winner"]
         loser_username = event["loser"]
 
@@ -539,91 +719,35 @@ class PongConsumer(AsyncWebsocketConsumer):
         )
 
         already_ended = self.game.game_ended
-        self.game.game_ended = True
-        self.game.game_started = False
-        self.game.countdown_in_progress = False
+        game_manager.phases.transition(self.game, ENDED)
+        self.game.touch()
 
-        # If I'm the first consumer to handle this gameOver => do the DB/tournament logic for both sides
+        # If I'm the first consumer to handle this gameOver => schedule the
+        # result/tournament work and the redirect for both sides. It runs in
+        # its own task, so this handler returns right away.
         if not already_ended:
-            # Even if loser is offline, we'll record their LOSS from here
-            if winner_username != "Unknown" and loser_username != "Unknown":
-                # Record winner's WIN
-                await self._record_match_history(winner_username, loser_username, True)
-                # Record loser's LOSS
-                await self._record_match_history(loser_username, winner_username, False)
-
-            # Tournament logic
-            is_tournament_game = False
-            final_winner_label = winner_username
-            manager = TournamentManager.get_instance()
-            tournament = manager.get_tournament()
-            if tournament:
-                match_for_this_game = next(
-                    (m for m in tournament.get("matches", []) if m.get("game_id") == self.game_id),
-                    None
-                )
-                if match_for_this_game:
-                    if match_for_this_game["winner"] is None:
-                        result = await manager.update_match_result_by_game_id_async(self.game_id, winner_username)
-                        if not result.get("error"):
-                            is_tournament_game = True
-                    else:
-                        is_tournament_game = True
-
-                    # Possibly get display name
-                    winner_paddle = next((k for k, v in self.game.players.items() if v == winner_username), None)
-                    if winner_paddle and winner_paddle in self.game.players_info:
-                        disp = self.game.players_info[winner_paddle].get("display_name")
-                        if disp:
-                            final_winner_label = disp
-
-            # Send gameOver to everyone in the group
-            # (They each run their local code in game_over, but we also want them to see the final winner.)
-            await self.channel_layer.group_send(
-                self.game_group_name,
-                {
-                    "type": "send_gameover_to_client",
-                    "winner_label": final_winner_label
-                }
-            )
-
-            # Wait 3 sec, do redirect, then delete the game
-            await sleep(3)
-            if is_tournament_game:
-                await self.channel_layer.group_send(
-                    self.game_group_name,
-                    {"type": "redirect_tournament"}
-                )
-            else:
-                await self.channel_layer.group_send(
-                    self.game_group_name,
-                    {"type": "redirect_play"}
-                )
-
-            GameManager.get_instance().delete_game(self.game_id)
-
+            game_manager.finalizer.finish(self.game, winner_username, loser_username)
         else:
             # The game is already ended, so just send them the local gameOver UI
             # with the best known "winner" label
             await self.channel_layer.group_send(
                 self.game_group_name,
-                {
-                    "type": "send_gameover_to_client",
-                    "winner_label": winner_username
-                }
+                send_gameover_event(winner_username)
             )
+        game_manager.finalizer.record_handler(time.perf_counter() - started)
 
     async def send_gameover_to_client(self, event):
         """
         Actually deliver the "type: gameOver" message to the *individual* consumer.
         """
-        await self.send(json.dumps({
-            "type": "gameOver",
-            "winner": event.get("winner_label", "Unknown")
-        }))
+        await self.send(event["text"])
+
+    async def lobby_expired(self, event):
+        # Evicted by the LobbyLifecycle sweeper after sitting idle
+        await self.close()
 
     async def redirect_tournament(self, event):
-        await self.send(json.dumps({"type": "redirectToTournament"}))
+        await self.send(REDIRECT_TOURNAMENT_TEXT)
 
     async def redirect_play(self, event):
-        await self.send(json.dumps({"type": "redirectToPlay"}))
+        await self.send(REDIRECT_PLAY_TEXT)
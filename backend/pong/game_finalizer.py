@@ -0,0 +1,128 @@
+import asyncio
+import json
+import time
+from collections import deque
+from django.conf import settings
+from channels.layers import get_channel_layer
+from .game_loop import percentiles
+from .match_results import MatchResultWriter
+from .tournament_manager import TournamentManager
+
+
+class GameFinalizer:
+    """
+    Runs the end-of-game work off the consumers' message handlers.
+
+    PongConsumer.game_over only ends the game's phase and calls finish();
+    the match result, tournament update and gameOver broadcast then run in
+    one task per game, and the redirect, which also deletes the game, is a
+    timer on the GamePhases wheel PONG_REDIRECT_DELAY seconds later. The
+    consumers keep handling messages in the meantime.
+
+    game_over handler durations are sampled so a slow handler shows up in
+    the stats instead of as a stalled socket.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.redirect_delay = getattr(settings, "PONG_REDIRECT_DELAY", 3)
+        self.tasks = {}   # game_id -> finalizer task
+        self.timers = {}  # game_id -> redirect Timer on the phases' wheel
+        self.finalized = 0
+        self.redirected = 0
+        self.handler_samples = deque(maxlen=1024)
+        self.finalize_samples = deque(maxlen=1024)
+
+    def finish(self, g, winner, loser):
+        """
+        Schedule the end-of-game work for `g`, at most once per game.
+        """
+        if g.game_id in self.tasks or g.game_id in self.timers:
+            return
+        task = asyncio.get_running_loop().create_task(self.finalize(g, winner, loser))
+        self.tasks[g.game_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(g.game_id, None))
+
+    async def finalize(self, g, winner, loser):
+        started = time.perf_counter()
+        channel_layer = get_channel_layer()
+        is_tournament_game = False
+        final_winner_label = winner
+        try:
+            # Even if loser is offline, we'll record their LOSS from here.
+            # Queued only; MatchResultWriter writes it in the next batch.
+            if winner != "Unknown" and loser != "Unknown":
+                MatchResultWriter.get_instance().record(g.game_id, winner, loser)
+
+            # Tournament logic
+            # Recorded by the home shard, which holds the tournaments
+            manager = TournamentManager.get_instance()
+            is_tournament_game = await manager.finish_match_async(g.game_id, winner)
+            if is_tournament_game:
+                # Possibly get display name
+                winner_paddle = next((k for k, v in g.players.items() if v == winner), None)
+                if winner_paddle and winner_paddle in g.players_info:
+                    disp = g.players_info[winner_paddle].get("display_name")
+                    if disp:
+                        final_winner_label = disp
+
+            # Everyone in the group sees the final winner label
+            event = send_gameover_event(final_winner_label)
+            await channel_layer.group_send(g.group_name, event)
+            await self.manager.game_loop.notify_spectators(g, event["text"])
+        except Exception as e:
+            print("Error finalizing game:", str(e))
+        finally:
+            self.finalized += 1
+            self.finalize_samples.append((time.perf_counter() - started) * 1000)
+        # Evicted while this ran: the result is recorded, but there is
+        # nothing left to redirect. A cancelled task never gets here.
+        if self.manager.games.get(g.game_id) is not g:
+            return
+        self.timers[g.game_id] = self.manager.phases.wheel.schedule(
+            self.redirect_delay, self.redirect, g, is_tournament_game
+        )
+
+    async def redirect(self, g, is_tournament_game):
+        self.timers.pop(g.game_id, None)
+        if self.manager.games.get(g.game_id) is not g:
+            return  # Already evicted
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send(
+            g.group_name,
+            {"type": "redirect_tournament" if is_tournament_game else "redirect_play"}
+        )
+        await self.manager.game_loop.close_spectators(g)
+        self.manager.delete_game(g.game_id)
+        self.redirected += 1
+
+    def cancel(self, g):
+        """
+        Drop a pending redirect, for a game deleted by someone else. A
+        finalize task still running sees the game is gone and skips it.
+        """
+        timer = self.timers.pop(g.game_id, None)
+        if timer:
+            timer.cancel()
+
+    def record_handler(self, elapsed):
+        self.handler_samples.append(elapsed * 1000)
+
+    def get_stats(self):
+        return {
+            "redirect_delay": self.redirect_delay,
+            "finalizing": len(self.tasks),
+            "redirects_pending": len(self.timers),
+            "finalized": self.finalized,
+            "redirected": self.redirected,
+            "game_over_handler_ms": percentiles(self.handler_samples),
+            "game_over_handler_max_ms": round(max(self.handler_samples, default=0), 3),
+            "finalize_ms": percentiles(self.finalize_samples),
+        }
+
+
+def send_gameover_event(winner_label):
+    return {
+        "type": "send_gameover_to_client",
+        "text": json.dumps({"type": "gameOver", "winner": winner_label or "Unknown"}),
+    }
@@ -0,0 +1,293 @@
+import asyncio
+import time
+from collections import deque
+from django.conf import settings
+from channels.layers import get_channel_layer
+from .physics import create_engine
+from .game_phases import GAME_OVER
+
+# Frames per second the paddle and ball speeds were tuned for
+PHYSICS_RATE = 60
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0, "p95": 0, "p99": 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        f"p{p}": round(ordered[min(last, int(len(ordered) * p / 100))], 3)
+        for p in (50, 95, 99)
+    }
+
+
+class GameLoop:
+    """
+    One shared scheduler for every running Pong game.
+    Each tick advances all active games in a single pass and then emits
+    one snapshot per game, instead of every game running its own
+    update/broadcast tasks with their own sleeps.
+
+    In fixed-timestep mode every game keeps an accumulator of real elapsed
+    time and runs as many constant-size physics steps as it owes, so a late
+    tick is caught up instead of slowing the game down. Catch-up is capped
+    at PONG_MAX_CATCHUP_STEPS per tick; the rest of the backlog is dropped
+    and counted as an overrun.
+
+    PONG_TICK_RATE may be set below PHYSICS_RATE to save CPU; every step
+    then covers PHYSICS_RATE / PONG_TICK_RATE frames of movement and the
+    clients interpolate between snapshots. Use PONG_COLLISION = "swept"
+    with it, so longer steps cannot carry the ball through a paddle.
+
+    Spectators get the snapshot text already encoded for the players, in
+    the idle time between ticks, at PONG_SPECTATOR_RATE and within
+    PONG_SPECTATOR_BUDGET_MS per tick. When there are more spectators than
+    that time allows, they get fewer frames; the players do not wait.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.task = None
+        self.fixed_timestep = getattr(settings, "PONG_FIXED_TIMESTEP", True)
+        self.max_catchup_steps = getattr(settings, "PONG_MAX_CATCHUP_STEPS", 5)
+        self.tick_rate = getattr(settings, "PONG_TICK_RATE", PHYSICS_RATE)
+        self.tick_interval = 1 / self.tick_rate
+        # Spectators are fed this long after a tick, once the player consumers ran
+        self.spectator_delay = self.tick_interval / 4
+        scale = PHYSICS_RATE / self.tick_rate
+        self.collision = getattr(settings, "PONG_COLLISION", "discrete")
+        self.engine = create_engine(
+            getattr(settings, "PONG_PHYSICS_ENGINE", "scalar"),
+            self.collision,
+            int(scale) if scale.is_integer() else scale,
+        )
+        self.spectator_rate = getattr(settings, "PONG_SPECTATOR_RATE", 10)
+        self.spectator_budget = getattr(settings, "PONG_SPECTATOR_BUDGET_MS", 4) / 1000
+        self.spectator_backlog = []
+        self.spectator_frames = 0
+        self.spectator_over_budget = 0
+        self.tick_count = 0
+        self.last_tick_ms = 0.0
+        self.avg_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self.last_lateness_ms = 0.0
+        self.max_lateness_ms = 0.0
+        self.active_games = 0
+        # Recent samples for percentiles, in milliseconds
+        self.tick_samples = deque(maxlen=2048)
+        self.delivery_samples = deque(maxlen=4096)
+
+    def ensure_running(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def active(self):
+        return [
+            g for g in self.manager.games.values()
+            if g.game_started and not g.game_ended and not g.game_over_pending
+            and len(g.players) == 2
+        ]
+
+    async def run(self):
+        next_tick = time.perf_counter()
+        while True:
+            started = time.perf_counter()
+            games = self.active()
+            if not games:
+                break
+            # How late this tick woke up compared to its schedule
+            self._record_lateness(max(0.0, started - next_tick))
+            try:
+                await self.tick(games, started)
+            except Exception as e:
+                print("Error in game loop tick:", str(e))
+            finished = time.perf_counter()
+            self._record_tick(finished - started, len(games))
+
+            # Sleep until the next scheduled tick rather than a fixed interval,
+            # so the time spent ticking does not add up as drift.
+            next_tick += self.tick_interval
+            if next_tick < finished:
+                # Too far behind to keep the schedule; the accumulators
+                # catch the games up, the loop just resynchronises.
+                next_tick = finished
+            if self.spectator_backlog and next_tick - finished > 2 * self.spectator_delay:
+                # Spectators only get idle time; a loop that is behind skips them
+                await asyncio.sleep(self.spectator_delay)
+                await self.feed_spectators(self.spectator_backlog, started, next_tick)
+            self.spectator_backlog = []
+            await asyncio.sleep(next_tick - time.perf_counter())
+        self.engine.prune([])
+        self.active_games = 0
+
+    def steps_owed(self, g, now):
+        """
+        How many physics steps game `g` should run this tick.
+        """
+        if not self.fixed_timestep:
+            return 1
+        if g.last_advance is None:
+            g.last_advance = now
+            return 1
+        g.accumulator += now - g.last_advance
+        g.last_advance = now
+        g.last_lateness_ms = max(0.0, g.accumulator - self.tick_interval) * 1000
+        g.max_lateness_ms = max(g.max_lateness_ms, g.last_lateness_ms)
+
+        steps = int(g.accumulator / self.tick_interval)
+        if steps > self.max_catchup_steps:
+            # Spiral-of-death guard: drop the backlog we cannot afford
+            g.overruns += 1
+            g.accumulator = 0.0
+            return self.max_catchup_steps
+        g.accumulator -= steps * self.tick_interval
+        return steps
+
+    async def tick(self, games, now):
+        channel_layer = get_channel_layer()
+        self.engine.prune(games)
+        plan = []
+        for g in games:
+            # Serve countdown after a point pauses the physics, not the snapshots
+            if g.countdown_in_progress:
+                g.last_advance = None
+                g.accumulator = 0.0
+                continue
+            steps = self.steps_owed(g, now)
+            if steps > 1:
+                g.catchup_steps += steps - 1
+            if steps:
+                plan.append((g, steps))
+
+        for g, scorer in self.engine.advance(plan):
+            # The ball is re-served after a countdown; owed steps are void
+            g.accumulator = 0.0
+            await self.handle_score(channel_layer, g)
+
+        frames = []
+        for g in games:
+            if g.game_over_pending:
+                continue
+            event = g.update_event()
+            await channel_layer.group_send(g.group_name, event)
+            if g.spectators:
+                frames.append((g, event["text"]))
+        self.spectator_backlog = frames
+
+    async def feed_spectators(self, frames, now, next_tick):
+        """
+        Write the last tick's frames straight to the spectator sockets,
+        without a channel layer hop per spectator. Runs between ticks and
+        stops at the budget or before the next tick is due. Each game's
+        spectators are kept least recently served first, so a pass also
+        stops at the first one that is not due yet.
+        """
+        interval = 1 / self.spectator_rate
+        deadline = min(
+            time.perf_counter() + self.spectator_budget, next_tick - self.spectator_delay
+        )
+        # Rotate the starting game so a tight budget is shared fairly
+        start = self.tick_count % len(frames)
+        for g, text in frames[start:] + frames[:start]:
+            spectators = g.spectators
+            for _ in range(len(spectators)):
+                spectator = spectators[0]
+                if not spectator.spectating:
+                    spectators.popleft()
+                    continue
+                if now - spectator.last_frame < interval:
+                    break
+                spectators.rotate(-1)
+                spectator.last_frame = now
+                try:
+                    await spectator.send(text)
+                except Exception:
+                    spectator.spectating = False
+                self.spectator_frames += 1
+                if time.perf_counter() > deadline:
+                    self.spectator_over_budget += 1
+                    return
+
+    async def handle_score(self, channel_layer, g):
+        # Snapshot with the new score before the ball is re-served
+        await channel_layer.group_send(g.group_name, g.update_event())
+        self.engine.reset_ball(g)
+
+        if g.score["a"] >= g.MAX_SCORE or g.score["b"] >= g.MAX_SCORE:
+            winner_pad = "a" if g.score["a"] >= g.MAX_SCORE else "b"
+            loser_pad = "b" if winner_pad == "a" else "a"
+            self.manager.phases.transition(g, GAME_OVER)
+            await channel_layer.group_send(g.group_name, {
+                "type": "game_over",
+                "winner": g.players.get(winner_pad, "Unknown"),
+                "loser": g.players.get(loser_pad, "Unknown"),
+            })
+        else:
+            # Another serve countdown; the phase pauses physics right away
+            await self.manager.phases.serve(g)
+
+    async def notify_spectators(self, g, text):
+        for spectator in list(g.spectators):
+            if spectator.spectating:
+                await spectator.send(text)
+
+    async def close_spectators(self, g):
+        for spectator in list(g.spectators):
+            if spectator.spectating:
+                await spectator.close()
+        g.spectators.clear()
+
+    def _record_tick(self, elapsed, game_count):
+        tick_ms = elapsed * 1000
+        self.tick_count += 1
+        self.last_tick_ms = tick_ms
+        self.max_tick_ms = max(self.max_tick_ms, tick_ms)
+        # Exponential moving average keeps this O(1) per tick
+        self.avg_tick_ms += (tick_ms - self.avg_tick_ms) * 0.05
+        self.active_games = game_count
+        self.tick_samples.append(tick_ms)
+
+    def record_delivery(self, latency):
+        """
+        Time a snapshot spent between the tick that produced it and the
+        consumer that forwards it to its socket.
+        """
+        self.delivery_samples.append(latency * 1000)
+
+    def _record_lateness(self, late):
+        self.last_lateness_ms = late * 1000
+        self.max_lateness_ms = max(self.max_lateness_ms, self.last_lateness_ms)
+
+    def get_stats(self):
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "tick_rate": self.tick_rate,
+            "physics": self.engine.get_stats(),
+            "fixed_timestep": self.fixed_timestep,
+            "max_catchup_steps": self.max_catchup_steps,
+            "spectator_rate": self.spectator_rate,
+            "spectators": sum(g.spectator_count for g in self.manager.games.values()),
+            "spectator_frames": self.spectator_frames,
+            "spectator_ticks_over_budget": self.spectator_over_budget,
+            "ticks": self.tick_count,
+            "active_games": self.active_games,
+            "last_tick_ms": round(self.last_tick_ms, 3),
+            "avg_tick_ms": round(self.avg_tick_ms, 3),
+            "max_tick_ms": round(self.max_tick_ms, 3),
+            "tick_ms": percentiles(self.tick_samples),
+            "delivery_latency_ms": percentiles(self.delivery_samples),
+            "avg_tick_ms_per_game": (
+                round(self.avg_tick_ms / self.active_games, 4) if self.active_games else 0
+            ),
+            "last_lateness_ms": round(self.last_lateness_ms, 3),
+            "max_lateness_ms": round(self.max_lateness_ms, 3),
+            "games": {g.game_id: self.game_timing(g) for g in self.active()},
+        }
+
+    def game_timing(self, g):
+        return {
+            "overruns": g.overruns,
+            "catchup_steps": g.catchup_steps,
+            "last_lateness_ms": round(g.last_lateness_ms, 3),
+            "max_lateness_ms": round(g.max_lateness_ms, 3),
+        }
@@ -0,0 +1,138 @@
+import json
+from django.conf import settings
+from channels.layers import get_channel_layer
+from .timer_wheel import TimerWheel
+
+# A game's phase; Game.game_started and the other flags are read from it
+WAITING = "waiting"      # Lobby open, players joining and readying up
+COUNTDOWN = "countdown"  # Both ready, 3-2-1 before the first serve
+PLAYING = "playing"
+SERVING = "serving"      # Countdown before the serve after a point
+GAME_OVER = "game_over"  # Final point scored, game_over in flight
+ENDED = "ended"
+
+TRANSITIONS = {
+    WAITING: {COUNTDOWN, ENDED},
+    COUNTDOWN: {PLAYING, WAITING, ENDED},
+    PLAYING: {SERVING, GAME_OVER, ENDED},
+    SERVING: {PLAYING, ENDED},
+    GAME_OVER: {ENDED},
+    ENDED: set(),
+}
+
+COUNTDOWN_VALUES = [3, 2, 1, "GO!"]
+# Encoded once; every countdown sends the same four frames
+COUNTDOWN_TICK_EVENTS = [
+    {
+        "type": "countdown_tick",
+        "text": json.dumps({"type": "countdown_tick", "value": val}),
+    }
+    for val in COUNTDOWN_VALUES
+]
+
+
+class GamePhases:
+    """
+    Per-game phase state machine, with the countdowns driven by one
+    TimerWheel for the whole worker.
+
+    Every phase change goes through transition(), which only allows the
+    moves in TRANSITIONS. Two paths racing for the same game (both players
+    readying at once, a disconnect during a countdown) can therefore not
+    both win: the second transition is refused. Leaving a phase cancels
+    the timers scheduled for it.
+
+    A countdown is five wheel timers (the four ticks, one
+    PONG_COUNTDOWN_STEP apart, and the end) instead of a coroutine sleeping
+    through it, so thousands of games counting down cost thousands of
+    wheel entries, not thousands of tasks.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.wheel = TimerWheel(getattr(settings, "PONG_TIMER_RESOLUTION", 0.01))
+        self.step = getattr(settings, "PONG_COUNTDOWN_STEP", 1)
+        self.transitions = 0
+        self.refused = 0
+
+    def transition(self, g, phase):
+        if phase not in TRANSITIONS[g.phase]:
+            self.refused += 1
+            return False
+        g.phase = phase
+        self.transitions += 1
+        for timer in g.phase_timers:
+            timer.cancel()
+        g.phase_timers = []
+        if self.manager.games.get(g.game_id) is g:
+            self.manager.lobbies.update(g)
+        return True
+
+    async def start_countdown(self, g):
+        """
+        Both players are ready: count down, then start the game.
+        """
+        if len(g.players) < 2 or not self.transition(g, COUNTDOWN):
+            return
+        g.touch()
+        await self._countdown(g, COUNTDOWN)
+
+    async def serve(self, g):
+        """
+        A point was scored: pause the physics and count down to the serve.
+        """
+        if not self.transition(g, SERVING):
+            return
+        await self._countdown(g, SERVING)
+
+    async def _countdown(self, g, phase):
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send(g.group_name, {"type": "countdown_start"})
+        await channel_layer.group_send(g.group_name, COUNTDOWN_TICK_EVENTS[0])
+        schedule = self.wheel.schedule
+        g.phase_timers = [
+            schedule(self.step * i, self._tick, g, phase, event)
+            for i, event in enumerate(COUNTDOWN_TICK_EVENTS[1:], 1)
+        ]
+        g.phase_timers.append(
+            schedule(self.step * len(COUNTDOWN_TICK_EVENTS), self._countdown_done, g, phase)
+        )
+
+    def _still_counting(self, g, phase):
+        if g.phase != phase:
+            return False
+        if len(g.players) < 2:
+            # A player left; disconnect() decides whether the game is over
+            if phase == COUNTDOWN:
+                self.transition(g, WAITING)
+            else:
+                for timer in g.phase_timers:
+                    timer.cancel()
+            return False
+        return True
+
+    async def _tick(self, g, phase, event):
+        if self._still_counting(g, phase):
+            await get_channel_layer().group_send(g.group_name, event)
+
+    async def _countdown_done(self, g, phase):
+        if not self._still_counting(g, phase):
+            return
+        await get_channel_layer().group_send(g.group_name, {"type": "countdown_end"})
+        self.transition(g, PLAYING)
+        if phase == COUNTDOWN:
+            g.touch()
+            # Physics and snapshots run in the shared per-worker game loop
+            self.manager.game_loop.ensure_running()
+
+    def get_stats(self):
+        by_phase = dict.fromkeys(TRANSITIONS, 0)
+        for g in self.manager.games.values():
+            by_phase[g.phase] += 1
+        return {
+            "games_by_phase": by_phase,
+            "countdown_step": self.step,
+            "transitions": self.transitions,
+            "refused_transitions": self.refused,
+            "timers": self.wheel.get_stats(),
+        }
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import secrets
+from bisect import bisect_right, insort
+from collections import deque
+from django.conf import settings
+from channels.layers import get_channel_layer
+from .game_phases import WAITING
+from .sharding import HOME_SHARD, shard_count, shard_index
+from .shard_link import HOME_GROUP
+
+KINDS = ("casual", "tournament")
+# Channel layer group of the ws/lobbies/ subscribers
+FEED_GROUP = "lobby_feed"
+# Distinct queries cached per version before the cache starts over
+MAX_CACHED_PAGES = 256
+
+
+class LobbyIndex:
+    """
+    The lobby listing, kept up to date as games change instead of being
+    rebuilt from GameManager.games on every request.
+
+    update() is called whenever a game's players or phase change, and
+    remove() when GameManager deletes it. Each entry is stored ready to
+    serialise, in creation order, keyed by a sequence number that doubles
+    as the pagination cursor: a page is the next `limit` entries after the
+    cursor that match the filters.
+
+    Every change that alters an entry bumps `version`. Pages are cached per
+    query until the next change, and the version is the listing's ETag, so
+    a client polling an unchanged listing gets a 304 without anything being
+    rebuilt.
+
+    The same changes feed ws/lobbies/: each one is a lobby_added,
+    lobby_updated or lobby_removed event numbered with the version it
+    produced. Events raised while the loop is busy go out together in one
+    group_send. The last PONG_LOBBY_FEED_BACKLOG events are kept so a
+    client that reconnects with the epoch and seq it last saw gets only
+    what it missed; anyone else gets a snapshot first.
+
+    With PONG_SHARD_COUNT > 1 only the home shard lists lobbies and runs
+    the feed. The other shards keep an index of their own games but send
+    its changes to the home shard, which applies them to its index like
+    its own, see ShardLink.
+    """
+
+    def __init__(self):
+        self.entries = {}   # game_id -> (seq, entry)
+        self.order = []     # seqs of listed games, ascending
+        self.by_seq = {}    # seq -> game_id
+        self.next_seq = 1
+        self.version = 1
+        self.pages = {}     # (cursor, limit, open_only, kind) -> (version, body)
+        self.page_hits = 0
+        self.page_builds = 0
+        # Versions restart with the process; a resume needs the same epoch
+        self.epoch = secrets.token_hex(4)
+        self.log = deque(maxlen=getattr(settings, "PONG_LOBBY_FEED_BACKLOG", 1024))
+        self.unsent = []
+        self.flush_task = None
+        self.snapshot_cache = None  # (version, text)
+        self.events_sent = 0
+        self.forward = shard_count() > 1 and shard_index() != HOME_SHARD
+        # Told about every change too, see ShardedMatchmaking
+        self.listener = None
+
+    def update(self, g):
+        entry = {
+            "game_id": g.game_id,
+            "players_count": len(g.players),
+            "open_slots": max(0, 2 - len(g.players)),
+            "players": g.display_names(),
+            "state": g.state,
+            "kind": "tournament" if g.is_tournament else "casual",
+        }
+        self.apply(entry)
+
+    def apply(self, entry):
+        game_id = entry["game_id"]
+        current = self.entries.get(game_id)
+        if current:
+            if current[1] == entry:
+                return
+            seq = current[0]
+            event = "lobby_updated"
+        else:
+            seq = self.next_seq
+            self.next_seq += 1
+            insort(self.order, seq)
+            self.by_seq[seq] = game_id
+            event = "lobby_added"
+        self.entries[game_id] = (seq, entry)
+        self._changed({"type": event, "lobby": entry})
+        if self.listener:
+            self.listener.lobby_changed(entry)
+
+    def remove(self, game_id):
+        current = self.entries.pop(game_id, None)
+        if not current:
+            return
+        seq = current[0]
+        del self.order[bisect_right(self.order, seq) - 1]
+        del self.by_seq[seq]
+        self._changed({"type": "lobby_removed", "game_id": game_id})
+        if self.listener:
+            self.listener.lobby_removed(game_id)
+
+    def apply_changes(self, events):
+        """
+        Apply lobby events another shard forwarded.
+        """
+        for event in events:
+            if event["type"] == "lobby_removed":
+                self.remove(event["game_id"])
+            else:
+                self.apply(event["lobby"])
+
+    def resend(self):
+        """
+        Forward every lobby again, for a home shard that just started.
+        """
+        for seq in self.order:
+            self.unsent.append({"type": "lobby_updated", "lobby": self.entries[self.by_seq[seq]][1]})
+        self._schedule_flush()
+
+    def _changed(self, event):
+        self.version += 1
+        self.pages.clear()
+        if self.forward:
+            # Numbered by the home shard when it applies it
+            self.unsent.append(event)
+        else:
+            event["seq"] = self.version
+            text = json.dumps(event)
+            self.log.append((self.version, text))
+            self.unsent.append(text)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.flush_task is None or self.flush_task.done():
+            try:
+                self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                pass  # No loop here; the next change sends these too
+
+    async def flush(self):
+        # Events raised during the send see this task still running and do
+        # not start another, so keep going until nothing is left
+        while self.unsent:
+            batch, self.unsent = self.unsent, []
+            self.events_sent += len(batch)
+            if self.forward:
+                await get_channel_layer().group_send(
+                    HOME_GROUP, {"type": "shard.lobby_changes", "events": batch}
+                )
+            else:
+                await get_channel_layer().group_send(
+                    FEED_GROUP, {"type": "lobby_events", "texts": batch}
+                )
+
+    def snapshot(self):
+        """
+        The whole listing as one feed message, built once per version.
+        """
+        if self.snapshot_cache and self.snapshot_cache[0] == self.version:
+            return self.snapshot_cache[1]
+        text = json.dumps({
+            "type": "snapshot",
+            "epoch": self.epoch,
+            "seq": self.version,
+            "lobbies": [self.entries[self.by_seq[seq]][1] for seq in self.order],
+        })
+        self.snapshot_cache = (self.version, text)
+        return text
+
+    def events_since(self, epoch, seq):
+        """
+        Feed messages after `seq`, or None if they are no longer all kept.
+        """
+        if epoch != self.epoch or seq > self.version:
+            return None
+        if seq == self.version:
+            return []
+        if not self.log or self.log[0][0] > seq + 1:
+            return None
+        return [text for version, text in self.log if version > seq]
+
+    @property
+    def etag(self):
+        return f'"lobbies-{self.version}"'
+
+    def page(self, cursor=0, limit=50, open_only=False, kind=None):
+        """
+        JSON body of one page of the listing, built at most once per version.
+        """
+        key = (cursor, limit, open_only, kind)
+        cached = self.pages.get(key)
+        if cached and cached[0] == self.version:
+            self.page_hits += 1
+            return cached[1]
+        lobbies = []
+        next_cursor = None
+        order = self.order
+        for i in range(bisect_right(order, cursor), len(order)):
+            seq = order[i]
+            entry = self.entries[self.by_seq[seq]][1]
+            if open_only and not (entry["open_slots"] and entry["state"] == WAITING):
+                continue
+            if kind and entry["kind"] != kind:
+                continue
+            if len(lobbies) == limit:
+                # Resume after the last lobby of this page
+                next_cursor = self.entries[lobbies[-1]["game_id"]][0]
+                break
+            lobbies.append(entry)
+        body = json.dumps({
+            "version": self.version,
+            "lobbies": lobbies,
+            "next": next_cursor,
+        })
+        if len(self.pages) >= MAX_CACHED_PAGES:
+            self.pages.clear()
+        self.pages[key] = (self.version, body)
+        self.page_builds += 1
+        return body
+
+    def get_stats(self):
+        return {
+            "lobbies": len(self.entries),
+            "version": self.version,
+            "cached_pages": len(self.pages),
+            "page_hits": self.page_hits,
+            "page_builds": self.page_builds,
+            "feed_events_sent": self.events_sent,
+        }
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from django.conf import settings
+from channels.layers import get_channel_layer
+from .game_phases import WAITING, COUNTDOWN, PLAYING, ENDED
+
+STATES = (WAITING, COUNTDOWN, PLAYING, ENDED)
+
+# Seconds a game may stay idle in each state before it is evicted
+DEFAULT_TTL = {WAITING: 600, COUNTDOWN: 60, PLAYING: 900, ENDED: 30}
+
+
+class LobbyLifecycle:
+    """
+    Evicts games nobody uses anymore, so a long-running worker only holds
+    live games.
+
+    Every Game has a state (see Game.state) and the time of its last
+    activity: a player joining, leaving or sending input, or the game
+    changing state. A sweeper task wakes up every PONG_LOBBY_SWEEP_INTERVAL
+    seconds and evicts games idle for longer than the PONG_LOBBY_TTL of
+    their state, closing any socket still attached. It also drops
+    browser_key entries that point at games which are gone.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.ttl = dict(DEFAULT_TTL, **getattr(settings, "PONG_LOBBY_TTL", {}))
+        self.interval = getattr(settings, "PONG_LOBBY_SWEEP_INTERVAL", 30)
+        self.task = None
+        self.sweeps = 0
+        self.evicted = dict.fromkeys(STATES, 0)
+        self.stale_keys = 0
+
+    def ensure_running(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        # Stops once there is nothing left to watch; the next connect restarts it
+        while self.manager.games or self.manager.browser_key_to_game:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print("Error in lobby sweep:", str(e))
+
+    async def sweep(self):
+        now = time.monotonic()
+        expired = [
+            g for g in self.manager.games.values()
+            if now - g.last_activity > self.ttl[g.state]
+        ]
+        for g in expired:
+            await self.evict(g)
+        self.drop_stale_keys()
+        self.manager.matchmaking.prune()
+        self.sweeps += 1
+
+    async def evict(self, g):
+        self.evicted[g.state] += 1
+        self.manager.phases.transition(g, ENDED)
+        self.manager.finalizer.cancel(g)
+        self.manager.delete_game(g.game_id)
+        # Sockets still attached close themselves and clean up on disconnect
+        await get_channel_layer().group_send(g.group_name, {"type": "lobby_expired"})
+        await self.manager.game_loop.close_spectators(g)
+
+    def drop_stale_keys(self):
+        games = self.manager.games
+        for key, g in list(self.manager.browser_key_to_game.items()):
+            if games.get(g.game_id) is not g:
+                del self.manager.browser_key_to_game[key]
+                self.manager.browser_key_to_channel.pop(key, None)
+                self.stale_keys += 1
+
+    def get_stats(self):
+        by_state = dict.fromkeys(STATES, 0)
+        for g in self.manager.games.values():
+            by_state[g.state] += 1
+        return {
+            "games": len(self.manager.games),
+            "games_by_state": by_state,
+            "browser_keys": len(self.manager.browser_key_to_game),
+            "ttl_seconds": self.ttl,
+            "sweep_interval": self.interval,
+            "sweeps": self.sweeps,
+            "evicted": self.evicted,
+            "stale_keys_dropped": self.stale_keys,
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.layers import CoalescingInMemoryChannelLayer, UnixSocketChannelLayer
+from pong.game_loop import percentiles
+
+GROUP = "bench"
+
+
+async def echo(layer, ready=None):
+    """
+    Join the bench group and send every message back to its reply channel
+    until a bench.stop arrives.
+    """
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+    if ready:
+        ready.set()
+    while True:
+        message = await layer.receive(channel)
+        if message["type"] == "bench.stop":
+            break
+        await layer.send(message["reply"], message)
+    await layer.group_discard(GROUP, channel)
+
+
+async def measure(layer, rounds, messages, window, size):
+    """
+    Round trips of group_send -> echo -> send, one at a time for latency,
+    then `window` in flight at a time for throughput.
+    """
+    reply = await layer.new_channel()
+    message = {"type": "bench.ping", "reply": reply, "text": "x" * size}
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await layer.group_send(GROUP, message)
+        await layer.receive(reply)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    sent = 0
+    while sent < messages:
+        batch = min(window, messages - sent)
+        for _ in range(batch):
+            await layer.group_send(GROUP, message)
+        for _ in range(batch):
+            await layer.receive(reply)
+        sent += batch
+    elapsed = time.perf_counter() - started
+
+    await layer.group_send(GROUP, {"type": "bench.stop"})
+    return percentiles(samples), messages / elapsed
+
+
+async def run_in_process(layer, rounds, messages, window, size):
+    ready = asyncio.Event()
+    peer = asyncio.ensure_future(echo(layer, ready))
+    await ready.wait()
+    result = await measure(layer, rounds, messages, window, size)
+    await peer
+    await layer.close()
+    return result
+
+
+async def run_peer(path, capacity):
+    layer = UnixSocketChannelLayer(path=path, capacity=capacity)
+    await echo(layer)
+    await layer.close()
+
+
+async def run_cross_process(rounds, messages, window, size, capacity):
+    path = tempfile.mkdtemp(prefix="pong-bench-")
+    layer = UnixSocketChannelLayer(path=path, capacity=capacity)
+    await layer._ready()
+    peer = subprocess.Popen(
+        [sys.executable, "manage.py", "channel_layer_benchmark", "--peer", path,
+         "--capacity", str(capacity)],
+        cwd=settings.BASE_DIR,
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while not layer.remote_groups.get(GROUP):
+            if time.monotonic() > deadline or peer.poll() is not None:
+                raise CommandError("Benchmark peer process did not join the group")
+            await asyncio.sleep(0.05)
+        result = await measure(layer, rounds, messages, window, size)
+        peer.wait(timeout=10)
+        return result
+    finally:
+        if peer.poll() is None:
+            peer.kill()
+        await layer.close()
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare group_send round-trip latency and throughput of the in-memory "
+        "channel layer with the Unix socket layer, in one process and across two."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=2000,
+                            help="Sequential round trips for the latency figures.")
+        parser.add_argument("--messages", type=int, default=50000,
+                            help="Round trips for the throughput figure.")
+        parser.add_argument("--window", type=int, default=50,
+                            help="Round trips in flight during the throughput run.")
+        parser.add_argument("--size", type=int, default=200,
+                            help="Payload bytes per message, about one game snapshot.")
+        parser.add_argument("--capacity", type=int, default=100)
+        parser.add_argument("--peer", metavar="PATH",
+                            help="Internal: run the echo side in the socket directory PATH.")
+
+    def handle(self, *args, **options):
+        capacity = options["capacity"]
+        if options["peer"]:
+            asyncio.run(run_peer(options["peer"], capacity))
+            return
+
+        if options["window"] > capacity:
+            raise CommandError("--window must not exceed --capacity")
+        run = (options["rounds"], options["messages"], options["window"], options["size"])
+
+        socket_dir = tempfile.mkdtemp(prefix="pong-bench-")
+        try:
+            results = [
+                ("in-memory", asyncio.run(run_in_process(
+                    CoalescingInMemoryChannelLayer(capacity=capacity), *run))),
+                ("unix socket, 1 process", asyncio.run(run_in_process(
+                    UnixSocketChannelLayer(path=socket_dir, capacity=capacity), *run))),
+                ("unix socket, 2 processes", asyncio.run(run_cross_process(*run, capacity))),
+            ]
+        finally:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+
+        for name, (latency, throughput) in results:
+            self.stdout.write(
+                f"{name:>24}: round trip p50 {latency['p50']:.3f} ms, "
+                f"p95 {latency['p95']:.3f} ms, p99 {latency['p99']:.3f} ms, "
+                f"{int(throughput)} round trips/s"
+            )
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import random
+import time
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from pong import routing
+from pong.consumers import GameManager
+from pong.protocol import decode_frame
+
+
+# Compared against --baseline: (label, key in "results", True if higher is better)
+GATED_METRICS = [
+    ("tick p95 ms", ("tick_ms", "p95"), False),
+    ("ticks/s", ("ticks_per_sec",), True),
+    ("updates/s per client", ("updates_per_client_per_sec",), True),
+]
+
+
+def metric(run, keys):
+    value = run.get("results")
+    for key in keys:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def rss_bytes():
+    # Resident set size of this process, Linux only
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class Bot:
+    """
+    A scripted player: readies up, then follows the ball with its paddle
+    using the same playerReady / paddleMove / paddleStop messages as the
+    browser client.
+    """
+
+    def __init__(self, app, lobby, key, proto):
+        path = f"/ws/pong/?key={key}&lobby={lobby}"
+        if proto == "bin":
+            path += "&proto=bin"
+        self.comm = WebsocketCommunicator(app, path)
+        self.paddle = None
+        self.direction = 0
+        self.state = None
+        self.updates = 0
+        self.bytes_received = 0
+
+    async def connect(self):
+        connected, _ = await self.comm.connect()
+        if not connected:
+            return False
+        assigned = json.loads((await self.comm.receive_output())["text"])
+        self.paddle = assigned["paddle"]
+        return True
+
+    async def send(self, payload):
+        await self.comm.send_to(text_data=json.dumps(payload))
+
+    async def run(self):
+        await self.send({"type": "playerReady"})
+        while True:
+            # Read the queue directly: receive_output() cancels the app on timeout
+            message = await self.comm.output_queue.get()
+            if message["type"] != "websocket.send":
+                return
+            if message.get("bytes") is not None:
+                self.bytes_received += len(message["bytes"])
+                try:
+                    _, self.state = decode_frame(message["bytes"], self.state)
+                except ValueError:
+                    self.state = None
+                    continue
+                self.updates += 1
+            else:
+                self.bytes_received += len(message["text"])
+                data = json.loads(message["text"])
+                if data["type"] != "update":
+                    continue
+                self.state = data
+                self.updates += 1
+            await self.steer()
+
+    async def steer(self):
+        center = self.state["paddles"][self.paddle] + 50
+        ball_y = self.state["ball"]["y"]
+        if ball_y < center - 20:
+            direction = -1
+        elif ball_y > center + 20:
+            direction = 1
+        else:
+            direction = 0
+        if direction == self.direction:
+            return
+        self.direction = direction
+        if direction:
+            await self.send({"type": "paddleMove", "key": "up" if direction < 0 else "down"})
+        else:
+            await self.send({"type": "paddleStop"})
+
+    async def close(self):
+        await self.comm.disconnect()
+
+
+class Spectator:
+    """
+    A passive viewer on ?spectate=1. It has no reader task of its own:
+    drain() empties every spectator's queue once a second, so a thousand
+    viewers do not add a thousand task wake-ups per frame to the test.
+    """
+
+    def __init__(self, app, lobby, key):
+        self.comm = WebsocketCommunicator(app, f"/ws/pong/?key={key}&lobby={lobby}&spectate=1")
+        self.updates = 0
+
+    async def connect(self):
+        connected, _ = await self.comm.connect()
+        return connected
+
+    @staticmethod
+    def count_received(spectators):
+        for spectator in spectators:
+            queue = spectator.comm.output_queue
+            while not queue.empty():
+                queue.get_nowait()
+                spectator.updates += 1
+
+    @classmethod
+    async def drain(cls, spectators):
+        while True:
+            await asyncio.sleep(1)
+            cls.count_received(spectators)
+
+    async def close(self):
+        await self.comm.disconnect()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run N headless Pong games in-process with scripted bot players and "
+        "report game-loop throughput, tick percentiles, latency and memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=20.0,
+                            help="Seconds to measure after the warm-up.")
+        parser.add_argument("--warmup", type=float, default=5.0,
+                            help="Seconds to skip while the start countdowns run.")
+        parser.add_argument("--proto", choices=["json", "bin"], default="json")
+        parser.add_argument("--spectators", type=int, default=0,
+                            help="Spectators watching each game.")
+        parser.add_argument("--max-score", type=int, default=1000,
+                            help="Raised so games keep running for the whole test.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="pong_loadtest.json",
+                            help="Where to write the machine-readable results.")
+        parser.add_argument("--baseline",
+                            help="Results of an earlier run (its --output file) to compare "
+                                 "against; exits non-zero when this run regressed.")
+        parser.add_argument("--tolerance", type=float, default=10.0,
+                            help="Percent p95 tick time may rise, or throughput fall, "
+                                 "against --baseline before it counts as a regression.")
+
+    def handle(self, *args, **options):
+        # Read before the run, so a bad path fails right away
+        baseline = self.load_baseline(options["baseline"]) if options["baseline"] else None
+        results = asyncio.run(self.run(options))
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+        summary = results["results"]
+        self.stdout.write(
+            f"{options['games']} games: {summary['ticks_per_sec']} ticks/s, "
+            f"tick p50/p95/p99 {summary['tick_ms']['p50']}/{summary['tick_ms']['p95']}/"
+            f"{summary['tick_ms']['p99']} ms, "
+            f"delivery p95 {summary['delivery_latency_ms']['p95']} ms, "
+            f"{summary['updates_per_spectator_per_sec']} updates/s per spectator, "
+            f"{summary['cpu_ms_per_game_second']} ms CPU per game-second, "
+            f"{summary['memory_per_game_kb']} KiB/game"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if baseline:
+            self.check_baseline(results, baseline, options["baseline"], options["tolerance"])
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline {path}: {e}")
+
+    def check_baseline(self, results, baseline, path, tolerance):
+        if baseline.get("config") != results["config"]:
+            self.stdout.write(self.style.WARNING(
+                "Baseline was run with a different configuration; the comparison may not be fair"
+            ))
+
+        regressions = []
+        for label, keys, higher_is_better in GATED_METRICS:
+            current, before = metric(results, keys), metric(baseline, keys)
+            if not isinstance(before, (int, float)) or not before:
+                self.stdout.write(f"{label}: no baseline value, skipped")
+                continue
+            change = (current - before) / before * 100
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            self.stdout.write(f"{label}: {before} -> {current} ({change:+.1f}%)")
+            if regressed:
+                regressions.append(f"{label} {change:+.1f}%")
+
+        if regressions:
+            raise CommandError(
+                f"Regressed by more than {tolerance}% against {path}: {', '.join(regressions)}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Within {tolerance}% of {path}"))
+
+    async def run(self, options):
+        random.seed(options["seed"])
+        app = URLRouter(routing.websocket_urlpatterns)
+        manager = GameManager.get_instance()
+        loop = manager.game_loop
+        rss_before = rss_bytes()
+
+        bots = []
+        for i in range(options["games"]):
+            lobby = f"loadtest_{i}"
+            pair = [Bot(app, lobby, f"bot_{i}_{side}", options["proto"]) for side in "ab"]
+            for bot in pair:
+                await bot.connect()
+            manager.games[lobby].MAX_SCORE = options["max_score"]
+            bots.extend(pair)
+
+        spectators = []
+        for i in range(options["games"]):
+            for j in range(options["spectators"]):
+                spectator = Spectator(app, f"loadtest_{i}", f"viewer_{i}_{j}")
+                await spectator.connect()
+                spectators.append(spectator)
+
+        tasks = [asyncio.create_task(bot.run()) for bot in bots]
+        tasks.append(asyncio.create_task(Spectator.drain(spectators)))
+        await asyncio.sleep(options["warmup"])
+
+        loop.tick_samples.clear()
+        loop.delivery_samples.clear()
+        ticks_before = loop.tick_count
+        updates_before = sum(bot.updates for bot in bots)
+        bytes_before = sum(bot.bytes_received for bot in bots)
+        Spectator.count_received(spectators)
+        watched_before = sum(spectator.updates for spectator in spectators)
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await asyncio.sleep(options["duration"])
+        elapsed = time.perf_counter() - started
+        # Server and bots share the process, so this is CPU for both ends
+        cpu = time.process_time() - cpu_started
+        ticks = loop.tick_count - ticks_before
+
+        Spectator.count_received(spectators)
+        stats = loop.get_stats()
+        rss_after = rss_bytes()
+        updates = sum(bot.updates for bot in bots) - updates_before
+        received = sum(bot.bytes_received for bot in bots) - bytes_before
+        watched = sum(spectator.updates for spectator in spectators) - watched_before
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for client in bots + spectators:
+            await client.close()
+
+        return {
+            "config": {
+                "games": options["games"],
+                "duration": options["duration"],
+                "proto": options["proto"],
+                "spectators_per_game": options["spectators"],
+                "spectator_rate": stats["spectator_rate"],
+                "physics": stats["physics"]["engine"],
+                "collision": stats["physics"]["collision"],
+                "tick_rate": stats["tick_rate"],
+                "fixed_timestep": stats["fixed_timestep"],
+            },
+            "results": {
+                "ticks_per_sec": round(ticks / elapsed, 2),
+                "tick_ms": stats["tick_ms"],
+                "avg_tick_ms_per_game": stats["avg_tick_ms_per_game"],
+                "max_lateness_ms": stats["max_lateness_ms"],
+                "delivery_latency_ms": stats["delivery_latency_ms"],
+                "updates_per_client_per_sec": round(updates / elapsed / max(1, len(bots)), 2),
+                "bytes_per_client_per_sec": round(received / elapsed / max(1, len(bots)), 1),
+                "updates_per_spectator_per_sec": round(watched / elapsed / max(1, len(spectators)), 2),
+                "cpu_ms_per_game_second": round(cpu * 1000 / elapsed / max(1, options["games"]), 3),
+                "memory_per_game_kb": round((rss_after - rss_before) / 1024 / max(1, options["games"]), 1),
+            },
+        }
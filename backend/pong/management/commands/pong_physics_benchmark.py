@@ -0,0 +1,99 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from pong.consumers import Game
+from pong.game_loop import PHYSICS_RATE
+from pong.physics import create_engine
+
+
+def build_games(count, seed):
+    rng = random.Random(seed)
+    games = []
+    for i in range(count):
+        g = Game(f"bench_{i}")
+        g.paddles = {"a": rng.randrange(0, 500), "b": rng.randrange(0, 500)}
+        g.ball = {
+            "x": rng.randrange(100, 900),
+            "y": rng.randrange(50, 520),
+            "dx": rng.choice([-1, 1]),
+            "dy": rng.choice([-1, 1]),
+        }
+        games.append(g)
+    return games
+
+
+def run_engine(engine_name, count, ticks, steps, seed, collision="discrete", scale=1):
+    """
+    Drive `count` games for `ticks` ticks through one engine.
+    Paddle inputs come from a seeded RNG so every engine sees the same game.
+    Returns (seconds spent in the engine, games).
+    """
+    engine = create_engine(engine_name, collision, scale)
+    games = build_games(count, seed)
+    inputs = random.Random(seed + 1)
+    plan = [(g, steps) for g in games]
+    elapsed = 0.0
+
+    for _ in range(ticks):
+        # A few players change direction every tick, like real input
+        for _ in range(max(1, count // 20)):
+            g = games[inputs.randrange(count)]
+            g.set_paddle_direction(inputs.choice("ab"), inputs.choice([-1, 0, 1]))
+
+        started = time.perf_counter()
+        scored = engine.advance(plan)
+        elapsed += time.perf_counter() - started
+
+        for g, _ in scored:
+            engine.reset_ball(g)
+    return elapsed, games
+
+
+def state_of(g):
+    return (
+        g.paddles["a"], g.paddles["b"],
+        g.ball["x"], g.ball["y"], g.ball["dx"], g.ball["dy"],
+        g.score["a"], g.score["b"],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the scalar and batch Pong physics engines in games per core, "
+        "for a collision mode and tick rate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=2000)
+        parser.add_argument("--ticks", type=int, default=600)
+        parser.add_argument("--steps", type=int, default=1,
+                            help="Physics steps per game per tick (catch-up load).")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--collision", choices=["discrete", "swept"], default="discrete")
+        parser.add_argument("--tick-rate", type=int, default=PHYSICS_RATE)
+
+    def handle(self, *args, **options):
+        count, ticks, steps, seed = (
+            options["games"], options["ticks"], options["steps"], options["seed"]
+        )
+        rate = options["tick_rate"]
+        scale = PHYSICS_RATE / rate
+        scale = int(scale) if scale.is_integer() else scale
+        results = {}
+        for name in ("scalar", "batch"):
+            elapsed, games = run_engine(name, count, ticks, steps, seed, options["collision"], scale)
+            per_tick = elapsed / ticks
+            results[name] = games
+            self.stdout.write(
+                f"{name:>6}: {per_tick * 1000:8.3f} ms/tick for {count} games, "
+                f"{per_tick / count * 1e6:7.3f} us/game, "
+                f"{per_tick * rate / count * 1e6:7.1f} us per game-second, "
+                f"~{int(count / (per_tick * rate))} games per core at {rate} Hz"
+            )
+
+        mismatches = sum(
+            1 for a, b in zip(results["scalar"], results["batch"]) if state_of(a) != state_of(b)
+        )
+        if mismatches:
+            raise CommandError(f"Engines diverged in {mismatches} of {count} games")
+        self.stdout.write(self.style.SUCCESS("Engines produced identical game states."))
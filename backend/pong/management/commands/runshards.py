@@ -0,0 +1,62 @@
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pong.shard_router import ShardRouter
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the backend as several ASGI worker processes behind a router that "
+        "sends every ws/pong/?lobby=<id> connect to the worker owning that game."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8000,
+                            help="Port the router listens on.")
+        parser.add_argument("--worker-port", type=int, default=9000,
+                            help="Worker i listens on 127.0.0.1:<worker-port + i>.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        backends = [("127.0.0.1", options["worker_port"] + i) for i in range(workers)]
+
+        # Private socket directory for this run's channel layer
+        socket_dir = tempfile.mkdtemp(prefix="pong-channels-")
+        processes = []
+        for i, (host, port) in enumerate(backends):
+            env = dict(
+                os.environ,
+                PONG_SHARD_COUNT=str(workers),
+                PONG_SHARD_INDEX=str(i),
+                PONG_CHANNEL_SOCKET_DIR=socket_dir,
+            )
+            # Same server the Dockerfile runs, one per shard
+            processes.append(subprocess.Popen(
+                [sys.executable, "manage.py", "runserver", "--noreload", f"{host}:{port}"],
+                cwd=settings.BASE_DIR,
+                env=env,
+            ))
+            self.stdout.write(f"Shard {i} on {host}:{port} (pid {processes[-1].pid})")
+
+        self.stdout.write(f"Routing on {options['host']}:{options['port']}")
+        router = ShardRouter(backends)
+        # docker stop sends SIGTERM: leave through the finally below
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            asyncio.run(router.serve(options["host"], options["port"]))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            shutil.rmtree(socket_dir, ignore_errors=True)
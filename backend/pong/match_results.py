@@ -0,0 +1,227 @@
+import asyncio
+import atexit
+import sys
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.utils.timezone import now
+from channels.db import database_sync_to_async
+from users.models import PongUser, MatchHistory
+
+# Worth retrying: the database was locked, restarted or unreachable
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+# Seconds between the shutdown flush's attempts, doubling each time
+SHUTDOWN_RETRY_PAUSE = 0.1
+
+
+class MatchResultWriter:
+    """
+    Write-behind queue for MatchHistory rows.
+
+    record() only appends the two rows of a finished game to a buffer, so
+    game-over handling never waits on the database. A flush task writes the
+    buffer every PONG_MATCH_FLUSH_INTERVAL seconds (or sooner once
+    PONG_MATCH_FLUSH_BATCH rows are waiting) with one bulk_create in one
+    transaction. Player ids come from a small username -> id cache, so a
+    flush resolves unknown players with a single query and known ones with
+    none.
+
+    A batch that hits a transient database error is put back and retried
+    on the next flush, up to PONG_MATCH_FLUSH_RETRIES times. Any other
+    error will not go away by retrying, so the batch is written row by row
+    instead and the rows that still fail are logged and dropped.
+
+    Whatever is still buffered is written synchronously when the server
+    shuts down, and again at exit for anything recorded after that or
+    outside a server. That flush retries transient errors itself, since
+    there is no next flush to leave them to.
+    """
+
+    instance = None
+
+    def __init__(self):
+        self.interval = getattr(settings, "PONG_MATCH_FLUSH_INTERVAL", 1.0)
+        self.batch_size = getattr(settings, "PONG_MATCH_FLUSH_BATCH", 500)
+        self.cache_size = getattr(settings, "PONG_USER_ID_CACHE_SIZE", 4096)
+        self.max_retries = getattr(settings, "PONG_MATCH_FLUSH_RETRIES", 5)
+        self.pending = []
+        self.user_ids = OrderedDict()
+        # record() runs on the event loop, the exit flush on the main thread
+        self.lock = threading.Lock()
+        self.wakeup = None
+        self.task = None
+        self.recorded = 0
+        self.written = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        on_server_shutdown(self.flush_sync)
+        atexit.register(self.flush_sync)
+
+    @classmethod
+    def get_instance(cls):
+        if not cls.instance:
+            cls.instance = MatchResultWriter()
+        return cls.instance
+
+    def record(self, game_id, winner, loser):
+        """
+        Queue a finished game: a WIN row for the winner and a LOSS row for
+        the loser. Players that are not in the database are skipped at flush.
+        """
+        played = now()
+        with self.lock:
+            # The last field counts failed attempts to write the row
+            self.pending.append((game_id, winner, loser, MatchHistory.WIN, played, 0))
+            self.pending.append((game_id, loser, winner, MatchHistory.LOSS, played, 0))
+            self.recorded += 2
+            full = len(self.pending) >= self.batch_size
+        self.ensure_running()
+        if full:
+            self.wakeup.set()
+
+    def ensure_running(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+            if not self.pending:
+                # Restarted by the next record()
+                break
+
+    async def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            await database_sync_to_async(self._write)(batch)
+
+    def flush_sync(self):
+        # Each failed attempt counts against every row's max_retries, so
+        # the loop also ends by dropping what cannot be written
+        for attempt in range(self.max_retries):
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+            if attempt:
+                time.sleep(SHUTDOWN_RETRY_PAUSE * 2 ** (attempt - 1))
+            self._write(batch)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        rows = None
+        try:
+            ids = self._user_ids({row[1] for row in batch} | {row[2] for row in batch})
+            rows = []
+            for entry in batch:
+                game_id, player, opponent, result, played, _ = entry
+                if player in ids and opponent in ids:
+                    rows.append((entry, MatchHistory(
+                        game_id=game_id,
+                        player_id=ids[player],
+                        opponent_id=ids[opponent],
+                        result=result,
+                        date_played=played,
+                    )))
+            with transaction.atomic():
+                MatchHistory.objects.bulk_create([row for _, row in rows])
+            written = len(rows)
+        except TRANSIENT_ERRORS as e:
+            print("Error writing match history, will retry:", str(e))
+            self.failed_flushes += 1
+            # A cached id may belong to a deleted user; look them up again
+            self.user_ids.clear()
+            retry = [entry[:5] + (entry[5] + 1,) for entry in batch if entry[5] + 1 < self.max_retries]
+            self.dropped += len(batch) - len(retry)
+            if len(retry) < len(batch):
+                print(f"Dropping {len(batch) - len(retry)} match history rows after {self.max_retries} attempts")
+            with self.lock:
+                self.pending[:0] = retry
+            return
+        except Exception as e:
+            print("Error writing match history:", str(e))
+            self.failed_flushes += 1
+            self.user_ids.clear()
+            if rows is None:
+                print(f"Dropping {len(batch)} match history rows")
+                self.dropped += len(batch)
+                return
+            written = self._write_each(rows)
+        self.flushes += 1
+        self.written += written
+        self.skipped += len(batch) - len(rows)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def _write_each(self, rows):
+        """
+        Write rows one at a time after the batch failed, dropping the ones
+        that cannot be written so they do not hold up everything after them.
+        """
+        written = 0
+        for entry, row in rows:
+            try:
+                with transaction.atomic():
+                    MatchHistory.objects.bulk_create([row])
+                written += 1
+            except Exception as e:
+                print("Dropping match history row", entry[:4], str(e))
+                self.dropped += 1
+        return written
+
+    def _user_ids(self, usernames):
+        ids = {}
+        missing = []
+        for username in usernames:
+            if username in self.user_ids:
+                self.user_ids.move_to_end(username)
+                ids[username] = self.user_ids[username]
+            else:
+                missing.append(username)
+        if missing:
+            found = PongUser.objects.filter(username__in=missing).values_list("username", "id")
+            for username, user_id in found:
+                ids[username] = user_id
+                self.user_ids[username] = user_id
+            while len(self.user_ids) > self.cache_size:
+                self.user_ids.popitem(last=False)
+        return ids
+
+    def get_stats(self):
+        return {
+            "pending": len(self.pending),
+            "recorded": self.recorded,
+            "written": self.written,
+            "skipped_unknown_players": self.skipped,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "flush_interval": self.interval,
+            "cached_user_ids": len(self.user_ids),
+        }
+
+
+def on_server_shutdown(callback):
+    """
+    Run `callback` in a thread when Daphne shuts down, e.g. on SIGTERM,
+    and hold the shutdown until it returns. Nothing happens outside
+    Daphne.
+    """
+    # Importing twisted.internet.reactor would install a reactor of its
+    # own, so only hook one that Daphne already installed
+    if "twisted.internet.reactor" not in sys.modules:
+        return
+    from twisted.internet import reactor, threads
+    reactor.addSystemEventTrigger("before", "shutdown", threads.deferToThread, callback)
@@ -0,0 +1,281 @@
+import time
+import uuid
+from collections import OrderedDict, deque
+from django.conf import settings
+from channels.db import database_sync_to_async
+from users.models import MatchHistory
+from .game_loop import percentiles
+from .game_phases import WAITING
+from .sharding import shard_count, shard_for
+
+# Seconds a lobby handed to a player is not offered again, so the player
+# has time to reconnect to it before anyone else is sent there
+CLAIM_SECONDS = 10
+# Seconds a new lobby waits for its first player to show up in the index
+PENDING_SECONDS = 30
+
+
+def is_open(game):
+    # Only casual lobbies created for random pairing take strangers; a
+    # ?lobby= game or a tournament match is for the players it was made for
+    return (
+        game.matchmade
+        and not game.is_tournament
+        and len(game.players) < 2
+        and not game.game_ended
+        and not game.game_started
+    )
+
+
+class MatchmakingQueue:
+    """
+    Index of lobbies that are waiting for a second player.
+
+    Lobbies are kept in FIFO order per rating bucket, so pairing a player
+    looks at the oldest open lobby of a constant number of buckets instead
+    of scanning every live game. Entries are re-validated when they are
+    taken, so a lobby that filled up or ended is simply skipped.
+
+    With PONG_MATCHMAKING_BUCKETS = 0 there is one bucket and everyone is
+    paired first come, first served. Otherwise players are bucketed by
+    their win rate from MatchHistory, and a lobby that has waited longer
+    than PONG_MATCHMAKING_WIDEN_AFTER seconds is offered to the
+    neighbouring buckets too.
+    """
+
+    def __init__(self):
+        self.buckets = getattr(settings, "PONG_MATCHMAKING_BUCKETS", 0)
+        self.widen_after = getattr(settings, "PONG_MATCHMAKING_WIDEN_AFTER", 10)
+        self.queues = {}        # bucket -> OrderedDict(game_id -> (game, enqueued_at))
+        self.bucket_of = {}     # game_id -> bucket
+        self.ratings = {}       # username -> (bucket, expires_at)
+        self.wait_samples = deque(maxlen=1024)
+        self.paired_count = 0
+
+    def enqueue(self, game):
+        if game.game_id in self.bucket_of:
+            return
+        bucket = game.mm_bucket
+        self.queues.setdefault(bucket, OrderedDict())[game.game_id] = (game, time.monotonic())
+        self.bucket_of[game.game_id] = bucket
+
+    def remove(self, game):
+        bucket = self.bucket_of.pop(game.game_id, None)
+        if bucket is not None:
+            self.queues[bucket].pop(game.game_id, None)
+
+    def update(self, game):
+        """
+        Keep `game` in the queue exactly while it can take another player.
+        """
+        if is_open(game):
+            self.enqueue(game)
+        else:
+            self.remove(game)
+
+    def take(self, bucket=0):
+        """
+        Pop the open lobby the next player in `bucket` should join, or None.
+        """
+        game = self._pop_oldest(bucket, max_age=None)
+        if game is None and self.buckets:
+            for neighbour in (bucket - 1, bucket + 1):
+                game = self._pop_oldest(neighbour, max_age=self.widen_after)
+                if game:
+                    break
+        return game
+
+    def _pop_oldest(self, bucket, max_age):
+        queue = self.queues.get(bucket)
+        now = time.monotonic()
+        while queue:
+            game_id, (game, enqueued_at) = next(iter(queue.items()))
+            if max_age is not None and now - enqueued_at < max_age:
+                return None
+            queue.popitem(last=False)
+            del self.bucket_of[game_id]
+            # Skip lobbies that filled up or ended since they were queued
+            if is_open(game):
+                self.paired_count += 1
+                self.wait_samples.append((now - enqueued_at) * 1000)
+                return game
+        return None
+
+    async def bucket_for(self, username):
+        if not self.buckets:
+            return 0
+        cached = self.ratings.get(username)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        bucket = await self._rating_bucket(username)
+        self.ratings[username] = (bucket, time.monotonic() + 300)
+        return bucket
+
+    @database_sync_to_async
+    def _rating_bucket(self, username):
+        history = MatchHistory.objects.filter(player__username=username)
+        played = history.count()
+        if played < 3:
+            # Not enough games for a rating yet: middle bucket
+            return self.buckets // 2
+        wins = history.filter(result=MatchHistory.WIN).count()
+        return min(self.buckets - 1, int(wins / played * self.buckets))
+
+    def prune(self):
+        """Forget cached ratings that expired, so the cache stays bounded."""
+        now = time.monotonic()
+        for username, (_, expires_at) in list(self.ratings.items()):
+            if expires_at <= now:
+                del self.ratings[username]
+
+    def get_stats(self):
+        return {
+            "buckets": self.buckets,
+            "open_lobbies": len(self.bucket_of),
+            "open_lobbies_per_bucket": {
+                str(bucket): len(queue) for bucket, queue in self.queues.items() if queue
+            },
+            "paired": self.paired_count,
+            "wait_ms": percentiles(self.wait_samples),
+        }
+
+
+class ShardedMatchmaking:
+    """
+    Pairs players who did not pick a lobby when PONG_SHARD_COUNT > 1.
+
+    The shard router sends them all to the home shard, but their games
+    should be spread over every shard. So the home shard only picks a
+    lobby id and tells the player to reconnect with ?lobby=<id>, which the
+    router sends to the shard that owns it. New ids go to the shards in
+    turn.
+
+    Like MatchmakingQueue, lobbies that can be offered are kept in FIFO
+    order per rating bucket, so pairing a player only looks at the front
+    of a bucket. The home shard's LobbyIndex, which every shard keeps up to
+    date, tells this class when a lobby it made changes: a lobby that
+    filled up or started leaves its queue, and one that opens up again
+    goes back. Until the first player shows up there, a new lobby counts
+    as open for one more. A lobby handed to a player is claimed for
+    CLAIM_SECONDS, so nobody else is sent there before that player
+    arrives; if they never do, it is offered again.
+    """
+
+    def __init__(self, lobbies):
+        self.lobbies = lobbies  # The home shard's LobbyIndex
+        lobbies.listener = self
+        self.buckets = getattr(settings, "PONG_MATCHMAKING_BUCKETS", 0)
+        self.widen_after = getattr(settings, "PONG_MATCHMAKING_WIDEN_AFTER", 10)
+        self.tracked = {}         # game_id -> [bucket, created_at, seen]
+        self.queues = {}          # bucket -> OrderedDict(game_id -> enqueued_at), offerable only
+        self.claims = OrderedDict()  # game_id -> claimed_at, oldest first
+        self.next_shard = 0
+        self.minted = 0
+        self.paired_count = 0
+
+    def take_or_create(self, bucket=0):
+        """
+        Id of the lobby the next player in `bucket` should join.
+        """
+        now = time.monotonic()
+        self._release_claims(now)
+        game_id = self._take(bucket, now, max_age=None)
+        if game_id is None and self.buckets:
+            for neighbour in (bucket - 1, bucket + 1):
+                game_id = self._take(neighbour, now, max_age=self.widen_after)
+                if game_id:
+                    break
+        if game_id:
+            self.paired_count += 1
+            self.claims[game_id] = now
+            return game_id
+        return self._create(bucket, now)
+
+    def _create(self, bucket, now):
+        shard = self.next_shard
+        self.next_shard = (shard + 1) % shard_count()
+        while True:
+            game_id = f"game_{uuid.uuid4().hex[:12]}"
+            if shard_for(game_id) == shard and game_id not in self.lobbies.entries:
+                break
+        self.tracked[game_id] = [bucket, now, False]
+        self._enqueue(game_id, now)
+        self.minted += 1
+        return game_id
+
+    def _enqueue(self, game_id, now):
+        bucket = self.tracked[game_id][0]
+        queue = self.queues.setdefault(bucket, OrderedDict())
+        if game_id not in queue:
+            queue[game_id] = now
+
+    def _dequeue(self, game_id):
+        queue = self.queues.get(self.tracked[game_id][0])
+        if queue:
+            queue.pop(game_id, None)
+
+    def _forget(self, game_id):
+        self._dequeue(game_id)
+        self.claims.pop(game_id, None)
+        del self.tracked[game_id]
+
+    def _take(self, bucket, now, max_age):
+        queue = self.queues.get(bucket)
+        while queue:
+            game_id, enqueued_at = next(iter(queue.items()))
+            if max_age is not None and now - enqueued_at < max_age:
+                return None
+            queue.popitem(last=False)
+            _, created_at, seen = self.tracked[game_id]
+            if not seen and now - created_at > PENDING_SECONDS:
+                del self.tracked[game_id]  # Nobody ever came
+                continue
+            return game_id
+        return None
+
+    def _release_claims(self, now):
+        # Claims all last CLAIM_SECONDS, so the oldest expire first
+        while self.claims:
+            game_id, claimed_at = next(iter(self.claims.items()))
+            if now - claimed_at < CLAIM_SECONDS:
+                break
+            self.claims.popitem(last=False)
+            _, created_at, seen = self.tracked[game_id]
+            current = self.lobbies.entries.get(game_id)
+            if current:
+                # Full ones go back when they open up, see lobby_changed()
+                if current[1]["open_slots"]:
+                    self._enqueue(game_id, now)
+            elif seen or now - created_at > PENDING_SECONDS:
+                del self.tracked[game_id]
+            else:
+                self._enqueue(game_id, now)
+
+    def lobby_changed(self, entry):
+        """Called by the LobbyIndex whenever a lobby is added or changes."""
+        game_id = entry["game_id"]
+        lobby = self.tracked.get(game_id)
+        if not lobby:
+            return
+        lobby[2] = True
+        if entry["state"] != WAITING:
+            self._forget(game_id)  # Started; it will not take anyone again
+        elif not entry["open_slots"]:
+            self._dequeue(game_id)
+        elif game_id not in self.claims:
+            self._enqueue(game_id, time.monotonic())
+
+    def lobby_removed(self, game_id):
+        """Called by the LobbyIndex when a lobby is deleted."""
+        if game_id in self.tracked:
+            self._forget(game_id)
+
+    def get_stats(self):
+        return {
+            "buckets": self.buckets,
+            "tracked_lobbies": len(self.tracked),
+            "offered_lobbies": sum(len(queue) for queue in self.queues.values()),
+            "claimed_lobbies": len(self.claims),
+            "created": self.minted,
+            "paired": self.paired_count,
+        }
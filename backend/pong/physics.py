@@ -0,0 +1,56 @@
+# Swept collisions: most events (bounces, paddle lines, goal) per step
+MAX_SWEEP_EVENTS = 16
+INF = float("inf")
+
+
+class ScalarEngine:
+    """
+    Default physics engine: steps each game through Game.step(), or
+    Game.sweep() with swept collisions.
+    The game dicts are the only copy of the state.
+    """
+
+    name = "scalar"
+
+    def __init__(self, swept=False, scale=1):
+        self.swept = swept
+        self.scale = scale
+
+    def advance(self, plan):
+        """
+        `plan` is a list of (game, steps). Runs up to `steps` physics steps
+        per game, stopping a game early when someone scores.
+        Returns a list of (game, scoring_paddle).
+        """
+        scored = []
+        for g, steps in plan:
+            for _ in range(steps):
+                scorer = g.sweep(self.scale) if self.swept else g.step(self.scale)
+                if scorer:
+                    scored.append((g, scorer))
+                    break
+        return scored
+
+    def reset_ball(self, g):
+        g.reset_ball()
+
+    def set_paddle_direction(self, g, paddle, direction):
+        pass
+
+    def prune(self, active_games):
+        pass
+
+    def get_stats(self):
+        return {"engine": self.name, "collision": "swept" if self.swept else "discrete"}
+
+
+def create_engine(name, collision="discrete", scale=1):
+    """
+    `scale` is how many 1/60 s frames of movement one physics step covers.
+    """
+    swept = collision == "swept"
+    if name == "batch":
+        # Imported lazily so numpy is only needed when the batch engine is used
+        from .batch_physics import BatchEngine
+        return BatchEngine(swept, scale)
+    return ScalarEngine(swept, scale)
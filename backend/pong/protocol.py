@@ -0,0 +1,135 @@
+"""
+Compact binary wire format for Pong game-state snapshots.
+
+Opt-in per connection with `ws/pong/?proto=bin`. Only the per-frame
+"update" snapshots are binary; every other message stays JSON text.
+
+Every frame starts with a fixed header (little-endian):
+
+    uint8   kind    1 = keyframe, 2 = delta
+    uint32  seq     per-game frame sequence number
+    uint8   mask    which field groups follow
+
+followed by the field groups whose bit is set in `mask`, in bit order:
+
+    bit 0   paddle a            float32
+    bit 1   paddle b            float32
+    bit 2   ball x, ball y      float32, float32
+    bit 3   ball dx, ball dy    float32, float32
+    bit 4   score a, score b    uint8, uint8
+
+A keyframe always carries every group. A delta only carries the groups
+that changed since the previous frame of the same game, so a client must
+apply it on top of the frame with sequence number `seq - 1`.
+"""
+
+import struct
+
+KEYFRAME = 1
+DELTA = 2
+
+HEADER = struct.Struct("<BIB")
+
+PADDLE_A = 1 << 0
+PADDLE_B = 1 << 1
+BALL_POS = 1 << 2
+BALL_VEL = 1 << 3
+SCORE = 1 << 4
+ALL_FIELDS = PADDLE_A | PADDLE_B | BALL_POS | BALL_VEL | SCORE
+
+FIELDS = [
+    (PADDLE_A, struct.Struct("<f")),
+    (PADDLE_B, struct.Struct("<f")),
+    (BALL_POS, struct.Struct("<ff")),
+    (BALL_VEL, struct.Struct("<ff")),
+    (SCORE, struct.Struct("<BB")),
+]
+
+KEYFRAME_SIZE = HEADER.size + sum(fmt.size for _, fmt in FIELDS)
+
+
+def _field_values(paddles, ball, score):
+    return {
+        PADDLE_A: (paddles["a"],),
+        PADDLE_B: (paddles["b"],),
+        BALL_POS: (ball["x"], ball["y"]),
+        BALL_VEL: (ball["dx"], ball["dy"]),
+        SCORE: (score["a"], score["b"]),
+    }
+
+
+def _pack(kind, seq, mask, values):
+    parts = [HEADER.pack(kind, seq, mask)]
+    for bit, fmt in FIELDS:
+        if mask & bit:
+            parts.append(fmt.pack(*values[bit]))
+    return b"".join(parts)
+
+
+class SnapshotEncoder:
+    """
+    Encodes the successive snapshots of one game.
+    Each call produces both a keyframe and a delta against the previous
+    call, so the same bytes can be handed to every socket of the game:
+    in-sync clients get the delta, new or out-of-sync ones the keyframe.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.last = None
+
+    def encode(self, paddles, ball, score):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        values = _field_values(paddles, ball, score)
+
+        if self.last is None:
+            mask = ALL_FIELDS
+        else:
+            mask = 0
+            for bit, _ in FIELDS:
+                if values[bit] != self.last[bit]:
+                    mask |= bit
+        self.last = values
+
+        keyframe = _pack(KEYFRAME, self.seq, ALL_FIELDS, values)
+        delta = _pack(DELTA, self.seq, mask, values)
+        return self.seq, keyframe, delta
+
+
+def decode_frame(data, state=None):
+    """
+    Apply one binary frame to `state` and return (seq, state).
+    `state` uses the same shape as the JSON "update" message.
+    Raises ValueError when a delta does not follow the previous frame.
+    """
+    kind, seq, mask = HEADER.unpack_from(data, 0)
+    if kind == DELTA:
+        if state is None or state.get("seq") is None or seq != (state["seq"] + 1) & 0xFFFFFFFF:
+            raise ValueError("Delta frame out of sequence")
+    elif kind != KEYFRAME:
+        raise ValueError("Unknown frame kind")
+    if state is None or kind == KEYFRAME:
+        state = {
+            "paddles": {"a": 0, "b": 0},
+            "ball": {"x": 0, "y": 0, "dx": 0, "dy": 0},
+            "score": {"a": 0, "b": 0},
+        }
+
+    offset = HEADER.size
+    for bit, fmt in FIELDS:
+        if not mask & bit:
+            continue
+        values = fmt.unpack_from(data, offset)
+        offset += fmt.size
+        if bit == PADDLE_A:
+            state["paddles"]["a"] = values[0]
+        elif bit == PADDLE_B:
+            state["paddles"]["b"] = values[0]
+        elif bit == BALL_POS:
+            state["ball"]["x"], state["ball"]["y"] = values
+        elif bit == BALL_VEL:
+            state["ball"]["dx"], state["ball"]["dy"] = values
+        elif bit == SCORE:
+            state["score"]["a"], state["score"]["b"] = values
+    state["seq"] = seq
+    return seq, state
@@ -0,0 +1,24 @@
+def circle_rounds(players):
+    """
+    Split every pairing of `players` into rounds with the circle method, so
+    each player is in at most one match per round.
+
+    The first player stays put while the others rotate one seat per round;
+    seat i plays seat n-1-i. With an odd number of players a None seat is
+    added and whoever draws it sits the round out. Returns n-1 rounds for
+    n even and n rounds for n odd, each a list of (player, player) pairs.
+    """
+    seats = list(players)
+    if len(seats) % 2:
+        seats.append(None)
+    n = len(seats)
+    rounds = []
+    for _ in range(n - 1):
+        pairs = []
+        for i in range(n // 2):
+            a, b = seats[i], seats[n - 1 - i]
+            if a is not None and b is not None:
+                pairs.append((a, b))
+        rounds.append(pairs)
+        seats.insert(1, seats.pop())
+    return rounds
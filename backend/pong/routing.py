@@ -2,8 +2,11 @@ from django.urls import re_path
 from .consumers import PongConsumer
 from django.urls import path
 from .consumers import TournamentConsumer
+from .consumers import LobbyFeedConsumer
 
 websocket_urlpatterns = [
     re_path('ws/pong/$', PongConsumer.as_asgi()),
 	path("ws/tournament/", TournamentConsumer.as_asgi()),
+	path("ws/tournament/<str:tournament_id>/", TournamentConsumer.as_asgi()),
+	path("ws/lobbies/", LobbyFeedConsumer.as_asgi()),
 ]
@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+from channels.layers import get_channel_layer
+from .sharding import HOME_SHARD, shard_count, shard_index
+
+# Channel layer groups: only the home shard is in HOME_GROUP, every shard
+# in SHARDS_GROUP
+HOME_GROUP = "pong_home"
+SHARDS_GROUP = "pong_shards"
+# Seconds a shard waits for the home shard to answer a call
+CALL_TIMEOUT = 5
+# A call that must not be lost is tried again after this many seconds,
+# doubling up to MAX_RETRY_DELAY, until the home shard answers
+RETRY_DELAY = 1
+MAX_RETRY_DELAY = 30
+# Group memberships expire on the layer, so they are renewed this often
+RENEW_INTERVAL = 3600
+# A layer that just started only learns its peers' groups once they
+# answer its hello; messages to them until then go nowhere, so shard
+# discovery is repeated after this many seconds
+HELLO_INTERVAL = 1
+# Tournament calls other shards may make: op -> TournamentManager method
+CALLS = {
+    "join_match": "join_match_async",
+    "finish_match": "finish_match_async",
+}
+
+
+class ShardLink:
+    """
+    Messages between the shards of a sharded deployment, over the channel
+    layer. Nothing runs with PONG_SHARD_COUNT = 1.
+
+    The home shard holds the lobby listing and the tournaments. Every other
+    shard forwards its lobby changes to it, so the home shard's LobbyIndex
+    and ws/lobbies/ cover the games of all shards, and calls it for the
+    tournament state of the matches it hosts (see CALLS).
+
+    When the home shard starts listening it asks the other shards to send
+    all their lobbies again, twice, HELLO_INTERVAL apart. A shard that
+    starts later says hello every HELLO_INTERVAL until the home shard
+    answers with the same request, so the listing does not depend on
+    start order. Calls made until then wait for that answer, up to
+    CALL_TIMEOUT. A failed call returns None, unless it was made with
+    retry=True, which only calls that are safe to repeat may use.
+    """
+    instance = None
+
+    def __init__(self):
+        self.enabled = shard_count() > 1
+        self.home = shard_index() == HOME_SHARD
+        self.channel = None
+        self.task = None
+        self.home_up = False
+        self.home_seen = asyncio.Event()
+        self.calls_sent = 0
+        self.calls_served = 0
+        self.calls_failed = 0
+        self.calls_retrying = 0
+
+    @classmethod
+    def get_instance(cls):
+        if not cls.instance:
+            cls.instance = ShardLink()
+        return cls.instance
+
+    def ensure_running(self):
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        if self.task and not self.task.done() and self.task.get_loop() is loop:
+            return
+        # Fresh context: the caller may be a request's async_to_sync call.
+        # create_task's context= argument needs Python 3.11
+        self.task = contextvars.Context().run(loop.create_task, self.listen())
+
+    async def listen(self):
+        loop = asyncio.get_running_loop()
+        channel_layer = get_channel_layer()
+        self.channel = await channel_layer.new_channel()
+        await self._join(channel_layer)
+        renew_at = loop.time() + RENEW_INTERVAL
+        resyncs = 2 if self.home else 0
+        hello_at = loop.time()
+        while True:
+            waiting = resyncs or not (self.home or self.home_up)
+            due = min(hello_at, renew_at) if waiting else renew_at
+            try:
+                message = await asyncio.wait_for(
+                    channel_layer.receive(self.channel), max(0, due - loop.time())
+                )
+            except asyncio.TimeoutError:
+                if loop.time() >= renew_at:
+                    await self._join(channel_layer)
+                    renew_at = loop.time() + RENEW_INTERVAL
+                if waiting and loop.time() >= hello_at:
+                    await self._discover(channel_layer, resyncs)
+                    resyncs = max(0, resyncs - 1)
+                    hello_at = loop.time() + HELLO_INTERVAL
+                continue
+            try:
+                await self.dispatch(channel_layer, message)
+            except Exception as e:
+                print("Error handling shard message:", str(e))
+
+    async def _discover(self, channel_layer, resyncs):
+        if resyncs:
+            await channel_layer.group_send(SHARDS_GROUP, {"type": "shard.resync"})
+        else:
+            await channel_layer.group_send(
+                HOME_GROUP, {"type": "shard.hello", "reply": self.channel}
+            )
+
+    async def _join(self, channel_layer):
+        await channel_layer.group_add(SHARDS_GROUP, self.channel)
+        if self.home:
+            await channel_layer.group_add(HOME_GROUP, self.channel)
+
+    async def dispatch(self, channel_layer, message):
+        # Imported here: both import this module
+        from .consumers import GameManager
+        from .tournament_manager import TournamentManager
+
+        kind = message["type"]
+        if kind == "shard.resync" and not self.home:
+            self.home_up = True
+            self.home_seen.set()
+            GameManager.get_instance().lobbies.resend()
+        elif kind == "shard.hello" and self.home:
+            await channel_layer.send(message["reply"], {"type": "shard.resync"})
+        elif kind == "shard.lobby_changes" and self.home:
+            GameManager.get_instance().lobbies.apply_changes(message["events"])
+        elif kind == "shard.call" and self.home:
+            method = getattr(TournamentManager.get_instance(), CALLS[message["op"]])
+            result = await method(*message["args"])
+            self.calls_served += 1
+            await channel_layer.send(message["reply"], {"type": "shard.result", "result": result})
+
+    async def call_home(self, op, *args, retry=False):
+        """
+        Run the tournament call `op` on the home shard and return its result.
+        If the home shard does not answer, returns None, or with `retry`
+        keeps trying until it does.
+        """
+        self.ensure_running()
+        delay = RETRY_DELAY
+        while True:
+            answered, result = await self._call(op, args)
+            if answered or not retry:
+                return result
+            self.calls_retrying += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.calls_retrying -= 1
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def _call(self, op, args):
+        try:
+            await asyncio.wait_for(self.home_seen.wait(), CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.calls_failed += 1
+            print(f"Home shard is not up for {op}")
+            return False, None
+        channel_layer = get_channel_layer()
+        reply = await channel_layer.new_channel()
+        self.calls_sent += 1
+        await channel_layer.group_send(HOME_GROUP, {
+            "type": "shard.call", "op": op, "args": list(args), "reply": reply,
+        })
+        try:
+            message = await asyncio.wait_for(channel_layer.receive(reply), CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.calls_failed += 1
+            print(f"Home shard did not answer {op}")
+            return False, None
+        return True, message["result"]
+
+    def get_stats(self):
+        return {
+            "enabled": self.enabled,
+            "home": self.home,
+            "listening": bool(self.task and not self.task.done()),
+            "home_up": self.home or self.home_up,
+            "calls_sent": self.calls_sent,
+            "calls_served": self.calls_served,
+            "calls_failed": self.calls_failed,
+            "calls_retrying": self.calls_retrying,
+        }
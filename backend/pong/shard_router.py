@@ -0,0 +1,84 @@
+import asyncio
+from .sharding import shard_for_request
+
+MAX_HEAD_SIZE = 64 * 1024
+
+
+def one_request_only(head):
+    """
+    The request head with "Connection: close", so the worker closes the
+    connection after answering it. Websocket upgrades are left alone.
+    """
+    lines = head[:-4].split(b"\r\n")
+    if any(line.lower().startswith(b"upgrade:") for line in lines[1:]):
+        return head
+    lines = [lines[0]] + [
+        line for line in lines[1:] if not line.lower().startswith(b"connection:")
+    ]
+    lines.append(b"Connection: close")
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class ShardRouter:
+    """
+    Minimal TCP front for sharded workers.
+
+    Reads the head of the first HTTP request on a connection, picks the
+    worker with shard_for_request() and then just relays bytes both ways.
+    Only that first request is parsed, so a plain HTTP request is sent on
+    with "Connection: close": the client opens a new connection, routed
+    again, for its next request instead of reusing this one, which may
+    lead to the wrong worker. A websocket upgrade keeps its connection.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends  # [(host, port)], index == shard index
+        self.routed = [0] * len(backends)
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        try:
+            target = head.split(b"\r\n", 1)[0].split(b" ")[1].decode("latin-1")
+        except IndexError:
+            client_writer.close()
+            return
+        shard = shard_for_request(target, len(self.backends))
+        self.routed[shard] += 1
+
+        host, port = self.backends[shard]
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            print(f"Shard {shard} unreachable:", str(e))
+            client_writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            client_writer.close()
+            return
+
+        backend_writer.write(one_request_only(head))
+        await asyncio.gather(
+            self._relay(client_reader, backend_writer),
+            self._relay(backend_reader, client_writer),
+        )
+
+    async def _relay(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_SIZE)
+        async with server:
+            await server.serve_forever()
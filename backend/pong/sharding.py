@@ -0,0 +1,41 @@
+import zlib
+from urllib.parse import parse_qs, urlsplit
+from django.conf import settings
+
+# Shard that owns everything not tied to a single game: REST, chat, status,
+# tournaments and matchmaking for players that did not pick a lobby.
+HOME_SHARD = 0
+
+
+def shard_count():
+    return max(1, int(getattr(settings, "PONG_SHARD_COUNT", 1)))
+
+
+def shard_index():
+    return int(getattr(settings, "PONG_SHARD_INDEX", 0))
+
+
+def shard_for(key, count=None):
+    """
+    Stable shard for a game or lobby id. crc32 is the same in every process
+    and across restarts, unlike hash().
+    """
+    count = count or shard_count()
+    return zlib.crc32(key.encode()) % count
+
+
+def owns(game_id):
+    return shard_for(game_id) == shard_index()
+
+
+def shard_for_request(target, count):
+    """
+    Shard that should serve a request line target such as
+    "/ws/pong/?key=...&lobby=game_7". Only lobby connects are spread out.
+    """
+    url = urlsplit(target)
+    if url.path.startswith("/ws/pong/"):
+        lobby = parse_qs(url.query).get("lobby", [None])[0]
+        if lobby:
+            return shard_for(lobby, count)
+    return HOME_SHARD
@@ -1,3 +1,963 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import tempfile
+from unittest.mock import AsyncMock, patch
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from channels.exceptions import ChannelFull
+from django.db import OperationalError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from backend.layers import CoalescingInMemoryChannelLayer, UnixSocketChannelLayer
+from users.models import MatchHistory, PongUser
+from .batch_physics import BatchEngine
+from .brackets import FORMATS
+from .consumers import Game, GameManager
+from .game_phases import COUNTDOWN, ENDED, PLAYING, WAITING
+from .lobby_index import LobbyIndex
+from .match_results import MatchResultWriter
+from .matchmaking import CLAIM_SECONDS, PENDING_SECONDS, MatchmakingQueue, ShardedMatchmaking
+from .physics import ScalarEngine
+from .protocol import SnapshotEncoder, decode_frame
+from .round_robin import circle_rounds
+from .routing import websocket_urlpatterns
+from .shard_link import ShardLink
+from .timer_wheel import TimerWheel
+from .tournament_manager import TournamentManager
+from .views import list_lobbies
 
-# Create your tests here.
+
+def random_game(rng, game_id):
+    g = Game(game_id)
+    g.paddles = {"a": rng.uniform(0, 500), "b": rng.uniform(0, 500)}
+    g.ball = {
+        "x": rng.uniform(20, 960),
+        "y": rng.uniform(10, 560),
+        "dx": rng.choice((-1, 1)) * rng.uniform(0.8, 2.5),
+        "dy": rng.choice((-1, 1)) * rng.uniform(0.8, 2.5),
+    }
+    g.paddle_directions = {"a": rng.choice((-1, 0, 1)), "b": rng.choice((-1, 0, 1))}
+    return g
+
+
+def copy_game(g, game_id):
+    copy = Game(game_id)
+    copy.paddles = dict(g.paddles)
+    copy.ball = dict(g.ball)
+    copy.paddle_directions = dict(g.paddle_directions)
+    return copy
+
+
+class ProtocolTests(SimpleTestCase):
+    # Values a float32 holds exactly, so decoding gives them back unchanged
+    frames = [
+        ({"a": 250.0, "b": 250.0}, {"x": 500.0, "y": 300.0, "dx": 1.0, "dy": 1.0}, {"a": 0, "b": 0}),
+        ({"a": 255.0, "b": 250.0}, {"x": 505.0, "y": 305.0, "dx": 1.0, "dy": 1.0}, {"a": 0, "b": 0}),
+        ({"a": 255.0, "b": 250.0}, {"x": 505.0, "y": 305.0, "dx": 1.0, "dy": 1.0}, {"a": 0, "b": 0}),
+        ({"a": 260.0, "b": 245.5}, {"x": 12.5, "y": 0.0, "dx": -1.25, "dy": -1.5}, {"a": 2, "b": 1}),
+    ]
+
+    def test_deltas_round_trip(self):
+        encoder = SnapshotEncoder()
+        state = None
+        for paddles, ball, score in self.frames:
+            seq, keyframe, delta = encoder.encode(paddles, ball, score)
+            # A client starts from a keyframe, then applies deltas
+            decoded_seq, state = decode_frame(keyframe if state is None else delta, state)
+            self.assertEqual(decoded_seq, seq)
+            self.assertEqual((state["paddles"], state["ball"], state["score"]), (paddles, ball, score))
+            # A keyframe alone gives the same state
+            _, fresh = decode_frame(keyframe)
+            self.assertEqual(fresh, state)
+
+    def test_unchanged_frame_is_header_only(self):
+        encoder = SnapshotEncoder()
+        encoder.encode(*self.frames[1])
+        _, keyframe, delta = encoder.encode(*self.frames[2])
+        self.assertLess(len(delta), len(keyframe))
+        self.assertEqual(delta[-1], 0)  # Empty field mask
+
+    def test_delta_out_of_sequence(self):
+        encoder = SnapshotEncoder()
+        _, first, _ = encoder.encode(*self.frames[0])
+        encoder.encode(*self.frames[1])
+        _, _, third = encoder.encode(*self.frames[3])
+        _, state = decode_frame(first)
+        with self.assertRaises(ValueError):
+            decode_frame(third, state)
+        with self.assertRaises(ValueError):
+            decode_frame(third)
+
+
+class PhysicsTests(SimpleTestCase):
+    def run_engines(self, scalar, batch, scale, steps=600, games=24):
+        rng = random.Random(scale)
+        scalar_games = [random_game(rng, f"s{i}") for i in range(games)]
+        batch_games = [copy_game(g, f"b{i}") for i, g in enumerate(scalar_games)]
+        for _ in range(steps):
+            scalar_scored = scalar.advance([(g, 1) for g in scalar_games])
+            batch_scored = batch.advance([(g, 1) for g in batch_games])
+            self.assertEqual(
+                [(g.game_id[1:], p) for g, p in scalar_scored],
+                [(g.game_id[1:], p) for g, p in batch_scored],
+            )
+            for g, _ in scalar_scored:
+                scalar.reset_ball(g)
+            for g, _ in batch_scored:
+                batch.reset_ball(g)
+            for s, b in zip(scalar_games, batch_games):
+                self.assertEqual((s.paddles, s.ball, s.score), (b.paddles, b.ball, b.score))
+
+    def test_batch_matches_scalar(self):
+        for scale in (1, 2, 4):
+            self.run_engines(ScalarEngine(scale=scale), BatchEngine(scale=scale), scale)
+
+    def test_swept_batch_matches_swept_scalar(self):
+        for scale in (1, 2, 4):
+            self.run_engines(
+                ScalarEngine(swept=True, scale=scale), BatchEngine(swept=True, scale=scale), scale
+            )
+
+    def test_sweep_matches_step_away_from_collisions(self):
+        rng = random.Random(7)
+        for i in range(200):
+            g = random_game(rng, "step")
+            g.ball["x"] = rng.uniform(100, 900)
+            g.ball["y"] = rng.uniform(100, 470)
+            swept = copy_game(g, "sweep")
+            self.assertIsNone(g.step())
+            self.assertIsNone(swept.sweep())
+            self.assertEqual((g.paddles, g.ball), (swept.paddles, swept.ball))
+
+    def test_sweep_does_not_tunnel_through_a_paddle(self):
+        # At 15 Hz the ball ends a step behind paddle a, which it should hit
+        discrete, swept = Game("step"), Game("sweep")
+        for g in (discrete, swept):
+            g.ball = {"x": 30, "y": 300, "dx": -2.5, "dy": 0}
+        self.assertEqual(discrete.step(4), "b")
+        self.assertIsNone(swept.sweep(4))
+        self.assertGreater(swept.ball["dx"], 0)
+        self.assertGreater(swept.ball["x"], 10)
+
+
+class CoalescingLayerTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = CoalescingInMemoryChannelLayer(coalesce=["send_update"], capacity=3)
+
+    async def drain(self, channel):
+        received = []
+        while channel in self.layer.channels:
+            received.append((await self.layer.receive(channel))["n"])
+        return received
+
+    async def test_newer_snapshot_replaces_the_queued_one(self):
+        channel = await self.layer.new_channel()
+        await self.layer.send(channel, {"type": "send_update", "n": 1})
+        await self.layer.send(channel, {"type": "countdown_tick", "n": 2})
+        await self.layer.send(channel, {"type": "send_update", "n": 3})
+        # The latest snapshot moves behind the control message
+        self.assertEqual(await self.drain(channel), [2, 3])
+        self.assertEqual(self.layer.replaced_count, 1)
+
+    async def test_control_message_evicts_a_snapshot_when_full(self):
+        channel = await self.layer.new_channel()
+        await self.layer.send(channel, {"type": "countdown_tick", "n": 1})
+        await self.layer.send(channel, {"type": "send_update", "n": 2})
+        await self.layer.send(channel, {"type": "countdown_tick", "n": 3})
+        await self.layer.send(channel, {"type": "game_over", "n": 4})
+        self.assertEqual(self.layer.evicted_count, 1)
+        self.assertEqual(await self.drain(channel), [1, 3, 4])
+
+    async def test_full_of_control_messages(self):
+        channel = await self.layer.new_channel()
+        for n in range(3):
+            await self.layer.send(channel, {"type": "countdown_tick", "n": n})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send(channel, {"type": "game_over", "n": 3})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send(channel, {"type": "send_update", "n": 4})
+        self.assertEqual(await self.drain(channel), [0, 1, 2])
+
+    async def test_group_send_shares_the_coalescing(self):
+        channels = [await self.layer.new_channel() for _ in range(2)]
+        for channel in channels:
+            await self.layer.group_add("game_1", channel)
+        for n in range(5):
+            await self.layer.group_send("game_1", {"type": "send_update", "n": n})
+        for channel in channels:
+            self.assertEqual(await self.drain(channel), [4])
+        self.assertEqual(self.layer.replaced_count, 8)
+
+
+class UnixSocketLayerTests(SimpleTestCase):
+    async def start(self):
+        self.path = tempfile.mkdtemp()
+        self.layers = []
+        # Two workers: one process here, so they get node names by hand
+        for node in ("a", "b"):
+            layer = UnixSocketChannelLayer(path=self.path)
+            layer.node = node
+            await layer._ready()
+            self.layers.append(layer)
+
+    async def stop(self):
+        for layer in self.layers:
+            await layer.close()
+        os.rmdir(self.path)
+
+    async def until(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("timed out")
+
+    async def test_send_to_another_process(self):
+        await self.start()
+        try:
+            a, b = self.layers
+            channel = await b.new_channel()
+            await a.send(channel, {"type": "chat", "text": "hi"})
+            message = await asyncio.wait_for(b.receive(channel), 2)
+            self.assertEqual(message, {"type": "chat", "text": "hi"})
+            self.assertEqual(a.forwarded_count, 1)
+        finally:
+            await self.stop()
+
+    async def test_group_send_reaches_only_peers_with_members(self):
+        await self.start()
+        try:
+            a, b = self.layers
+            remote = await b.new_channel()
+            local = await a.new_channel()
+            await b.group_add("game_1", remote)
+            await a.group_add("game_1", local)
+            await a.group_add("game_2", local)
+            await self.until(lambda: "b" in a.remote_groups.get("game_1", ()))
+            await a.group_send("game_1", {"type": "send_update", "n": 1})
+            self.assertEqual(await asyncio.wait_for(b.receive(remote), 2), {"type": "send_update", "n": 1})
+            self.assertEqual(await a.receive(local), {"type": "send_update", "n": 1})
+            # Nobody on b is in game_2: nothing leaves the process
+            await a.group_send("game_2", {"type": "send_update", "n": 2})
+            self.assertEqual(a.forwarded_count, 1)
+            # Once b's last member leaves, a stops forwarding to it
+            await b.group_discard("game_1", remote)
+            await self.until(lambda: not a.remote_groups["game_1"])
+            await a.group_send("game_1", {"type": "send_update", "n": 3})
+            self.assertEqual(a.forwarded_count, 1)
+        finally:
+            await self.stop()
+
+    def test_refuses_a_directory_others_can_open(self):
+        with tempfile.TemporaryDirectory() as path:
+            os.chmod(path, 0o755)
+            with self.assertRaises(RuntimeError):
+                UnixSocketChannelLayer._check_private(path)
+            os.chmod(path, 0o700)
+            UnixSocketChannelLayer._check_private(path)
+
+
+class TimerWheelTests(SimpleTestCase):
+    async def test_fires_in_deadline_order(self):
+        wheel = TimerWheel(resolution=0.001)
+        fired = []
+        # 0.09 s is past level 0's 64 ticks, so it cascades down first
+        for name, delay in [("c", 0.03), ("a", 0.01), ("e", 0.09), ("b", 0.02), ("a2", 0.01)]:
+            wheel.schedule(delay, fired.append, name)
+        wheel.schedule(0.015, fired.append, "cancelled").cancel()
+        await asyncio.wait_for(wheel.task, 2)
+        self.assertEqual(fired, ["a", "a2", "b", "c", "e"])
+        self.assertEqual(wheel.pending, 0)
+        self.assertEqual(wheel.cancelled, 1)
+
+    async def test_cancelling_the_last_timer_stops_the_driver(self):
+        wheel = TimerWheel(resolution=0.001)
+        timer = wheel.schedule(600, print, "never")
+        timer.cancel()
+        timer.cancel()
+        self.assertEqual(wheel.pending, 0)
+        self.assertEqual(wheel.cancelled, 1)
+        await asyncio.wait_for(wheel.task, 1)
+
+    async def test_callback_cancels_a_timer_due_in_the_same_tick(self):
+        wheel = TimerWheel(resolution=0.001)
+        fired = []
+        later = None
+
+        def first():
+            fired.append("first")
+            later.cancel()
+
+        wheel.schedule(0.005, first)
+        later = wheel.schedule(0.005, fired.append, "later")
+        await asyncio.wait_for(wheel.task, 1)
+        self.assertEqual(fired, ["first"])
+        self.assertEqual((wheel.pending, wheel.fired), (0, 1))
+
+    async def test_awaits_coroutine_callbacks(self):
+        wheel = TimerWheel(resolution=0.001)
+        fired = []
+
+        async def callback(name):
+            fired.append(name)
+
+        wheel.schedule(0.005, callback, "later")
+        wheel.schedule(0.001, callback, "first")
+        await asyncio.wait_for(wheel.task, 2)
+        self.assertEqual(fired, ["first", "later"])
+
+
+class CircleRoundsTests(SimpleTestCase):
+    def test_every_pair_plays_once(self):
+        for n in range(2, 10):
+            players = [f"p{i}" for i in range(n)]
+            rounds = circle_rounds(players)
+            self.assertEqual(len(rounds), n - 1 if n % 2 == 0 else n)
+            pairs = [frozenset(pair) for r in rounds for pair in r]
+            self.assertEqual(len(pairs), n * (n - 1) // 2)
+            self.assertEqual(len(set(pairs)), len(pairs))
+
+    def test_nobody_plays_twice_in_a_round(self):
+        for n in range(2, 10):
+            for r in circle_rounds([f"p{i}" for i in range(n)]):
+                playing = [p for pair in r for p in pair]
+                self.assertEqual(len(playing), len(set(playing)))
+                # Everyone plays except the one sitting out an odd round
+                self.assertEqual(len(playing), n - n % 2)
+
+    def test_too_few_players(self):
+        self.assertEqual(circle_rounds([]), [])
+        self.assertEqual(circle_rounds(["solo"]), [[]])
+
+
+class BracketTests(SimpleTestCase):
+    def play(self, name, n, rounds=None):
+        """
+        Run a whole bracket, the lower seed winning every match. Returns the
+        bracket and the (pairs, byes) of every round.
+        """
+        players = [f"p{i}" for i in range(n)]
+        bracket = FORMATS[name](players, rounds)
+        played = []
+        while len(played) < 4 * n:
+            pairs, byes = bracket.pair_round()
+            played.append((pairs, byes))
+            for pair in pairs:
+                bracket.record(pair, min(pair, key=players.index))
+            if bracket.finished:
+                return bracket, played
+        self.fail(f"{name} with {n} players did not finish")
+
+    def test_nobody_booked_twice_in_a_round(self):
+        for name in FORMATS:
+            for n in range(2, 10):
+                _, played = self.play(name, n)
+                for pairs, byes in played:
+                    booked = [p for pair in pairs for p in pair] + list(byes)
+                    self.assertEqual(len(booked), len(set(booked)), (name, n, pairs, byes))
+
+    def test_every_format_finishes_with_a_result(self):
+        for name in FORMATS:
+            for n in range(2, 10):
+                bracket, played = self.play(name, n)
+                result = bracket.final_result()
+                self.assertIn(result["type"], ("winner", "draw"))
+                self.assertTrue(result["usernames"])
+                if bracket.rounds:
+                    self.assertEqual(len(played), bracket.rounds)
+
+    def test_elimination_winner(self):
+        for name in ("single_elimination", "double_elimination"):
+            for n in range(2, 10):
+                bracket, _ = self.play(name, n)
+                self.assertEqual(bracket.final_result(), {"type": "winner", "usernames": ["p0"]})
+
+    def test_swiss_rounds(self):
+        self.assertEqual(self.play("swiss", 8)[0].rounds, 3)
+        self.assertEqual(self.play("swiss", 8, rounds=5)[0].rounds, 5)
+        # Never more rounds than opponents to meet
+        self.assertEqual(self.play("swiss", 3, rounds=10)[0].rounds, 2)
+
+
+@patch("pong.tournament_manager.send_server_announcement", new_callable=AsyncMock)
+class TournamentTests(SimpleTestCase):
+    def setUp(self):
+        TournamentManager._instance = None
+        self.manager = TournamentManager.get_instance()
+
+    def tearDown(self):
+        TournamentManager._instance = None
+
+    async def start(self, name, players):
+        m = self.manager
+        tournament = await m.call(m._create, "organizer", name, None)
+        for p in players:
+            await m.call(m._sign_in, tournament["id"], p, p.upper())
+        await m.call(m._close_signup, tournament["id"])
+        return tournament["id"]
+
+    async def test_single_player_cancels(self, announce):
+        tournament_id = await self.start("round_robin", ["p0"])
+        self.assertNotIn(tournament_id, self.manager.tournaments)
+        self.assertIsNone(self.manager.get_snapshot(tournament_id))
+        self.assertNotIn("organizer", self.manager.organizers)
+
+    async def test_formats_play_to_the_end(self, announce):
+        for name in FORMATS:
+            m = self.manager
+            players = [f"p{i}" for i in range(5)]
+            tournament_id = await self.start(name, players)
+            tournament = m.tournaments[tournament_id]
+            for _ in range(50):
+                if tournament["final_result"]:
+                    break
+                current = [
+                    match for match in tournament["matches"]
+                    if match["round"] == tournament["round"] and match["winner"] is None
+                ]
+                booked = [p for match in current for p in match["players"]] + tournament["byes"]
+                self.assertEqual(len(booked), len(set(booked)), name)
+                for match in current:
+                    self.assertTrue(await m.finish_match_async(match["game_id"], match["players"][0]))
+            self.assertIsNotNone(tournament["final_result"], name)
+            self.assertFalse(await m.finish_match_async("not_a_match", "p0"))
+            await m.call(m._close, tournament_id)
+
+    async def test_request_threads(self, announce):
+        # Views call the sync API from worker threads; async_to_sync runs
+        # each command on this loop, where the actor lives
+        m = self.manager
+        created = await sync_to_async(m.create_tournament)("organizer", "swiss", 2)
+        tournament_id = created["id"]
+        signed = await sync_to_async(m.sign_in_player)(tournament_id, "p0", "P0")
+        self.assertEqual(signed["players"], ["p0"])
+        self.assertEqual(m.get_tournament(tournament_id)["rounds"], 2)
+        closed = await sync_to_async(m.close_tournament)(tournament_id)
+        self.assertEqual(closed, {"message": "Tournament closed"})
+        self.assertNotIn(tournament_id, m.tournaments)
+
+
+class LobbyLifecycleTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch("pong.lobby_lifecycle.time.monotonic", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.manager = GameManager()
+
+    def game(self, game_id, phase, idle):
+        g = Game(game_id)
+        g.phase = phase
+        g.last_activity = self.now - idle
+        self.manager.games[game_id] = g
+        self.manager.lobbies.update(g)
+        return g
+
+    async def test_evicts_games_idle_past_their_state_ttl(self):
+        lifecycle = self.manager.lifecycle
+        self.game("idle_lobby", WAITING, 601)
+        self.game("fresh_lobby", WAITING, 599)
+        self.game("long_rally", PLAYING, 899)
+        self.game("over", ENDED, 31)
+        await lifecycle.sweep()
+        self.assertEqual(sorted(self.manager.games), ["fresh_lobby", "long_rally"])
+        self.assertEqual(lifecycle.evicted, {WAITING: 1, COUNTDOWN: 0, PLAYING: 0, ENDED: 1})
+        self.assertNotIn("idle_lobby", self.manager.lobbies.entries)
+
+    @override_settings(PONG_LOBBY_TTL={WAITING: 5})
+    async def test_ttl_setting_overrides_one_state(self):
+        self.manager = GameManager()  # Reads the setting
+        self.game("lobby", WAITING, 6)
+        self.game("rally", PLAYING, 6)
+        self.assertEqual(self.manager.lifecycle.ttl[PLAYING], 900)
+        await self.manager.lifecycle.sweep()
+        self.assertEqual(list(self.manager.games), ["rally"])
+
+    async def test_eviction_tells_sockets_and_drops_their_keys(self):
+        g = self.game("idle_lobby", WAITING, 601)
+        g.players = {"a": "alice"}
+        self.manager.browser_key_to_game["alice"] = g
+        self.manager.browser_key_to_channel["alice"] = "channel"
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(g.group_name, channel)
+        await self.manager.lifecycle.sweep()
+        self.assertEqual(await layer.receive(channel), {"type": "lobby_expired"})
+        self.assertEqual(self.manager.browser_key_to_game, {})
+        self.assertEqual(self.manager.browser_key_to_channel, {})
+        self.assertEqual(self.manager.lifecycle.stale_keys, 1)
+        await layer.group_discard(g.group_name, channel)
+
+
+@override_settings(PONG_REDIRECT_DELAY=0.01)
+class GameFinalizerTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = GameManager()
+        self.finalizer = self.manager.finalizer
+        self.tournaments = AsyncMock()
+        self.tournaments.finish_match_async.return_value = False
+        for target, instance in [
+            ("pong.game_finalizer.TournamentManager.get_instance", self.tournaments),
+            ("pong.game_finalizer.MatchResultWriter.get_instance", AsyncMock()),
+        ]:
+            patcher = patch(target, return_value=instance)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def finished_game(self, game_id="game_1"):
+        g = Game(game_id)
+        g.players = {"a": "alice", "b": "bob"}
+        self.manager.games[game_id] = g
+        layer = get_channel_layer()
+        self.channel = await layer.new_channel()
+        await layer.group_add(g.group_name, self.channel)
+        self.addCleanup(layer.group_discard, g.group_name, self.channel)
+        self.finalizer.finish(g, "alice", "bob")
+        return g
+
+    async def received(self):
+        return await asyncio.wait_for(get_channel_layer().receive(self.channel), 2)
+
+    async def test_game_over_then_redirect(self):
+        g = await self.finished_game()
+        self.assertEqual((await self.received())["type"], "send_gameover_to_client")
+        self.assertEqual(await self.received(), {"type": "redirect_play"})
+        self.assertNotIn(g.game_id, self.manager.games)
+        self.assertEqual((self.finalizer.finalized, self.finalizer.redirected), (1, 1))
+        self.tournaments.finish_match_async.assert_awaited_once_with(g.game_id, "alice")
+
+    async def test_tournament_match_redirects_to_the_tournament(self):
+        self.tournaments.finish_match_async.return_value = True
+        await self.finished_game()
+        await self.received()
+        self.assertEqual(await self.received(), {"type": "redirect_tournament"})
+
+    async def test_finished_once(self):
+        g = await self.finished_game()
+        self.finalizer.finish(g, "bob", "alice")
+        await self.received()
+        await self.received()
+        self.assertEqual(self.finalizer.finalized, 1)
+
+    async def test_cancel_drops_the_pending_redirect(self):
+        g = await self.finished_game()
+        await self.received()
+        self.assertIn(g.game_id, self.finalizer.timers)
+        self.finalizer.cancel(g)
+        await asyncio.wait_for(self.manager.phases.wheel.task, 2)
+        self.assertIn(g.game_id, self.manager.games)
+        self.assertEqual((self.finalizer.redirected, self.finalizer.timers), (0, {}))
+
+    async def test_evicted_while_finalizing(self):
+        release = asyncio.Event()
+
+        async def finish_match(game_id, winner):
+            await release.wait()
+            return False
+
+        self.tournaments.finish_match_async.side_effect = finish_match
+        g = await self.finished_game()
+        task = self.finalizer.tasks[g.game_id]
+        self.manager.delete_game(g.game_id)
+        release.set()
+        await task
+        self.assertEqual((self.finalizer.finalized, self.finalizer.timers), (1, {}))
+
+    async def test_cancelled_task_stays_cancelled(self):
+        async def finish_match(game_id, winner):
+            await asyncio.Event().wait()  # Home shard never answers
+
+        self.tournaments.finish_match_async.side_effect = finish_match
+        g = await self.finished_game()
+        task = self.finalizer.tasks[g.game_id]
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual((self.finalizer.finalized, self.finalizer.timers), (1, {}))
+
+
+class LobbyListingTests(SimpleTestCase):
+    def setUp(self):
+        previous = GameManager.instance
+        self.addCleanup(setattr, GameManager, "instance", previous)
+        self.manager = GameManager.instance = GameManager()
+        # g0..g6: odd ones wait for a second player, g3 is a tournament match
+        for i in range(7):
+            self.add(f"g{i}", players=1 if i % 2 else 2, tournament=i == 3)
+
+    def add(self, game_id, players=1, tournament=False):
+        g = Game(game_id)
+        g.players = {"a": f"{game_id}_a", "b": f"{game_id}_b"} if players == 2 else {"a": f"{game_id}_a"}
+        g.is_tournament = tournament
+        self.manager.games[game_id] = g
+        self.manager.lobbies.update(g)
+        return g
+
+    async def get(self, query="", **headers):
+        response = await list_lobbies(RequestFactory().get("/api/lobbies" + query, **headers))
+        body = json.loads(response.content) if response.status_code == 200 else None
+        return response, body
+
+    async def test_cursor_walks_every_lobby_once(self):
+        seen = []
+        cursor = 0
+        while cursor is not None:
+            _, body = await self.get(f"?limit=3&cursor={cursor}")
+            self.assertLessEqual(len(body["lobbies"]), 3)
+            seen += [lobby["game_id"] for lobby in body["lobbies"]]
+            cursor = body["next"]
+        self.assertEqual(seen, [f"g{i}" for i in range(7)])
+
+    async def test_cursor_survives_removals(self):
+        _, first = await self.get("?limit=2")
+        self.manager.delete_game("g1")
+        self.manager.delete_game("g2")
+        _, second = await self.get(f"?limit=2&cursor={first['next']}")
+        self.assertEqual([lobby["game_id"] for lobby in second["lobbies"]], ["g3", "g4"])
+
+    async def test_filters(self):
+        _, body = await self.get("?open=1")
+        self.assertEqual([lobby["game_id"] for lobby in body["lobbies"]], ["g1", "g3", "g5"])
+        _, body = await self.get("?open=1&kind=casual&limit=1")
+        self.assertEqual([lobby["game_id"] for lobby in body["lobbies"]], ["g1"])
+        _, body = await self.get(f"?open=1&kind=casual&limit=1&cursor={body['next']}")
+        self.assertEqual([lobby["game_id"] for lobby in body["lobbies"]], ["g5"])
+        self.assertIsNone(body["next"])
+
+    async def test_not_modified_until_a_lobby_changes(self):
+        response, _ = await self.get("?limit=3")
+        etag = response["ETag"]
+        builds = self.manager.lobbies.page_builds
+        response, _ = await self.get("?limit=3", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response["ETag"], response.content), (304, etag, b""))
+        self.assertEqual(self.manager.lobbies.page_builds, builds)
+        self.add("g7")
+        response, body = await self.get("?limit=3", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response["ETag"], f'"lobbies-{body["version"]}"')
+
+    async def test_unchanged_page_is_built_once(self):
+        await self.get("?limit=3")
+        await self.get("?limit=3")
+        self.assertEqual(self.manager.lobbies.page_hits, 1)
+
+    async def test_bad_query(self):
+        for query in ("?cursor=x", "?limit=many", "?kind=ranked"):
+            response, _ = await self.get(query)
+            self.assertEqual(response.status_code, 400, query)
+
+
+class LobbyFeedTests(SimpleTestCase):
+    def setUp(self):
+        previous = GameManager.instance
+        self.addCleanup(setattr, GameManager, "instance", previous)
+        self.manager = GameManager.instance = GameManager()
+        self.index = self.manager.lobbies
+
+    async def connect(self, query=""):
+        feed = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/lobbies/" + query)
+        connected, _ = await feed.connect()
+        self.assertTrue(connected)
+        return feed
+
+    async def change(self, game_id):
+        # A new lobby, or a second player in an existing one
+        g = self.manager.games.get(game_id)
+        if g:
+            g.players["b"] = f"{game_id}_b"
+        else:
+            g = self.manager.games[game_id] = Game(game_id)
+            g.players = {"a": f"{game_id}_a"}
+        self.index.update(g)
+        await self.index.flush()
+
+    async def test_snapshot_then_events(self):
+        await self.change("g1")
+        feed = await self.connect()
+        snapshot = await feed.receive_json_from()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["epoch"], self.index.epoch)
+        self.assertEqual([lobby["game_id"] for lobby in snapshot["lobbies"]], ["g1"])
+        await self.change("g2")
+        event = await feed.receive_json_from()
+        self.assertEqual((event["type"], event["lobby"]["game_id"]), ("lobby_added", "g2"))
+        self.assertEqual(event["seq"], snapshot["seq"] + 1)
+        await feed.disconnect()
+
+    async def test_resume_replays_only_missed_events(self):
+        feed = await self.connect()
+        snapshot = await feed.receive_json_from()
+        await feed.disconnect()
+        await self.change("g1")
+        await self.change("g1")
+        feed = await self.connect(f"?epoch={snapshot['epoch']}&since={snapshot['seq']}")
+        missed = [await feed.receive_json_from() for _ in range(2)]
+        self.assertEqual([event["type"] for event in missed], ["lobby_added", "lobby_updated"])
+        self.assertEqual([event["seq"] for event in missed], [snapshot["seq"] + 1, snapshot["seq"] + 2])
+        self.assertTrue(await feed.receive_nothing())
+        await feed.disconnect()
+
+    async def test_resume_when_nothing_was_missed(self):
+        await self.change("g1")
+        feed = await self.connect(f"?epoch={self.index.epoch}&since={self.index.version}")
+        self.assertTrue(await feed.receive_nothing())
+        await feed.disconnect()
+
+    async def test_snapshot_when_the_events_are_gone(self):
+        await self.change("g1")
+        # Only g2's event is still kept, as if the backlog had overflowed
+        self.index.log.clear()
+        await self.change("g2")
+        epoch, version = self.index.epoch, self.index.version
+        for query in [
+            f"?epoch={epoch}&since={version - 2}",  # Missed g1's event too
+            f"?epoch=restarted&since={version}",  # Another process's versions
+            f"?epoch={epoch}&since={version + 1}",  # From the future
+            "?since=oops",
+        ]:
+            feed = await self.connect(query)
+            self.assertEqual((await feed.receive_json_from())["type"], "snapshot", query)
+            await feed.disconnect()
+
+
+class MatchmakingQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch("pong.matchmaking.time.monotonic", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def lobby(self, queue, game_id, bucket=0):
+        # A matchmade lobby whose creator is waiting for an opponent
+        g = Game(game_id)
+        g.matchmade = True
+        g.mm_bucket = bucket
+        g.players = {"a": f"{game_id}_creator"}
+        queue.update(g)
+        return g
+
+    def test_pairs_with_the_oldest_open_lobby(self):
+        queue = MatchmakingQueue()
+        first = self.lobby(queue, "g1")
+        second = self.lobby(queue, "g2")
+        self.assertIs(queue.take(), first)
+        self.assertIs(queue.take(), second)
+        self.assertIsNone(queue.take())
+        self.assertEqual(queue.paired_count, 2)
+
+    def test_skips_lobbies_that_filled_up_or_left(self):
+        queue = MatchmakingQueue()
+        full = self.lobby(queue, "g1")
+        removed = self.lobby(queue, "g2")
+        open_lobby = self.lobby(queue, "g3")
+        full.players["b"] = "someone"  # Not told yet
+        queue.remove(removed)
+        self.assertIs(queue.take(), open_lobby)
+        self.assertEqual(queue.get_stats()["open_lobbies"], 0)
+        # Opens up again once someone leaves
+        del full.players["b"]
+        queue.update(full)
+        self.assertIs(queue.take(), full)
+
+    def test_private_and_tournament_lobbies_are_not_queued(self):
+        queue = MatchmakingQueue()
+        g = self.lobby(queue, "g1")
+        queue.remove(g)
+        g.is_tournament = True
+        queue.update(g)
+        private = Game("g2")
+        queue.update(private)
+        self.assertIsNone(queue.take())
+
+    @override_settings(PONG_MATCHMAKING_BUCKETS=3, PONG_MATCHMAKING_WIDEN_AFTER=10)
+    def test_widens_to_neighbouring_buckets(self):
+        queue = MatchmakingQueue()
+        low = self.lobby(queue, "g1", bucket=0)
+        high = self.lobby(queue, "g2", bucket=2)
+        # Too fresh for anyone but its own bucket
+        self.assertIsNone(queue.take(1))
+        self.now += 10
+        self.assertIs(queue.take(1), low)
+        self.assertIs(queue.take(1), high)
+        # Never further than the next bucket
+        far = self.lobby(queue, "g3", bucket=2)
+        self.now += 10
+        self.assertIsNone(queue.take(0))
+        self.assertIs(queue.take(2), far)
+
+
+@override_settings(PONG_SHARD_COUNT=2)
+class ShardedMatchmakingTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch("pong.matchmaking.time.monotonic", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.lobbies = LobbyIndex()
+        self.mm = ShardedMatchmaking(self.lobbies)
+
+    def arrive(self, game_id, players, state=WAITING):
+        self.lobbies.apply({
+            "game_id": game_id,
+            "players_count": players,
+            "open_slots": 2 - players,
+            "players": [],
+            "state": state,
+            "kind": "casual",
+        })
+
+    def test_pairs_into_a_new_lobby(self):
+        first = self.mm.take_or_create()
+        self.assertEqual(self.mm.take_or_create(), first)
+        third = self.mm.take_or_create()
+        self.assertNotEqual(third, first)
+        self.assertEqual(self.mm.minted, 2)
+        self.assertEqual(self.mm.paired_count, 1)
+
+    def test_full_lobby_is_offered_again_once_it_reopens(self):
+        game_id = self.mm.take_or_create()
+        self.mm.take_or_create()
+        self.arrive(game_id, 2)
+        self.now += CLAIM_SECONDS
+        other = self.mm.take_or_create()
+        self.assertNotEqual(other, game_id)
+        # Someone leaves: back in the queue, behind the lobby made meanwhile
+        self.arrive(game_id, 1)
+        self.assertEqual(self.mm.get_stats()["offered_lobbies"], 2)
+        self.assertEqual(self.mm.take_or_create(), other)
+        self.assertEqual(self.mm.take_or_create(), game_id)
+
+    def test_claim_expires_when_the_player_never_comes(self):
+        game_id = self.mm.take_or_create()
+        self.arrive(game_id, 1)
+        self.assertEqual(self.mm.take_or_create(), game_id)
+        self.assertNotEqual(self.mm.take_or_create(), game_id)
+        self.now += CLAIM_SECONDS
+        self.mm.take_or_create()
+        self.assertEqual(self.mm.take_or_create(), game_id)
+
+    def test_started_removed_and_abandoned_lobbies_are_forgotten(self):
+        started = self.mm.take_or_create()
+        self.mm.take_or_create()
+        self.arrive(started, 2, state=PLAYING)
+        removed = self.mm.take_or_create()
+        self.arrive(removed, 1)
+        self.lobbies.remove(removed)
+        self.assertNotIn(started, self.mm.tracked)
+        self.assertNotIn(removed, self.mm.tracked)
+        abandoned = self.mm.take_or_create()
+        self.now += PENDING_SECONDS + 1
+        self.assertNotEqual(self.mm.take_or_create(), abandoned)
+        self.assertNotIn(abandoned, self.mm.tracked)
+
+
+@patch("pong.shard_link.RETRY_DELAY", 0)
+class ShardLinkTests(SimpleTestCase):
+    async def test_retry_until_home_answers(self):
+        link = ShardLink()
+        answers = [(False, None), (False, None), (True, True)]
+        with patch.object(link, "_call", AsyncMock(side_effect=answers)) as call:
+            self.assertTrue(await link.call_home("finish_match", "game_1", "p0", retry=True))
+        self.assertEqual(call.await_count, 3)
+
+    async def test_no_retry_returns_none(self):
+        link = ShardLink()
+        with patch.object(link, "_call", AsyncMock(return_value=(False, None))) as call:
+            self.assertIsNone(await link.call_home("join_match", "game_1"))
+        self.assertEqual(call.await_count, 1)
+
+    @patch("pong.shard_link.CALL_TIMEOUT", 0.01)
+    async def test_call_fails_while_home_is_not_up(self):
+        link = ShardLink()
+        self.assertIsNone(await link.call_home("join_match", "game_1"))
+        self.assertEqual(link.calls_failed, 1)
+        self.assertEqual(link.calls_sent, 0)
+
+
+class MatchResultWriterTests(TestCase):
+    def setUp(self):
+        for name in ("alice", "bob"):
+            PongUser.objects.create(username=name, email=f"{name}@example.com")
+        self.writer = MatchResultWriter()
+
+    def failing(self, times, error):
+        """bulk_create that raises `error` the first `times` calls."""
+        bulk_create = MatchHistory.objects.bulk_create
+        calls = []
+
+        def side_effect(rows):
+            calls.append(len(rows))
+            if len(calls) <= times:
+                raise error
+            return bulk_create(rows)
+        return patch.object(MatchHistory.objects, "bulk_create", side_effect=side_effect), calls
+
+    def record(self, *games):
+        with patch.object(self.writer, "ensure_running"):
+            for game_id, winner, loser in games:
+                self.writer.record(game_id, winner, loser)
+
+    def test_flush_is_one_insert(self):
+        self.record(("g1", "alice", "bob"), ("g2", "bob", "alice"), ("g3", "alice", "ghost"))
+        with CaptureQueriesContext(connection) as queries:
+            self.writer.flush_sync()
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(MatchHistory.objects.count(), 4)
+        self.assertEqual(MatchHistory.objects.filter(result=MatchHistory.WIN).count(), 2)
+        self.assertEqual((self.writer.written, self.writer.skipped), (4, 2))
+        # Known players are not looked up again
+        self.record(("g4", "alice", "bob"))
+        with CaptureQueriesContext(connection) as queries:
+            self.writer.flush_sync()
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("SELECT")])
+
+    def test_transient_failure_puts_the_batch_back(self):
+        self.record(("g1", "alice", "bob"))
+        batch, self.writer.pending = self.writer.pending, []
+        failing, _ = self.failing(1, OperationalError("database is locked"))
+        with failing:
+            self.writer._write(batch)
+        self.assertEqual([entry[5] for entry in self.writer.pending], [1, 1])
+        self.assertEqual(self.writer.failed_flushes, 1)
+        self.assertEqual(MatchHistory.objects.count(), 0)
+        self.writer.flush_sync()
+        self.assertEqual(MatchHistory.objects.count(), 2)
+
+    def test_row_that_cannot_be_written_is_dropped_alone(self):
+        self.record(("g1", "alice", "bob"))
+        # date_played is NOT NULL; no retry will fix that
+        self.writer.pending.append(("g2", "alice", "bob", MatchHistory.WIN, None, 0))
+        self.writer.flush_sync()
+        self.assertEqual(MatchHistory.objects.count(), 2)
+        self.assertEqual((self.writer.written, self.writer.dropped), (2, 1))
+        self.assertEqual(self.writer.pending, [])
+
+    @patch("pong.match_results.SHUTDOWN_RETRY_PAUSE", 0)
+    def test_shutdown_flush_retries_transient_errors(self):
+        self.writer.pending = [
+            ("g1", "alice", "bob", MatchHistory.WIN, now(), 0),
+            ("g1", "bob", "alice", MatchHistory.LOSS, now(), 0),
+        ]
+        failing, calls = self.failing(2, OperationalError("database is locked"))
+        with failing:
+            self.writer.flush_sync()
+        self.assertEqual(calls, [2, 2, 2])
+        self.assertEqual(MatchHistory.objects.count(), 2)
+        self.assertEqual((self.writer.pending, self.writer.dropped), ([], 0))
+
+    @patch("pong.match_results.SHUTDOWN_RETRY_PAUSE", 0)
+    def test_shutdown_flush_gives_up(self):
+        self.writer.pending = [("g1", "alice", "bob", MatchHistory.WIN, now(), 0)]
+        failing, calls = self.failing(100, OperationalError("database is gone"))
+        with failing:
+            self.writer.flush_sync()
+        self.assertEqual(len(calls), self.writer.max_retries)
+        self.assertEqual((self.writer.pending, self.writer.dropped), ([], 1))
@@ -0,0 +1,158 @@
+import asyncio
+import inspect
+import math
+
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS  # 64 slots per level
+SLOT_MASK = SLOTS - 1
+LEVELS = 3
+
+
+class Timer:
+    __slots__ = ("expires", "callback", "args", "cancelled", "wheel")
+
+    def __init__(self, expires, callback, args, wheel):
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.wheel = wheel  # None once it fired or was cancelled
+
+    def cancel(self):
+        self.cancelled = True
+        if self.wheel:
+            self.wheel._cancel()
+            self.wheel = None
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel shared by every game in the worker.
+
+    Time advances in ticks of `resolution` seconds. Level 0 holds the
+    timers due in the next 64 ticks, one slot per tick; each higher level
+    covers 64 times the span of the one below, so with the default 10 ms
+    resolution three levels reach about 44 minutes. When the lower level
+    wraps around, the next slot of the level above is cascaded down.
+    Scheduling and cancelling are O(1), and a single task drives the wheel
+    however many timers are pending; it stops while the wheel is empty.
+
+    Callbacks may be plain functions or coroutine functions. Coroutines are
+    awaited in order on the driver task, so a callback must not wait on
+    anything slow.
+    """
+
+    def __init__(self, resolution=0.01):
+        self.resolution = resolution
+        self.levels = [[[] for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.current = 0   # Last tick processed
+        self.started = None  # Loop time of tick 0
+        self.pending = 0
+        self.task = None
+        self.fired = 0
+        self.cancelled = 0
+        self.cascaded = 0
+
+    def schedule(self, delay, callback, *args):
+        """
+        Run callback(*args) `delay` seconds from now, rounded up to a tick.
+        Returns a Timer whose cancel() drops it.
+        """
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done():
+            # Keep tick numbers monotonic across idle periods
+            self.started = loop.time() - self.current * self.resolution
+            self.task = loop.create_task(self.run())
+        expires = math.ceil((loop.time() - self.started + delay) / self.resolution)
+        timer = Timer(max(expires, self.current + 1), callback, args, self)
+        self._insert(timer)
+        self.pending += 1
+        return timer
+
+    def _cancel(self):
+        # The timer stays in its slot and is dropped when it is reached
+        self.pending -= 1
+        self.cancelled += 1
+        if not self.pending:
+            # Only cancelled timers are left: drop them, and the driver
+            # stops at its next tick
+            self.levels = [[[] for _ in range(SLOTS)] for _ in range(LEVELS)]
+
+    def _insert(self, timer):
+        delta = timer.expires - self.current
+        for level in range(LEVELS):
+            if delta < 1 << (SLOT_BITS * (level + 1)):
+                slot = (timer.expires >> (SLOT_BITS * level)) & SLOT_MASK
+                self.levels[level][slot].append(timer)
+                return
+        # Further out than the wheel reaches: park it in the top level's
+        # last slot; it is re-inserted each time that slot cascades
+        level = LEVELS - 1
+        slot = ((self.current >> (SLOT_BITS * level)) - 1) & SLOT_MASK
+        self.levels[level][slot].append(timer)
+
+    def _cascade(self, level):
+        slot = (self.current >> (SLOT_BITS * level)) & SLOT_MASK
+        timers = self.levels[level][slot]
+        self.levels[level][slot] = []
+        for timer in timers:
+            if not timer.cancelled:
+                self.cascaded += 1
+                self._insert(timer)
+        return slot
+
+    def _expired(self):
+        """
+        Advance `current` by one tick and return the timers due at it.
+        """
+        self.current += 1
+        level = 0
+        # Slot 0 of a level means the level below wrapped around
+        while level + 1 < LEVELS and (self.current >> (SLOT_BITS * level)) & SLOT_MASK == 0:
+            level += 1
+            if self._cascade(level) != 0:
+                break
+        slot = self.current & SLOT_MASK
+        timers = self.levels[0][slot]
+        self.levels[0][slot] = []
+        due = []
+        for timer in timers:
+            if timer.cancelled:
+                continue  # Already taken off `pending`
+            if timer.expires > self.current:
+                # Not due on this turn of the wheel
+                self._insert(timer)
+                continue
+            self.pending -= 1
+            timer.wheel = None
+            due.append(timer)
+        return due
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            target = int((loop.time() - self.started) / self.resolution)
+            while self.current < target and self.pending:
+                for timer in self._expired():
+                    if timer.cancelled:
+                        continue  # By a callback that ran before it
+                    self.fired += 1
+                    try:
+                        result = timer.callback(*timer.args)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as e:
+                        print("Error in timer callback:", str(e))
+            if not self.pending:
+                break
+            next_tick = self.started + (self.current + 1) * self.resolution
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+    def get_stats(self):
+        return {
+            "resolution_ms": self.resolution * 1000,
+            "pending": self.pending,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "cascaded": self.cascaded,
+        }
@@ -1,13 +1,69 @@
+import asyncio
+import contextvars
+import json
 import re
-import itertools
-import threading
 import time
 import uuid
+from django.conf import settings
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from chat.utils import send_server_announcement
+from .brackets import FORMATS
+from .sharding import HOME_SHARD, shard_index
+from .shard_link import ShardLink
+
+# Subscribers of ws/tournament/, told when tournaments open, start or close
+TOURNAMENT_LIST_GROUP = "tournament_updates"
+
+
+def tournament_group(tournament_id):
+    # Subscribers of ws/tournament/<id>/
+    return f"tournament_{tournament_id}"
+
+
+class TournamentSnapshot:
+    """
+    One published version of a tournament. Immutable once built: the
+    JSON is encoded once and shared by every REST response and broadcast
+    of this version, and the parsed dict, built on first use, is shared
+    by every reader, which must not modify it.
+    """
+    __slots__ = ("version", "text", "etag", "_data")
+
+    def __init__(self, tournament_id, version, text):
+        self.version = version
+        self.text = text
+        self.etag = f'"tournament-{tournament_id}-{version}"'
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.text)
+        return self._data
+
 
 class TournamentManager:
+    """
+    Registry of tournaments, run as an asyncio actor.
+
+    All tournament state belongs to one task on the server's event loop.
+    Every change is a command on `commands` that this task applies one at
+    a time, so there is no lock and the loop never waits on one. Request
+    threads submit commands through async_to_sync and wait only for their
+    own command; coroutines await call(). Code already on the loop may
+    read the state directly (find_match_by_game_id); request threads get
+    copies.
+
+    Commands do no I/O. Their announcements and broadcasts go on `outbox`,
+    serialized at the moment of the change, and a second task sends them
+    in order while the actor moves on.
+
+    After every change the actor publishes the tournament as a new
+    TournamentSnapshot. Readers on any thread take the current snapshot
+    without asking the actor, so polling an unchanged tournament costs a
+    dict lookup and, with If-None-Match, an empty 304.
+    """
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -23,261 +79,524 @@ class TournamentManager:
 
     def __init__(self):
         if not hasattr(self, "initialized"):
-            self.tournament = None
-            self.timer_thread = None
-            self.lock = threading.Lock()
+            # Registry of open tournaments: id -> tournament dict
+            self.tournaments = {}
+            # Sign-up deadline timers on the server's event loop, by id
+            self.signup_timers = {}
+            # Bracket of each started tournament, by id
+            self.brackets = {}
+            # Lookups kept up to date alongside the tournament dicts, so
+            # nothing has to scan the registry or a match list
+            self.organizers = {}       # organizer -> tournament id
+            self.match_index = {}      # tournament id -> {match id: match}
+            self.player_matches = {}   # tournament id -> {username: [match]}
+            self.name_owners = {}      # tournament id -> {display name: username}
+            self.game_index = {}       # game_id -> (tournament, match)
+            # Published state: id -> TournamentSnapshot, and the listing
+            self.snapshots = {}
+            self.list_snapshot = None  # (etag, text, summaries); None when stale
+            self.version = 0
+            self.commands = None  # (command, args, future or None)
+            self.outbox = None    # (group or None for an announcement, event)
+            self.actor = None
+            self.sender = None
             self.initialized = True
 
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self.actor and not self.actor.done() and self.actor.get_loop() is loop:
+            return
+        self.commands = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        # Fresh contexts: the caller's may be a request thread's
+        # async_to_sync call, which is gone once the request ends. A task
+        # copies the context it is created in (create_task's context=
+        # argument needs Python 3.11; the image runs 3.10)
+        self.actor = contextvars.Context().run(loop.create_task, self._run())
+        self.sender = contextvars.Context().run(loop.create_task, self._send())
+        # Other shards call join_match / finish_match through the link
+        ShardLink.get_instance().ensure_running()
+
+    async def call(self, command, *args):
+        """
+        Run command(*args) on the actor and return its result.
+        """
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self.commands.put_nowait((command, args, future))
+        return await future
+
+    def _call_sync(self, command, *args):
+        # From a request thread: async_to_sync runs call() on the server's loop
+        return async_to_sync(self.call)(command, *args)
+
+    def _post(self, command, *args):
+        # From the loop, for commands nobody waits on (timers)
+        self.commands.put_nowait((command, args, None))
+
+    async def _run(self):
+        while True:
+            command, args, future = await self.commands.get()
+            try:
+                result = command(*args)
+            except Exception as e:
+                print("Error in tournament command:", str(e))
+                if future and not future.done():
+                    future.set_exception(e)
+                continue
+            if future and not future.done():
+                future.set_result(result)
+
+    async def _send(self):
+        channel_layer = get_channel_layer()
+        while True:
+            group, event = await self.outbox.get()
+            try:
+                if group is None:
+                    await send_server_announcement(event)
+                elif channel_layer:
+                    await channel_layer.group_send(group, event)
+            except Exception as e:
+                print("Error sending tournament update:", str(e))
+
+    def _announce(self, text):
+        self.outbox.put_nowait((None, text))
+
+    def _publish(self, tournament_id):
+        """
+        Freeze the tournament's current state as a new snapshot, after a
+        command changed it, and send it to its subscribers.
+        """
+        tournament = self.tournaments.get(tournament_id)
+        # Bumped on removals too: the listing's ETag is built from it
+        self.version += 1
+        if tournament:
+            self.snapshots[tournament_id] = TournamentSnapshot(
+                tournament_id, self.version, json.dumps(tournament)
+            )
+        else:
+            self.snapshots.pop(tournament_id, None)
+        self.list_snapshot = None
+        self._broadcast(tournament_id)
+
+    def _broadcast(self, tournament_id):
+        self.outbox.put_nowait((tournament_group(tournament_id), self._update_event(tournament_id)))
+
+    def _broadcast_list(self):
+        # Registry subscribers only hear about tournaments opening, starting,
+        # finishing and closing, not every sign-in
+        summaries = self._list_snapshot()[2]
+        self.outbox.put_nowait((TOURNAMENT_LIST_GROUP, {
+            "type": "tournament_update",
+            "text": json.dumps({"type": "tournamentList", "tournaments": summaries}),
+        }))
+
     def _generate_game_id(self) -> str:
-        return f"game_{uuid.uuid4().hex[:12]}"
-
-    def create_tournament(self, organizer):
-        with self.lock:
-            if self.tournament:
-                return {"error": "Tournament already exists"}
-            self.tournament = {
-                "organizer": organizer,
-                "players": [],       # just storing usernames for logic
-                "display_names": {}, # { username: "CustomDisplayName" }
-                "timer": 30,
-                "is_started": False,
-                "matches": [],
-                "final_result": None,
-            }
-            async_to_sync(self._broadcast_update_async)()
-            self._start_timer_in_thread()
-        return self.tournament
+        # Any shard may host the game; it reaches this one through ShardLink
+        while True:
+            game_id = f"game_{uuid.uuid4().hex[:12]}"
+            if game_id not in self.game_index:
+                return game_id
+
+    def _generate_tournament_id(self) -> str:
+        while True:
+            tournament_id = uuid.uuid4().hex[:8]
+            if tournament_id not in self.tournaments:
+                return tournament_id
+
+    def create_tournament(self, organizer, bracket="round_robin", rounds=None):
+        if bracket not in FORMATS:
+            return {"error": f"Format must be one of: {', '.join(FORMATS)}"}
+        return self._call_sync(self._create, organizer, bracket, rounds)
+
+    def _create(self, organizer, bracket, rounds):
+        signup_seconds = getattr(settings, "PONG_TOURNAMENT_SIGNUP_SECONDS", 30)
+        # Several tournaments may run at once, one per organizer
+        if organizer in self.organizers:
+            return {"error": "You already organize an open tournament"}
+        tournament = {
+            "id": self._generate_tournament_id(),
+            "organizer": organizer,
+            "players": [],       # just storing usernames for logic
+            "display_names": {}, # { username: "CustomDisplayName" }
+            # Unix time sign-up closes; clients count down to it locally
+            "deadline": time.time() + signup_seconds,
+            "is_started": False,
+            "format": bracket,
+            # Swiss only; the other formats work out their own length
+            "rounds": rounds,
+            "round": None,
+            "matches": [],
+            "byes": [],
+            "standings": [],
+            "final_result": None,
+        }
+        tournament_id = tournament["id"]
+        self.tournaments[tournament_id] = tournament
+        self.organizers[organizer] = tournament_id
+        self.match_index[tournament_id] = {}
+        self.player_matches[tournament_id] = {}
+        self.name_owners[tournament_id] = {}
+        self.signup_timers[tournament_id] = asyncio.get_running_loop().call_later(
+            signup_seconds, self._post, self._close_signup, tournament_id
+        )
+        self._announce(f"You can now sign-up for {organizer}'s tournament!")
+        self._publish(tournament_id)
+        self._broadcast_list()
+        return self.snapshots[tournament_id].data
 
-    def sign_in_player(self, username, display_name):
+    def sign_in_player(self, tournament_id, username, display_name):
         # Validate display_name
         if len(display_name) > 12 or not re.match(r'^[a-zA-Z0-9]*$', display_name):
             return {"error": "Display name must be alphanumeric and up to 12 characters."}
+        return self._call_sync(self._sign_in, tournament_id, username, display_name)
 
-        with self.lock:
-            if not self.tournament:
-                return {"error": "No active tournament"}
+    def _sign_in(self, tournament_id, username, display_name):
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            return {"error": "Tournament not found"}
+        if tournament["is_started"]:
+            return {"error": "Tournament already started"}
 
-            if username in self.tournament["players"]:
-                return {"error": "You are already signed in."}
+        if username in tournament["display_names"]:
+            return {"error": "You are already signed in."}
 
-            # Enforce display_name uniqueness
-            if display_name in self.tournament["display_names"].values():
-                return {"error": "That display name is already taken."}
+        # Enforce display_name uniqueness
+        name_owners = self.name_owners[tournament_id]
+        if display_name in name_owners:
+            return {"error": "That display name is already taken."}
 
-            self.tournament["players"].append(username)
-            self.tournament["display_names"][username] = display_name
+        tournament["players"].append(username)
+        tournament["display_names"][username] = display_name
+        name_owners[display_name] = username
 
-            async_to_sync(self._broadcast_update_async)()
-        return self.tournament
+        self._publish(tournament_id)
+        return self.snapshots[tournament_id].data
 
-    def unsign_player(self, username):
-        with self.lock:
-            if not self.tournament:
-                return {"error": "No active tournament"}
-            if username not in self.tournament["players"]:
-                return {"error": "Player not signed in"}
+    def unsign_player(self, tournament_id, username):
+        return self._call_sync(self._unsign, tournament_id, username)
 
-            # Remove the player from the tournament
-            self.tournament["players"].remove(username)
-            
-            # Remove the associated display name
-            if username in self.tournament["display_names"]:
-                del self.tournament["display_names"][username]
+    def _unsign(self, tournament_id, username):
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            return {"error": "Tournament not found"}
+        if username not in tournament["display_names"]:
+            return {"error": "Player not signed in"}
 
-            async_to_sync(self._broadcast_update_async)()
-        return self.tournament
+        # Remove the player from the tournament
+        tournament["players"].remove(username)
 
-    def _start_timer_in_thread(self):
-        def countdown():
-            async_to_sync(send_server_announcement)(
-                "You can now sign-up for a tournament!"
-            )
-            while True:
-                time.sleep(1)
-                with self.lock:
-                    if not self.tournament:
-                        break
-                    self.tournament["timer"] -= 1
-                    async_to_sync(self._broadcast_update_async)()
-                    if self.tournament["timer"] <= 0:
-                        if len(self.tournament["players"]) < 2:
-                            self.tournament = None
-                            async_to_sync(send_server_announcement)(
-                                "Tournament canceled due to insufficient players."
-                            )
-                        else:
-                            self._start_tournament_locked()
-                        async_to_sync(self._broadcast_update_async)()
-                        break
-
-        self.timer_thread = threading.Thread(target=countdown, daemon=True)
-        self.timer_thread.start()
-
-
-    def _start_tournament_locked(self):
-        self.tournament["is_started"] = True
-        players = self.tournament["players"]
-        matches = []
-        for i, pair in enumerate(itertools.combinations(players, 2)):
-            matches.append({
-                "id": i,
-                "players": list(pair),
-                "winner": None,
-                "in_progress": False,
-                "connected_count": 0,
-            })
-        self.tournament["matches"] = matches
+        # Remove the associated display name
+        display_name = tournament["display_names"].pop(username)
+        self.name_owners[tournament_id].pop(display_name, None)
+
+        self._publish(tournament_id)
+        return self.snapshots[tournament_id].data
+
+    def _close_signup(self, tournament_id):
+        """
+        Sign-up deadline reached: start the tournament, or cancel it with
+        fewer than two players. Nothing is sent before that; clients count
+        down to the deadline themselves.
+        """
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            return  # Closed by the organizer meanwhile
+        self.signup_timers.pop(tournament_id, None)
+        if len(tournament["players"]) < 2:
+            self._drop_tournament(tournament_id)
+            self._announce("Tournament canceled due to insufficient players.")
+        else:
+            self._start_tournament(tournament)
+        self._publish(tournament_id)
+        self._broadcast_list()
+
+    def _start_tournament(self, tournament):
+        tournament["is_started"] = True
+        players = tournament["players"]
+        bracket = FORMATS[tournament["format"]](players, tournament["rounds"])
+        self.brackets[tournament["id"]] = bracket
+        tournament["rounds"] = bracket.rounds
+        tournament["standings"] = bracket.standings()
 
-        # Announce tournament start
         player_display_names = [
-            self.tournament["display_names"].get(player, player) for player in players
+            tournament["display_names"].get(player, player) for player in players
         ]
-        async_to_sync(send_server_announcement)(
-            f"Tournament has started! Participants: {', '.join(player_display_names)}"
+        self._announce(f"Tournament has started! Participants: {', '.join(player_display_names)}")
+        self._start_round(tournament)
+
+    def _start_round(self, tournament):
+        """
+        Pair the bracket's next round and give every match its game, so the
+        whole round plays at once.
+        """
+        bracket = self.brackets[tournament["id"]]
+        pairs, byes = bracket.pair_round()
+        tournament["round"] = bracket.round
+        tournament["byes"] = byes
+        tournament["standings"] = bracket.standings()
+        names = tournament["display_names"]
+        pairings = []
+        for player1, player2 in pairs:
+            match = {
+                "id": len(tournament["matches"]),
+                "round": bracket.round,
+                "players": [player1, player2],
+                "winner": None,
+                "in_progress": False,
+                "connected_count": 0,
+                "game_id": self._generate_game_id(),
+            }
+            tournament["matches"].append(match)
+            self._index_match(tournament, match)
+            pairings.append(f"{names.get(player1, player1)} vs {names.get(player2, player2)}")
+        of_rounds = f" of {bracket.rounds}" if bracket.rounds else ""
+        announcement = f"Round {bracket.round + 1}{of_rounds}: {', '.join(pairings)}"
+        if byes:
+            announcement += f" (bye: {', '.join(names.get(p, p) for p in byes)})"
+        self._announce(announcement)
+
+    def _index_match(self, tournament, match):
+        tournament_id = tournament["id"]
+        self.match_index[tournament_id][match["id"]] = match
+        player_matches = self.player_matches[tournament_id]
+        for player in match["players"]:
+            player_matches.setdefault(player, []).append(match)
+        self.game_index[match["game_id"]] = (tournament, match)
+
+    def _drop_tournament(self, tournament_id):
+        """
+        Remove a tournament and everything indexed under it. Returns it,
+        or None if it was not open.
+        """
+        tournament = self.tournaments.pop(tournament_id, None)
+        if not tournament:
+            return None
+        self.brackets.pop(tournament_id, None)
+        self.organizers.pop(tournament["organizer"], None)
+        self.name_owners.pop(tournament_id, None)
+        self.player_matches.pop(tournament_id, None)
+        for match in self.match_index.pop(tournament_id, {}).values():
+            self.game_index.pop(match["game_id"], None)
+        timer = self.signup_timers.pop(tournament_id, None)
+        if timer:
+            timer.cancel()
+        return tournament
+
+    def _round_completed(self, tournament):
+        return all(
+            m["winner"] is not None
+            for m in tournament["matches"]
+            if m["round"] == tournament["round"]
         )
 
-    def get_tournament(self):
-        with self.lock:
-            return self.tournament
+    def get_snapshot(self, tournament_id):
+        """
+        The tournament's latest TournamentSnapshot, or None. Safe from any
+        thread; does not wait for the actor.
+        """
+        return self.snapshots.get(tournament_id)
 
-    def assign_game_to_match(self, match_id):
-        with self.lock:
-            if not self.tournament:
-                return {"error": "No active tournament"}
-            match = next((m for m in self.tournament["matches"] if m["id"] == match_id), None)
-            if not match:
-                return {"error": "Match not found"}
-            if "game_id" in match:
-                return {"error": "Match already has an assigned game"}
+    def get_tournament(self, tournament_id):
+        # Shared with every other reader of this version; do not modify
+        snapshot = self.snapshots.get(tournament_id)
+        return snapshot.data if snapshot else None
 
-            match["game_id"] = self._generate_game_id()
+    def get_list_snapshot(self):
+        """
+        (etag, JSON text, summaries) of the tournament listing. Rebuilt by
+        the actor only after a tournament changed.
+        """
+        return self.list_snapshot or self._call_sync(self._list_snapshot)
 
-            # Announce match start
-            player1 = self.tournament["display_names"].get(match["players"][0], match["players"][0])
-            player2 = self.tournament["display_names"].get(match["players"][1], match["players"][1])
-            async_to_sync(send_server_announcement)(f"Match about to start: {player1} vs {player2}")
+    def list_tournaments(self):
+        return self.get_list_snapshot()[2]
 
-            async_to_sync(self._broadcast_update_async)()
-            return match
+    def _list_snapshot(self):
+        if self.list_snapshot is None:
+            summaries = [self._summary(t) for t in self.tournaments.values()]
+            self.list_snapshot = (
+                f'"tournaments-{self.version}"', json.dumps(summaries), summaries
+            )
+        return self.list_snapshot
+
+    def _summary(self, tournament):
+        return {
+            "id": tournament["id"],
+            "organizer": tournament["organizer"],
+            "players_count": len(tournament["players"]),
+            "deadline": tournament["deadline"],
+            "is_started": tournament["is_started"],
+            "format": tournament["format"],
+            "is_finished": tournament["final_result"] is not None,
+        }
+
+    def find_match_by_game_id(self, game_id):
+        """
+        (tournament, match) playing `game_id`, or (None, None). Reads the
+        live state, so only call it from the event loop.
+        """
+        return self.game_index.get(game_id, (None, None))
 
-    def _all_matches_completed(self):
-        if not self.tournament or not self.tournament.get("matches"):
-            return False
-        for m in self.tournament["matches"]:
-            if m["winner"] is None:
-                return False
-        return True
-
-    def _compute_final_result(self):
-        win_count = {}
-        for m in self.tournament["matches"]:
-            w = m["winner"]
-            if w:
-                win_count[w] = win_count.get(w, 0) + 1
-
-        if not win_count:
-            return None
+    def get_match(self, tournament_id, match_id):
+        return self._call_sync(self._get_match, tournament_id, match_id)
 
-        max_wins = max(win_count.values())
-        winners = [p for p, cnt in win_count.items() if cnt == max_wins]
+    def _get_match(self, tournament_id, match_id):
+        match = self.match_index.get(tournament_id, {}).get(match_id)
+        return dict(match) if match else None
 
-        if len(winners) == 1:
-            return {"type": "winner", "usernames": winners}
-        else:
-            return {"type": "draw", "usernames": winners}
-
-    def close_tournament(self):
-        with self.lock:
-            if self.tournament:
-                async_to_sync(send_server_announcement)("Tournament has been closed by the organizer.")
-            self.tournament = None
-            async_to_sync(self._broadcast_update_async)()
+    def get_player_match(self, tournament_id, username):
+        """
+        The match `username` has to play in the current round, or None.
+        """
+        return self._call_sync(self._get_player_match, tournament_id, username)
+
+    def _get_player_match(self, tournament_id, username):
+        tournament = self.tournaments.get(tournament_id)
+        matches = self.player_matches.get(tournament_id, {}).get(username)
+        if not tournament or not matches:
+            return None
+        match = matches[-1]
+        if match["round"] != tournament["round"] or match["winner"] is not None:
+            return None
+        return dict(match)
+
+    def assign_game_to_match(self, tournament_id, match_id):
+        return self._call_sync(self._assign_game, tournament_id, match_id)
+
+    def _assign_game(self, tournament_id, match_id):
+        if tournament_id not in self.tournaments:
+            return {"error": "Tournament not found"}
+        match = self.match_index[tournament_id].get(match_id)
+        if not match:
+            return {"error": "Match not found"}
+        # Games are handed out a round at once when the round starts
+        if "game_id" not in match:
+            return {"error": "This match's round has not started yet"}
+        return dict(match)
+
+    def close_tournament(self, tournament_id):
+        return self._call_sync(self._close, tournament_id)
+
+    def _close(self, tournament_id):
+        if self._drop_tournament(tournament_id):
+            self._announce("Tournament has been closed by the organizer.")
+        self._publish(tournament_id)
+        self._broadcast_list()
         return {"message": "Tournament closed"}
 
     def send_server_announcement_sync(message):
         async_to_sync(send_server_announcement)(message)
 
-    async def update_match_result_by_game_id_async(self, game_id, winner):
+    async def join_match_async(self, game_id):
         """
-        Updates the match result for a given game_id and announces it to all players.
+        A player of `game_id` connected: mark its match in progress. Returns
+        the tournament, or None if the game is not a tournament match.
+        On a shard other than the home shard the tournament is a copy.
         """
-        announcements = []
-        with self.lock:
-            if not self.tournament:
-                return {"error": "No active tournament"}
+        if shard_index() != HOME_SHARD:
+            return await ShardLink.get_instance().call_home("join_match", game_id)
+        return await self.call(self._join_match, game_id)
 
-            match = next((m for m in self.tournament["matches"] if m.get("game_id") == game_id), None)
-            if not match:
-                return {"error": "Match not found for game_id"}
-
-            match["winner"] = winner
-
-            # Collect announcement about the match result
-            player1 = self.tournament["display_names"].get(match["players"][0], match["players"][0])
-            player2 = self.tournament["display_names"].get(match["players"][1], match["players"][1])
-            winner_display = self.tournament["display_names"].get(winner, winner)
+    def _join_match(self, game_id):
+        tournament, match = self.game_index.get(game_id, (None, None))
+        if not match:
+            return None
+        match["in_progress"] = True
+        match["connected_count"] = match.get("connected_count", 0) + 1
+        self._publish(tournament["id"])
+        return tournament
 
-            announcements.append(
-                f"Match over: {player1} vs {player2}. Winner: {winner_display}!"
+    async def finish_match_async(self, game_id, winner):
+        """
+        `game_id` is over: record `winner` unless its match already has a
+        result. Returns whether the game is a tournament match.
+        On a shard other than the home shard this waits until the home
+        shard answers; a result it never saw would be lost.
+        """
+        if shard_index() != HOME_SHARD:
+            # Safe to repeat: a match that has a winner keeps it
+            result = await ShardLink.get_instance().call_home(
+                "finish_match", game_id, winner, retry=True
             )
+            return bool(result)
+        return await self.call(self._finish_match, game_id, winner)
 
-            # If all matches are completed, compute final results and collect relevant announcements
-            if self._all_matches_completed():
-                final_result = self._compute_final_result()
-                self.tournament["final_result"] = final_result
-
-                if final_result and final_result["type"] == "winner":
-                    winners = [
-                        self.tournament["display_names"].get(user, user)
-                        for user in final_result["usernames"]
-                    ]
-                    announcements.append(
-                        f"Tournament finished! Winner(s): {', '.join(winners)}"
-                    )
-                elif final_result and final_result["type"] == "draw":
-                    draw_players = [
-                        self.tournament["display_names"].get(user, user)
-                        for user in final_result["usernames"]
-                    ]
-                    announcements.append(
-                        f"Tournament finished in a draw! Drawn players: {', '.join(draw_players)}"
-                    )
-
-        # --------------------------
-        # Now we're outside the lock
-        # --------------------------
-
-        # Actually send the announcements (await the async call)
-        for ann in announcements:
-            print(ann)
-            await send_server_announcement(ann)
-
-        # Broadcast the updated tournament state
-        await self._broadcast_update_async()
-        return {"success": True, "match": match}
+    def _finish_match(self, game_id, winner):
+        _, match = self.game_index.get(game_id, (None, None))
+        if not match:
+            return False
+        if match["winner"] is not None:
+            return True
+        return not self._record_result(game_id, winner).get("error")
 
-    async def _broadcast_update_async(self):
-        channel_layer = get_channel_layer()
-        await channel_layer.group_send(
-            "tournament_updates",
-            {
-                "type": "tournament_update",
-                "message": self.tournament or {},
-            },
-        )
+    async def update_match_result_by_game_id_async(self, game_id, winner):
+        """
+        Updates the match result for a given game_id and announces it to all players.
+        """
+        return await self.call(self._record_result, game_id, winner)
+
+    def _record_result(self, game_id, winner):
+        tournament, match = self.game_index.get(game_id, (None, None))
+        if not match:
+            return {"error": "Match not found for game_id"}
+        if match["winner"] is not None:
+            return {"error": "Match already has a result"}
+        match["winner"] = winner
+        bracket = self.brackets[tournament["id"]]
+        bracket.record(match["players"], winner)
+        tournament["standings"] = bracket.standings()
+
+        # Announce the match result
+        player1 = tournament["display_names"].get(match["players"][0], match["players"][0])
+        player2 = tournament["display_names"].get(match["players"][1], match["players"][1])
+        winner_display = tournament["display_names"].get(winner, winner)
+        self._announce(f"Match over: {player1} vs {player2}. Winner: {winner_display}!")
+
+        # Once the round is over, the bracket either pairs the next one
+        # or has its final result
+        round_over = self._round_completed(tournament)
+        if round_over and not bracket.finished:
+            self._start_round(tournament)
+        elif round_over:
+            final_result = bracket.final_result()
+            tournament["final_result"] = final_result
+
+            if final_result and final_result["type"] == "winner":
+                winners = [
+                    tournament["display_names"].get(user, user)
+                    for user in final_result["usernames"]
+                ]
+                self._announce(f"Tournament finished! Winner(s): {', '.join(winners)}")
+            elif final_result and final_result["type"] == "draw":
+                draw_players = [
+                    tournament["display_names"].get(user, user)
+                    for user in final_result["usernames"]
+                ]
+                self._announce(
+                    f"Tournament finished in a draw! Drawn players: {', '.join(draw_players)}"
+                )
 
-    async def broadcast_update_async(self):
+        # Broadcast the updated tournament state
+        self._publish(tournament["id"])
+        if tournament["final_result"]:
+            self._broadcast_list()
+        return {"success": True, "match": dict(match)}
+
+    def _update_event(self, tournament_id):
+        # Every subscriber forwards the same string, the snapshot's JSON with
+        # server_time appended so clients can correct their clock for the
+        # deadline; nothing is encoded again.
+        snapshot = self.snapshots.get(tournament_id)
+        text = f'{snapshot.text[:-1]}, "server_time": {time.time()}}}' if snapshot else "{}"
+        return {
+            "type": "tournament_update",
+            "text": text,
+        }
+
+    async def broadcast_update_async(self, tournament_id):
         """
         Send the updated tournament state asynchronously.
         This avoids using async_to_sync in an already-async context.
         """
-        channel_layer = get_channel_layer()
-        if not channel_layer:
-            return
-        await channel_layer.group_send(
-            "tournament_updates",
-            {
-                "type": "tournament_update",
-                "message": self.tournament or {},
-            },
-        )
+        await self.call(self._broadcast, tournament_id)
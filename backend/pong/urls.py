@@ -3,11 +3,18 @@ from . import views
 
 urlpatterns = [
     path('api/lobbies', views.list_lobbies, name='list_lobbies'),
-    path('api/tournament/', views.get_tournament, name='get_tournament'),
-    path('api/tournament/create/', views.create_tournament, name='create_tournament'),
-    path('api/tournament/sign-in/', views.sign_in_to_tournament, name='sign_in_to_tournament'),
-    path("api/match/play/", views.play_match, name="play_match"),
+    path('api/lobbies/stats', views.lobby_stats, name='lobby_stats'),
+    path('api/game-loop/stats', views.game_loop_stats, name='game_loop_stats'),
+    path('api/matchmaking/stats', views.matchmaking_stats, name='matchmaking_stats'),
+    path('api/phases/stats', views.phase_stats, name='phase_stats'),
+    path('api/game-over/stats', views.game_over_stats, name='game_over_stats'),
+    path('api/match-results/stats', views.match_results_stats, name='match_results_stats'),
+    path('api/tournaments/', views.list_tournaments, name='list_tournaments'),
+    path('api/tournaments/create/', views.create_tournament, name='create_tournament'),
+    path('api/tournaments/<str:tournament_id>/', views.get_tournament, name='get_tournament'),
+    path('api/tournaments/<str:tournament_id>/sign-in/', views.sign_in_to_tournament, name='sign_in_to_tournament'),
+    path('api/tournaments/<str:tournament_id>/match/play/', views.play_match, name='play_match'),
+    path('api/tournaments/<str:tournament_id>/assign-game/', views.assign_game, name='assign_game'),
+    path('api/tournaments/<str:tournament_id>/close/', views.close_tournament, name='close_tournament'),
     path('api/user/me/', views.get_username, name='get_username'),
-    path('api/assign-game/', views.assign_game, name='assign_game'),
-    path('api/tournament/close/', views.close_tournament, name='close_tournament'),
 ]
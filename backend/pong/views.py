@@ -1,25 +1,52 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from .consumers import GameManager
+from .match_results import MatchResultWriter
+from .lobby_index import KINDS
+from .shard_link import ShardLink
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .tournament_manager import TournamentManager
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+def snapshot_response(request, etag, text):
+    # The body is JSON encoded once per version; an unchanged poll gets a 304
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(text, content_type="application/json")
+    response["ETag"] = etag
+    # Let browsers keep the body but revalidate on every poll
+    response["Cache-Control"] = "no-cache"
+    return response
+
 @api_view(['GET'])
-def get_tournament(request):
+def list_tournaments(request):
     manager = TournamentManager.get_instance()
-    tournament = manager.get_tournament()
-    if not tournament:
-        return Response({"message": "No active tournament"}, status=404)
-    return Response(tournament)
+    etag, text, _ = manager.get_list_snapshot()
+    return snapshot_response(request, etag, text)
+
+@api_view(['GET'])
+def get_tournament(request, tournament_id):
+    manager = TournamentManager.get_instance()
+    snapshot = manager.get_snapshot(tournament_id)
+    if not snapshot:
+        return Response({"message": "Tournament not found"}, status=404)
+    return snapshot_response(request, snapshot.etag, snapshot.text)
 
 @api_view(['POST'])
 def create_tournament(request):
     organizer = request.user.username
     manager = TournamentManager.get_instance()
+    bracket = request.data.get("format", "round_robin")
+    rounds = request.data.get("rounds")
+    # bool is an int subclass, so true/false would pass for 1/0
+    if rounds is not None and (
+        isinstance(rounds, bool) or not isinstance(rounds, int) or rounds < 1
+    ):
+        return Response({"message": "rounds must be a positive integer"}, status=400)
     try:
-        result = manager.create_tournament(organizer)
+        result = manager.create_tournament(organizer, bracket, rounds)
         if "error" in result:
             return Response({"message": result["error"]}, status=400)   
     except Exception as e:
@@ -28,23 +55,23 @@ def create_tournament(request):
     return Response(result)
 
 @api_view(['POST'])
-def sign_in_to_tournament(request):
+def sign_in_to_tournament(request, tournament_id):
     username = request.user.username
     manager = TournamentManager.get_instance()
-    tournament = manager.get_tournament()
+    tournament = manager.get_tournament(tournament_id)
 
     if not tournament:
-        return Response({"message": "No active tournament"}, status=404)
+        return Response({"message": "Tournament not found"}, status=404)
 
     display_name = request.data.get("display_name", "")
 
     try:
-        if username in tournament.get("players", []):
-            result = manager.unsign_player(username)
+        if username in tournament.get("display_names", {}):
+            result = manager.unsign_player(tournament_id, username)
         else:
             if not display_name.strip():
                 return Response({"message": "Missing or empty display_name."}, status=400)
-            result = manager.sign_in_player(username, display_name)
+            result = manager.sign_in_player(tournament_id, username, display_name)
     except Exception as e:
         print("Error toggling sign-in:", str(e))
         return Response({"message": "Error toggling sign-in"}, status=500)
@@ -53,40 +80,99 @@ def sign_in_to_tournament(request):
         return Response({"message": result["error"]}, status=400)
     return Response(result)
 
-def list_lobbies(request):
+async def list_lobbies(request):
+    """
+    ?cursor=<next from the previous page>&limit=<1-200>&open=1&kind=casual|tournament
+
+    Async so it runs on the event loop, which owns the index; a request
+    thread could walk it while the loop changes it.
+    """
+    index = GameManager.get_instance().lobbies
+    # The other shards send their lobbies once this one listens
+    ShardLink.get_instance().ensure_running()
+    try:
+        cursor = int(request.GET.get("cursor", 0))
+        limit = min(200, max(1, int(request.GET.get("limit", 50))))
+    except ValueError:
+        return JsonResponse({"message": "cursor and limit must be integers"}, status=400)
+    kind = request.GET.get("kind") or None
+    if kind and kind not in KINDS:
+        return JsonResponse({"message": "kind must be casual or tournament"}, status=400)
+    open_only = request.GET.get("open") == "1"
+
+    etag = index.etag
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(
+            index.page(cursor, limit, open_only, kind), content_type="application/json"
+        )
+    response["ETag"] = etag
+    # Let browsers keep the body but revalidate on every poll
+    response["Cache-Control"] = "no-cache"
+    return response
+
+def game_loop_stats(request):
     gm = GameManager.get_instance()
-    lobbies = []
-    for game_id, game in gm.games.items():
-        lobbies.append({
-            "game_id": game_id,
-            "players_count": len(game.players),
-            "players": game.players
-        })
-    return JsonResponse(lobbies, safe=False)
+    stats = gm.game_loop.get_stats()
+    channel_layer = get_channel_layer()
+    if hasattr(channel_layer, "get_stats"):
+        stats["channel_layer"] = channel_layer.get_stats()
+    return JsonResponse(stats)
+
+def matchmaking_stats(request):
+    gm = GameManager.get_instance()
+    stats = gm.matchmaking.get_stats()
+    if gm.shards:
+        stats["sharded"] = gm.shards.get_stats()
+    return JsonResponse(stats)
+
+def lobby_stats(request):
+    gm = GameManager.get_instance()
+    stats = gm.lifecycle.get_stats()
+    stats["index"] = gm.lobbies.get_stats()
+    stats["shard_link"] = ShardLink.get_instance().get_stats()
+    return JsonResponse(stats)
+
+def phase_stats(request):
+    gm = GameManager.get_instance()
+    return JsonResponse(gm.phases.get_stats())
+
+def game_over_stats(request):
+    gm = GameManager.get_instance()
+    return JsonResponse(gm.finalizer.get_stats())
+
+def match_results_stats(request):
+    return JsonResponse(MatchResultWriter.get_instance().get_stats())
 
 @api_view(['POST'])
-def play_match(request):
+def play_match(request, tournament_id):
     username = request.user.username
     match_id = request.data.get("match_id")
 
     manager = TournamentManager.get_instance()
-    tournament = manager.get_tournament()
+    tournament = manager.get_tournament(tournament_id)
 
     if not tournament or not tournament.get("is_started"):
         return Response({"error": "Tournament not started"}, status=400)
 
-    match = next((m for m in tournament["matches"] if m["id"] == match_id), None)
+    # Without a match_id, the player's match in the current round
+    if match_id is None:
+        match = manager.get_player_match(tournament_id, username)
+    else:
+        match = manager.get_match(tournament_id, match_id)
     if not match:
         return Response({"error": "Match not found"}, status=404)
+    match_id = match["id"]
 
     if username not in match["players"]:
         return Response({"error": "User not authorized to play this match"}, status=403)
 
     if "game_id" not in match:
-        match["game_id"] = f"game_{match_id}"
+        return Response({"error": "This match's round has not started yet"}, status=400)
 
     # Replaced with async call:
-    async_to_sync(manager.broadcast_update_async)()
+    async_to_sync(manager.broadcast_update_async)(tournament_id)
 
     return Response({
         "message": "Match started",
@@ -101,20 +187,20 @@ def get_username(request):
     return Response({"username": request.user.username})
 
 @api_view(['POST'])
-def assign_game(request):
+def assign_game(request, tournament_id):
     match_id = request.data.get("match_id")
     manager = TournamentManager.get_instance()
 
-    tournament = manager.get_tournament()
+    tournament = manager.get_tournament(tournament_id)
     if not tournament:
-        return Response({"error": "No active tournament"}, status=400)
+        return Response({"error": "Tournament not found"}, status=404)
 
-    match = next((m for m in tournament["matches"] if m["id"] == match_id), None)
+    match = manager.get_match(tournament_id, match_id)
     if not match:
         return Response({"error": "Match not found"}, status=400)
 
     if "game_id" not in match:
-        result = manager.assign_game_to_match(match_id)
+        result = manager.assign_game_to_match(tournament_id, match_id)
         if "error" in result:
             return Response({"error": result["error"]}, status=400)
         game_id = result["game_id"]
@@ -122,7 +208,7 @@ def assign_game(request):
         game_id = match["game_id"]
 
     # Replaced with async call:
-    async_to_sync(manager.broadcast_update_async)()
+    async_to_sync(manager.broadcast_update_async)(tournament_id)
 
     return Response({
         "message": "Game assigned",
@@ -144,15 +230,15 @@ def update_match_result(request):
     return Response(result)
 
 @api_view(["POST"])
-def close_tournament(request):
+def close_tournament(request, tournament_id):
     manager = TournamentManager.get_instance()
-    tournament = manager.get_tournament()
+    tournament = manager.get_tournament(tournament_id)
 
     if not tournament:
-        return Response({"error": "No active tournament"}, status=400)
+        return Response({"error": "Tournament not found"}, status=404)
 
     if tournament["organizer"] != request.user.username:
         return Response({"error": "Only the organizer can close the tournament"}, status=403)
 
-    result = manager.close_tournament()
+    result = manager.close_tournament(tournament_id)
     return Response(result)
@@ -17,6 +17,7 @@ import RemoteLobbyList from "./components/game/RemoteLobbyList";
 import RemotePongCanvas from "./components/game/RemotePongCanvas";
 import LocalPongCanvas from "./components/game/LocalPongCanvas";
 import TournamentPage from "./components/game/TournamentPage";
+import TournamentList from "./components/game/TournamentList";
 import ChangeDetailsWrapper from "./components/users/ChangeDetailsWrapper";
 import { useAuth } from "./components/utils/AuthContext";
 
@@ -65,7 +66,11 @@ const AppRoutes = () => {
         <Route path="/play/remote" element={<RemoteLobbyList />} />
         <Route path="/play/remote/:lobbyId" element={<RemotePongCanvas />} />
         <Route path="/play/local" element={<LocalPongCanvas />} />
-        <Route path="/play/tournaments" element={<TournamentPage />} />
+        <Route path="/play/tournaments" element={<TournamentList />} />
+        <Route
+          path="/play/tournaments/:tournamentId"
+          element={<TournamentPage />}
+        />
       </Route>
     </Routes>
   );
@@ -1,18 +1,26 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { Link } from "react-router-dom";
 import axiosInstance from "../utils/AxiosInstance";
-const apiBaseUrl = import.meta.env.VITE_API_BASE_URL;
+const wsBaseUrl = import.meta.env.VITE_WS_BASE_URL;
 
 interface Lobby {
   game_id: string;
   players_count: number;
+  open_slots: number;
   players: { [paddle: string]: string };
+  state: string;
+  kind: "casual" | "tournament";
 }
 
+const FEED_URL = `${wsBaseUrl}/ws/lobbies/`;
+const RECONNECT_DELAY_MS = 1000;
+
 const RemoteLobbyList: React.FC = () => {
   const [lobbies, setLobbies] = useState<Lobby[]>([]);
   const [username, setUsername] = useState("");
   const [userId, setUserId] = useState<number>(0);
+  // Where the feed left off, so a reconnect only replays what was missed
+  const feedPositionRef = useRef<{ epoch: string; seq: number } | null>(null);
 
   useEffect(() => {
     const fetchCurrentUser = async () => {
@@ -28,16 +36,59 @@ const RemoteLobbyList: React.FC = () => {
   }, []);
 
   useEffect(() => {
-    // Make sure that this URL returns a valid JSON response listing the lobbies
-    fetch(`${apiBaseUrl}/api/lobbies`)
-      .then((res) => res.json())
-      .then((data) => setLobbies(data))
-      .catch((err) => console.error("Error fetching lobbies:", err));
-
-	const interval = setInterval(() => {
-	  refreshLobbies();
-	}, 5000);
-	return () => clearInterval(interval);
+    let websocket: WebSocket | null = null;
+    let reconnectTimer: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+
+    const connect = () => {
+      const position = feedPositionRef.current;
+      websocket = new WebSocket(
+        position
+          ? `${FEED_URL}?epoch=${position.epoch}&since=${position.seq}`
+          : FEED_URL
+      );
+
+      websocket.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data);
+          if (data.type === "snapshot") {
+            feedPositionRef.current = { epoch: data.epoch, seq: data.seq };
+            setLobbies(data.lobbies);
+            return;
+          }
+          const position = feedPositionRef.current;
+          // Already part of the snapshot
+          if (!position || data.seq <= position.seq) return;
+          position.seq = data.seq;
+          if (data.type === "lobby_added") {
+            setLobbies((prev) => [...prev, data.lobby]);
+          } else if (data.type === "lobby_updated") {
+            setLobbies((prev) =>
+              prev.map((lobby) =>
+                lobby.game_id === data.lobby.game_id ? data.lobby : lobby
+              )
+            );
+          } else if (data.type === "lobby_removed") {
+            setLobbies((prev) =>
+              prev.filter((lobby) => lobby.game_id !== data.game_id)
+            );
+          }
+        } catch (err) {
+          console.error("Error parsing lobby feed message:", err);
+        }
+      };
+
+      websocket.onclose = () => {
+        if (!closed) reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      if (websocket) websocket.close();
+    };
   }, []);
 
   useEffect(() => {
@@ -53,13 +104,6 @@ const RemoteLobbyList: React.FC = () => {
     fetchUser();
   }, [userId]);
 
-  const refreshLobbies = () => {
-	fetch(`${apiBaseUrl}/api/lobbies`)
-	  .then((res) => res.json())
-	  .then((data) => setLobbies(data))
-	  .catch((err) => console.error("Error fetching lobbies:", err));
-  };
-
   return (
     <div className="container d-flex align-items-center justify-content-center">
       <div className="card profile-card mx-auto">
@@ -1,5 +1,5 @@
 import React, { useEffect, useRef, useState } from "react";
-import { useParams, useLocation } from "react-router-dom";
+import { useParams, useLocation, useNavigate } from "react-router-dom";
 import "../../css/game/PongCanvas.css";
 import "../../css/UserProfile.css";
 import { Link } from "react-router-dom";
@@ -7,6 +7,19 @@ const wsBaseUrl = import.meta.env.VITE_WS_BASE_URL;
 
 const WS_URL = `${wsBaseUrl}/ws/pong/`;
 
+type Snapshot = {
+  paddles: { a: number; b: number };
+  ball: { x: number; y: number };
+  receivedAt: number;
+};
+
+// Positions further apart than this between two snapshots are a re-serve,
+// drawn as a jump instead of a slide across the field
+const MAX_INTERPOLATION_DISTANCE = 200;
+
+const lerp = (from: number, to: number, alpha: number) =>
+  from + (to - from) * alpha;
+
 const RemotePongCanvas: React.FC = () => {
   const [paddleAPosition, setPaddleAPosition] = useState<number>(250);
   const [paddleBPosition, setPaddleBPosition] = useState<number>(250);
@@ -32,11 +45,17 @@ const RemotePongCanvas: React.FC = () => {
   );
 
   const websocketRef = useRef<WebSocket | null>(null);
+  // Below 60 Hz the server sends fewer snapshots; the canvas then slides
+  // from the previous snapshot to the latest one over one tick
+  const tickRateRef = useRef<number>(60);
+  const previousSnapshotRef = useRef<Snapshot | null>(null);
+  const latestSnapshotRef = useRef<Snapshot | null>(null);
 
   const { lobbyId } = useParams<{ lobbyId: string }>();
   const location = useLocation();
   const urlParams = new URLSearchParams(location.search);
   const uniqueKey = urlParams.get("key") || "defaultKey";
+  const navigate = useNavigate();
 
   useEffect(() => {
     const connectWebSocket = () => {
@@ -49,10 +68,20 @@ const RemotePongCanvas: React.FC = () => {
       websocket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          // Paired with a lobby on another server: connect to it instead
+          if (data.type === "joinLobby") {
+            navigate(
+              `/play/remote/${data.lobby}?key=${encodeURIComponent(uniqueKey)}`,
+              { replace: true }
+            );
+            return;
+          }
+
           if (data.type === "assignPaddle") {
             setAssignedPaddle(data.paddle);
             if (data.game_id) setGameID(data.game_id);
             if (data.players) setPlayerKeys(data.players);
+            if (data.tickRate) tickRateRef.current = data.tickRate;
           }
 
           if (data.type === "playersConnected") {
@@ -66,9 +95,18 @@ const RemotePongCanvas: React.FC = () => {
           }
 
           if (data.type === "update") {
-            setPaddleAPosition(data.paddles.a);
-            setPaddleBPosition(data.paddles.b);
-            setBallPosition({ x: data.ball.x, y: data.ball.y });
+            if (tickRateRef.current < 60) {
+              previousSnapshotRef.current = latestSnapshotRef.current;
+              latestSnapshotRef.current = {
+                paddles: data.paddles,
+                ball: data.ball,
+                receivedAt: performance.now(),
+              };
+            } else {
+              setPaddleAPosition(data.paddles.a);
+              setPaddleBPosition(data.paddles.b);
+              setBallPosition({ x: data.ball.x, y: data.ball.y });
+            }
             setScore(data.score);
             setGamePaused(false);
           }
@@ -111,7 +149,41 @@ const RemotePongCanvas: React.FC = () => {
     return () => {
       if (websocketRef.current) websocketRef.current.close();
     };
-  }, [uniqueKey, lobbyId]);
+  }, [uniqueKey, lobbyId, navigate]);
+
+  useEffect(() => {
+    let animationFrameId: number;
+    // Latest snapshot already drawn at its final position
+    let settled: Snapshot | null = null;
+
+    const draw = () => {
+      const previous = previousSnapshotRef.current;
+      const latest = latestSnapshotRef.current;
+      if (latest && latest !== settled) {
+        const tickMs = 1000 / tickRateRef.current;
+        const alpha = Math.min(
+          1,
+          (performance.now() - latest.receivedAt) / tickMs
+        );
+        if (alpha === 1) settled = latest;
+        const jumped =
+          !previous ||
+          Math.abs(latest.ball.x - previous.ball.x) > MAX_INTERPOLATION_DISTANCE ||
+          Math.abs(latest.ball.y - previous.ball.y) > MAX_INTERPOLATION_DISTANCE;
+        const from = jumped ? latest : previous;
+        setPaddleAPosition(lerp(from.paddles.a, latest.paddles.a, alpha));
+        setPaddleBPosition(lerp(from.paddles.b, latest.paddles.b, alpha));
+        setBallPosition({
+          x: lerp(from.ball.x, latest.ball.x, alpha),
+          y: lerp(from.ball.y, latest.ball.y, alpha),
+        });
+      }
+      animationFrameId = requestAnimationFrame(draw);
+    };
+
+    animationFrameId = requestAnimationFrame(draw);
+    return () => cancelAnimationFrame(animationFrameId);
+  }, []);
 
   useEffect(() => {
     const handleKeyDown = (event: KeyboardEvent) => {
@@ -0,0 +1,119 @@
+import React, { useEffect, useState } from "react";
+import "../../css/game/TournamentPage.css";
+import "../../css/UserProfile.css";
+import axiosInstance from "../utils/AxiosInstance";
+import { Link, useNavigate } from "react-router-dom";
+const wsBaseUrl = import.meta.env.VITE_WS_BASE_URL;
+
+const FORMATS: { [format: string]: string } = {
+  round_robin: "Round robin",
+  single_elimination: "Single elimination",
+  double_elimination: "Double elimination",
+  swiss: "Swiss",
+};
+
+interface TournamentSummary {
+  id: string;
+  organizer: string;
+  format: string;
+  players_count: number;
+  deadline: number;
+  is_started: boolean;
+  is_finished: boolean;
+}
+
+const TournamentList: React.FC = () => {
+  const [tournaments, setTournaments] = useState<TournamentSummary[]>([]);
+  const [format, setFormat] = useState("round_robin");
+  const navigate = useNavigate();
+
+  useEffect(() => {
+    axiosInstance
+      .get("/api/tournaments/")
+      .then((response) => setTournaments(response.data))
+      .catch((error) => console.error("Failed to fetch tournaments:", error));
+
+    // Sent when a tournament opens, starts, finishes or closes
+    const socket = new WebSocket(`${wsBaseUrl}/ws/tournament/`);
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === "tournamentList") setTournaments(data.tournaments);
+    };
+    return () => {
+      socket.close();
+    };
+  }, []);
+
+  const handleCreateTournament = async () => {
+    try {
+      const response = await axiosInstance.post("/api/tournaments/create/", {
+        format,
+      });
+      navigate(`/play/tournaments/${response.data.id}`);
+    } catch (error) {
+      console.error("Failed to create tournament:", error);
+    }
+  };
+
+  const statusLabel = (tournament: TournamentSummary) => {
+    if (tournament.is_finished) return "Finished";
+    if (tournament.is_started) return "In progress";
+    return "Sign-up open";
+  };
+
+  return (
+    <div className="container d-flex flex-column align-items-center justify-content-center">
+      <div className="card profile-card mx-auto">
+        <div className="card-header profile-header text-center">
+          <h1 className="profile-title text-white">Tournaments</h1>
+        </div>
+        <div className="card-body profile-body">
+          <div className="create-tournament d-flex flex-column align-items-center justify-content-center">
+            <select
+              className="form-select mb-2"
+              value={format}
+              onChange={(e) => setFormat(e.target.value)}
+            >
+              {Object.entries(FORMATS).map(([value, label]) => (
+                <option key={value} value={value}>
+                  {label}
+                </option>
+              ))}
+            </select>
+            <button className="btn btn-primary" onClick={handleCreateTournament}>
+              Create Tournament
+            </button>
+          </div>
+          {tournaments.length === 0 && (
+            <h3 className="profile-title">No active tournament</h3>
+          )}
+          {tournaments.map((tournament) => (
+            <div key={tournament.id} className="match-container">
+              <p>
+                <strong>{tournament.organizer}</strong>'s tournament (
+                {FORMATS[tournament.format] || tournament.format})
+              </p>
+              <p>
+                {statusLabel(tournament)} | Players: {tournament.players_count}
+              </p>
+              <Link
+                to={`/play/tournaments/${tournament.id}`}
+                className="btn btn-primary"
+              >
+                Open
+              </Link>
+            </div>
+          ))}
+        </div>
+        <div className="card-footer profile-footer d-flex justify-content-center">
+          <Link to="/play/remote">Play remote</Link>
+          <Link to="/play/local" className="ms-4">
+            Play local
+          </Link>
+        </div>
+      </div>
+    </div>
+  );
+};
+
+export default TournamentList;
@@ -2,12 +2,13 @@ import React, { useEffect, useState } from "react";
 import "../../css/game/TournamentPage.css";
 import "../../css/UserProfile.css";
 import axiosInstance from "../utils/AxiosInstance";
-import { Link } from "react-router-dom";
+import { Link, useParams } from "react-router-dom";
 const wsBaseUrl = import.meta.env.VITE_WS_BASE_URL;
 
 // Example: your match interface might also have `in_progress?: boolean;`
 interface Match {
   id: number;
+  round: number; // Matches of a round are played at the same time
   players: string[];
   winner: string | null;
   game_id?: string;
@@ -20,43 +21,78 @@ interface FinalResult {
   usernames: string[];
 }
 
+interface Standing {
+  username: string;
+  wins: number;
+  losses: number;
+}
+
 interface Tournament {
+  id: string;
+  format: string;
   organizer: string;
   players: string[]; // List of user *identifiers* (ex: real usernames)
   display_names?: {
     // If storing display names in the tournament
     [username: string]: string;
   };
-  timer: number | null;
+  deadline: number; // Unix time (seconds) sign-up closes
+  server_time?: number; // Sent with websocket updates to correct clock skew
   is_started: boolean;
+  round: number | null; // Index of the round being played
+  rounds: number | null; // Unknown up front for double elimination
   matches: Match[];
+  byes: string[]; // Sitting out the current round
+  standings: Standing[];
   final_result?: FinalResult | null;
 }
 
 const TournamentPage: React.FC = () => {
+  const { tournamentId } = useParams<{ tournamentId: string }>();
   const [tournament, setTournament] = useState<Tournament | null>(null);
   const [username, setUsername] = useState("");
   const [displayName, setDisplayName] = useState(""); // local state for user’s unique name input
+  // Server clock minus ours, in seconds, and the local countdown to the deadline
+  const [clockOffset, setClockOffset] = useState<number>(0);
+  const [secondsLeft, setSecondsLeft] = useState<number | null>(null);
   
   useEffect(() => {
     fetchTournament();
     fetchUsername();
 
-    // Subscribe to your "tournament_updates" WebSocket
-    const socket = new WebSocket(`${wsBaseUrl}/ws/tournament/`);
+    // Updates for this tournament only
+    const socket = new WebSocket(`${wsBaseUrl}/ws/tournament/${tournamentId}/`);
     socket.onmessage = (event) => {
       const data = JSON.parse(event.data);
-      // If data has "timer" => it's your tournament info, else null
-      setTournament(data.timer !== undefined ? data : null);
+      // If data has "deadline" => it's your tournament info, else null
+      if (data.server_time !== undefined) {
+        setClockOffset(data.server_time - Date.now() / 1000);
+      }
+      setTournament(data.deadline !== undefined ? data : null);
     };
     return () => {
       socket.close();
     };
-  }, []);
+  }, [tournamentId]);
+
+  // The server only sends real changes; the countdown ticks here
+  useEffect(() => {
+    if (!tournament || tournament.is_started) {
+      setSecondsLeft(null);
+      return;
+    }
+    const update = () => {
+      const now = Date.now() / 1000 + clockOffset;
+      setSecondsLeft(Math.max(0, Math.ceil(tournament.deadline - now)));
+    };
+    update();
+    const interval = setInterval(update, 250);
+    return () => clearInterval(interval);
+  }, [tournament, clockOffset]);
 
   const fetchTournament = async () => {
     try {
-      const response = await axiosInstance.get("/api/tournament/");
+      const response = await axiosInstance.get(`/api/tournaments/${tournamentId}/`);
       setTournament(response.data);
     } catch (error) {
       console.error("No active tournament found:", error);
@@ -97,7 +133,7 @@ const TournamentPage: React.FC = () => {
         return;
       }
       try {
-        await axiosInstance.post("/api/tournament/sign-in/", {
+        await axiosInstance.post(`/api/tournaments/${tournamentId}/sign-in/`, {
           display_name: displayName,
         });
         // Clear local input (optional)
@@ -108,7 +144,7 @@ const TournamentPage: React.FC = () => {
     } else {
       // If user is already signed in, this toggles to sign-out
       try {
-        await axiosInstance.post("/api/tournament/sign-in/");
+        await axiosInstance.post(`/api/tournaments/${tournamentId}/sign-in/`);
       } catch (error) {
         console.error("Failed to sign out:", error);
       }
@@ -118,7 +154,7 @@ const TournamentPage: React.FC = () => {
   const handlePlayMatch = async (matchId: number) => {
     try {
       // Hit your "assign-game" endpoint or "play-match" endpoint
-      const response = await axiosInstance.post("/api/assign-game/", {
+      const response = await axiosInstance.post(`/api/tournaments/${tournamentId}/assign-game/`, {
         match_id: matchId,
       });
       const { game_id } = response.data;
@@ -130,7 +166,7 @@ const TournamentPage: React.FC = () => {
 
   const handleCloseTournament = async () => {
     try {
-      await axiosInstance.post("/api/tournament/close/");
+      await axiosInstance.post(`/api/tournaments/${tournamentId}/close/`);
     } catch (error) {
       console.error("Failed to close tournament:", error);
     }
@@ -165,16 +201,13 @@ const TournamentPage: React.FC = () => {
           <h1 className="profile-title text-white">Tournament</h1>
         </div>
         <div className="card-body profile-body">
-          {/* If no tournament, show create button */}
+          {/* Closed, canceled or never existed */}
           {!tournament ? (
             <div className="create-tournament d-flex flex-column align-items-center justify-content-center">
-              <h3 className="profile-title">No active tournament</h3>
-              <button
-                className="btn btn-primary"
-                onClick={() => axiosInstance.post("/api/tournament/create/")}
-              >
-                Create Tournament
-              </button>
+              <h3 className="profile-title">This tournament is no longer open</h3>
+              <Link to="/play/tournaments" className="btn btn-primary">
+                All tournaments
+              </Link>
             </div>
           ) : (
             <>
@@ -190,13 +223,27 @@ const TournamentPage: React.FC = () => {
                   .map((uname) => tournament.display_names?.[uname] || uname)
                   .join(", ") || "None"}
               </p>
-              {tournament.timer !== null && !tournament.is_started && (
-                <p>Starting in: {tournament.timer}s</p>
+              {secondsLeft !== null && !tournament.is_started && (
+                <p>Starting in: {secondsLeft}s</p>
               )}
 
               {/* If final results exist, show them */}
               {renderFinalResult()}
 
+              {tournament.is_started && (
+                <div className="standings-container">
+                  <h3>Standings</h3>
+                  {tournament.standings.map((standing, index) => (
+                    <p key={standing.username}>
+                      {index + 1}.{" "}
+                      {tournament.display_names?.[standing.username] ||
+                        standing.username}{" "}
+                      ({standing.wins}-{standing.losses})
+                    </p>
+                  ))}
+                </div>
+              )}
+
               {/* DisplayName input & sign-in/out */}
               {!tournament.is_started && (
                 <div className="d-flex align-items-center justify-content-center">
@@ -220,12 +267,19 @@ const TournamentPage: React.FC = () => {
               {/* List matches once tournament is started but no final result */}
               {tournament.is_started && !tournament.final_result && (
                 <div className="matches-container">
-                  <h3>Matches</h3>
+                  <h3>
+                    Matches (round {(tournament.round ?? 0) + 1}
+                    {tournament.rounds ? ` of ${tournament.rounds}` : ""})
+                  </h3>
+                  {tournament.byes.length > 0 && (
+                    <p>
+                      Sitting out this round:{" "}
+                      {tournament.byes
+                        .map((uname) => tournament.display_names?.[uname] || uname)
+                        .join(", ")}
+                    </p>
+                  )}
                   {tournament.matches.map((match) => {
-                    const allPreviousMatchesHaveWinners = tournament.matches
-                      .filter((m) => m.id < match.id)
-                      .every((m) => m.winner !== null);
-
                     // Only players in the match see a "Play" button
                     const isPlayerInThisMatch =
                       match.players.includes(username);
@@ -233,11 +287,9 @@ const TournamentPage: React.FC = () => {
                     // A match is playable if:
                     //  1) The user is in the match
                     //  2) The match doesn’t have a winner yet
-                    //  3) All previous matches have a winner
+                    //  3) Its round has started (the server assigned a game)
                     const canPlay =
-                      isPlayerInThisMatch &&
-                      !match.winner &&
-                      allPreviousMatchesHaveWinners;
+                      isPlayerInThisMatch && !match.winner && !!match.game_id;
 
                     const matchWinner = match.winner
                       ? tournament.display_names?.[match.winner] || match.winner
@@ -252,6 +304,7 @@ const TournamentPage: React.FC = () => {
 
                     return (
                       <div key={match.id} className="match-container">
+                        <p>Round {match.round + 1}</p>
                         <p>
                           <strong>{player1.toUpperCase()}</strong> vs{" "}
                           <strong>{player2.toUpperCase()}</strong>